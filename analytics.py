@@ -0,0 +1,76 @@
+"""
+Sales analytics from the sales_rollup table.
+
+Purchases add to hourly and daily rollups per product and per buyer in
+the same transaction, and refunds subtract from them, so a report reads
+at most (buckets x products) rows however long the ledger is. Revenue
+is in WL (1 DL = 100 WL, 1 BGL = 10,000 WL).
+
+Rebuild the rollups from the ledger (e.g. after restoring a backup or
+upgrading a store that already has history):
+    python analytics.py rebuild [--config config.json] [--guild ID]
+"""
+import argparse
+import logging
+import time
+from collections import namedtuple
+import storage
+
+logger = logging.getLogger(__name__)
+
+Total = namedtuple('Total', ['key', 'orders', 'items', 'revenue'])
+Report = namedtuple('Report', ['period', 'since', 'top_products', 'top_buyers', 'trend'])
+
+# Sampai 2 hari tren ditampilkan per jam, selebihnya per hari
+HOURLY_MAX_DAYS = 2
+
+
+def totals(rows, key=lambda row: row.key):
+    """Sum SalesBucket rows by `key`, highest revenue first; empty totals (fully refunded) are dropped"""
+    sums = {}
+    for row in rows:
+        total = sums.setdefault(key(row), [0, 0, 0])
+        total[0] += row.orders
+        total[1] += row.items
+        total[2] += row.revenue
+    return sorted(
+        (Total(k, *total) for k, total in sums.items() if any(total)),
+        key=lambda total: (-total.revenue, str(total.key))
+    )
+
+
+def report(store, guild_id: int, days: int, limit: int = 5, now: float = None) -> Report:
+    """Top products, top buyers and the revenue trend over the last `days` days (today included)"""
+    now = time.time() if now is None else now
+    period = 'hour' if days <= HOURLY_MAX_DAYS else 'day'
+    seconds = storage.ROLLUP_PERIODS[period]
+    if period == 'hour':
+        since = int(now // seconds * seconds) - (days * 24 - 1) * seconds
+    else:
+        since = int(now // seconds * seconds) - (days - 1) * seconds
+
+    products = store.sales_rollup(guild_id, 'product', period, since)
+    buyers = store.sales_rollup(guild_id, 'buyer', period, since)
+    trend = sorted(totals(products, key=lambda row: row.bucket), key=lambda total: total.key)
+    return Report(period, since, totals(products)[:limit], totals(buyers)[:limit], trend)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sales rollup maintenance')
+    parser.add_argument('action', choices=['rebuild'])
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--guild', type=int, help='Only this guild (default: all)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    import settings
+    config = settings.parse(args.config)
+    store = storage.use(storage.create(config.storage))
+    store.setup(config.guild_id)
+    start = time.perf_counter()
+    counted = store.rebuild_rollups(args.guild)
+    print(f'Rebuilt sales rollups from {counted:,} purchases in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Append-only JSON audit stream.
+
+Each event is one JSON object per line in audit/audit-YYYY-MM-DD.jsonl.
+Past days are gzip-compressed. Run this module directly to query it:
+
+    python audit.py --user 1035189920488235120 --command send --since 2024-12-01
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+from lifecycle import Service
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+AUDIT_DIR = 'audit'
+FLUSH_INTERVAL = 2.0
+BATCH_SIZE = 500
+
+
+def _segment_date(filename):
+    """Parse the day from audit-YYYY-MM-DD.jsonl[.gz], or None"""
+    if not filename.startswith('audit-'):
+        return None
+    try:
+        return datetime.strptime(filename[6:16], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+class AuditLog:
+    """Buffered audit writer; record() never touches the disk"""
+
+    def __init__(self, directory: str = AUDIT_DIR, flush_interval: float = FLUSH_INTERVAL,
+                 batch_size: int = BATCH_SIZE):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = None
+        self._task = None
+
+    def record(self, event: str, **fields):
+        """Queue one audit event. Safe to call from any thread."""
+        entry = {'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'), 'event': event}
+        entry.update(fields)
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.batch_size
+        if full and self._wakeup is not None:
+            self._wakeup.get_loop().call_soon_threadsafe(self._wakeup.set)
+
+    def flush(self):
+        """Write buffered events to today's segment (blocking)"""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            # Kelompokkan per hari agar event tepat tengah malam masuk segmen yang benar
+            by_day = {}
+            for entry in batch:
+                by_day.setdefault(entry['ts'][:10], []).append(entry)
+            for day, entries in by_day.items():
+                path = os.path.join(self.directory, f'audit-{day}.jsonl')
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(e, default=str, separators=(',', ':')) + '\n' for e in entries))
+            self._compress_old_segments()
+        return len(batch)
+
+    def _compress_old_segments(self):
+        today = datetime.now(timezone.utc).date()
+        for filename in os.listdir(self.directory):
+            day = _segment_date(filename)
+            if day is None or day >= today or not filename.endswith('.jsonl'):
+                continue
+            path = os.path.join(self.directory, filename)
+            with open(path, 'rb') as f_in, gzip.open(path + '.gz', 'ab') as f_out:
+                f_out.writelines(f_in)
+            os.remove(path)
+
+    async def run(self):
+        """Flush periodically or when a batch fills up"""
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception as e:
+                    logger.error(f'Error flushing audit log: {e}')
+        finally:
+            self._wakeup = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run(), name='audit-flush')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+class AuditService(Service):
+    """Lifecycle wrapper so pending audit events are flushed on shutdown"""
+
+    name = 'audit-log'
+
+    def __init__(self, log: AuditLog):
+        self.log = log
+
+    async def start(self):
+        self.log.start()
+
+    async def stop(self):
+        pending = len(self.log._buffer)
+        await self.log.stop()
+        return f'flushed {pending} events'
+
+
+audit_log = AuditLog()
+
+
+def record(event: str, **fields):
+    """Record an event on the global audit log"""
+    audit_log.record(event, **fields)
+
+
+def iter_events(directory: str = AUDIT_DIR, since: datetime = None, until: datetime = None,
+                user=None, command: str = None, event: str = None):
+    """Stream matching events, reading segments line by line"""
+    if not os.path.isdir(directory):
+        return
+    # Segmen dan 'ts' disimpan dalam UTC, jadi batas waktu juga dibandingkan dalam UTC
+    since = _to_utc(since) if since else None
+    until = _to_utc(until) if until else None
+    segments = []
+    for filename in os.listdir(directory):
+        day = _segment_date(filename)
+        if day is None:
+            continue
+        if since and day < since.date():
+            continue
+        if until and day > until.date():
+            continue
+        segments.append((day, filename))
+
+    # Format yang sama dengan record(), sehingga perbandingan string sama dengan urutan waktu
+    since_ts = since.isoformat(timespec='milliseconds') if since else None
+    until_ts = until.isoformat(timespec='milliseconds') if until else None
+    user = str(user) if user is not None else None
+
+    for _, filename in sorted(segments):
+        path = os.path.join(directory, filename)
+        opener = gzip.open if filename.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                # Filter murah pada teks mentah sebelum json.loads
+                if user and user not in line:
+                    continue
+                if command and command not in line:
+                    continue
+                entry = json.loads(line)
+                if since_ts and entry['ts'] < since_ts:
+                    continue
+                if until_ts and entry['ts'] > until_ts:
+                    continue
+                if user and str(entry.get('actor_id')) != user and entry.get('growid') != user:
+                    continue
+                if command and entry.get('command') != command:
+                    continue
+                if event and entry.get('event') != event:
+                    continue
+                yield entry
+
+
+def _to_utc(dt):
+    """Aware UTC datetime; naive values are taken as UTC"""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def _parse_time(value):
+    return _to_utc(datetime.fromisoformat(value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query the JSON audit log')
+    parser.add_argument('--dir', default=AUDIT_DIR)
+    parser.add_argument('--user', help='Discord user id or GrowID')
+    parser.add_argument('--command', help='Command name')
+    parser.add_argument('--event', help='Event type (command, purchase, balance, donation)')
+    parser.add_argument('--since', type=_parse_time, help='ISO date/time (UTC)')
+    parser.add_argument('--until', type=_parse_time, help='ISO date/time (UTC)')
+    parser.add_argument('--last', type=float, help='Only the last N hours')
+    parser.add_argument('--count', action='store_true', help='Print only the number of matches')
+    args = parser.parse_args(argv)
+
+    since = args.since
+    if args.last:
+        since = datetime.now(timezone.utc) - timedelta(hours=args.last)
+
+    matches = 0
+    for entry in iter_events(args.dir, since, args.until, args.user, args.command, args.event):
+        matches += 1
+        if not args.count:
+            sys.stdout.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    if args.count:
+        print(matches)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Hot backups of shop.db with SQLite's online backup API.
+
+The copy runs in a worker thread in small page steps, so the database
+is only read-locked for one step at a time. Each copy is checked with
+PRAGMA integrity_check, gzip-compressed into backups/ and pruned with
+a generational policy (last N, one per day, one per week).
+
+Run this module directly for a one-off backup:
+
+    python backup.py [--db shop.db] [--dir backups]
+"""
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from lifecycle import Service
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = 'backups'
+PAGES_PER_STEP = 256
+STEP_PAUSE_MS = 10
+# Setelah sekian kali restart (DB ditulis koneksi lain), salin sisanya dalam satu langkah
+MAX_RESTARTS = 5
+NAME_FORMAT = 'shop-%Y%m%d-%H%M%S.db.gz'
+
+BackupResult = namedtuple('BackupResult', [
+    'path', 'duration', 'db_size', 'compressed_size', 'pages', 'steps', 'restarts', 'integrity', 'pruned'
+])
+
+
+class BackupError(Exception):
+    """Raised when a backup fails its integrity check or is aborted"""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+class _Progress:
+    """Backup progress callback: pauses between steps and detects restarts"""
+
+    def __init__(self, pause: float, abort: threading.Event):
+        self.pause = pause
+        self.abort = abort
+        self.steps = 0
+        self.restarts = 0
+        self.pages = 0
+        self._remaining = None
+
+    def __call__(self, status, remaining, total):
+        self.steps += 1
+        self.pages = total
+        if self._remaining is not None and remaining > self._remaining:
+            self.restarts += 1
+        self._remaining = remaining
+        if self.abort.is_set():
+            raise BackupError('backup aborted')
+        if self.restarts > MAX_RESTARTS:
+            raise _TooManyRestarts()
+        if remaining and self.pause:
+            # Beri kesempatan penulis di antara langkah
+            time.sleep(self.pause)
+
+
+def _copy(source_path, target_path, pages_per_step, pause, abort):
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    progress = _Progress(pause, abort)
+    try:
+        try:
+            source.backup(target, pages=pages_per_step, progress=progress)
+        except _TooManyRestarts:
+            logger.warning(f'Backup restarted {progress.restarts} times under write load; finishing in one step')
+            source.backup(target, pages=-1)
+        integrity = target.execute('PRAGMA integrity_check').fetchone()[0]
+        return progress, integrity
+    finally:
+        target.close()
+        source.close()
+
+
+def run_backup(db_path: str, directory: str = BACKUP_DIR, pages_per_step: int = PAGES_PER_STEP,
+               step_pause_ms: float = STEP_PAUSE_MS, retention=None, abort: threading.Event = None) -> BackupResult:
+    """Take one compressed, integrity-checked backup (blocking)"""
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    stamp = datetime.utcnow()
+    final_path = os.path.join(directory, stamp.strftime(NAME_FORMAT))
+    raw_path = final_path[:-3] + '.tmp'
+    try:
+        progress, integrity = _copy(
+            db_path, raw_path, pages_per_step, step_pause_ms / 1000, abort or threading.Event()
+        )
+        if integrity != 'ok':
+            raise BackupError(f'integrity check failed: {integrity}')
+
+        db_size = os.path.getsize(raw_path)
+        with open(raw_path, 'rb') as f_in, gzip.open(final_path + '.tmp', 'wb', compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        os.replace(final_path + '.tmp', final_path)
+    finally:
+        for leftover in (raw_path, final_path + '.tmp'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    pruned = prune(directory, **(retention or {}), now=stamp)
+    result = BackupResult(
+        final_path, time.perf_counter() - start, db_size, os.path.getsize(final_path),
+        progress.pages, progress.steps, progress.restarts, integrity, pruned
+    )
+    logger.info(
+        f'Backup {final_path}: {db_size:,} -> {result.compressed_size:,} bytes in '
+        f'{result.duration * 1000:.0f} ms ({result.steps} steps, {result.restarts} restarts, pruned {len(pruned)})'
+    )
+    return result
+
+
+def list_backups(directory: str = BACKUP_DIR):
+    """(timestamp, path) of every backup, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    backups = []
+    for filename in os.listdir(directory):
+        try:
+            stamp = datetime.strptime(filename, NAME_FORMAT)
+        except ValueError:
+            continue
+        backups.append((stamp, os.path.join(directory, filename)))
+    return sorted(backups, reverse=True)
+
+
+def prune(directory: str = BACKUP_DIR, keep_last: int = 4, keep_daily: int = 7, keep_weekly: int = 4, now=None):
+    """
+    Generational retention: keep the newest `keep_last` backups, the
+    newest backup of each of the last `keep_daily` days and of each of
+    the last `keep_weekly` ISO weeks. Returns the deleted paths.
+    """
+    now = now or datetime.utcnow()
+    backups = list_backups(directory)
+    keep = {path for _, path in backups[:keep_last]}
+    days, weeks = set(), set()
+    for stamp, path in backups:
+        if stamp.date() > (now - timedelta(days=keep_daily)).date() and stamp.date() not in days:
+            days.add(stamp.date())
+            keep.add(path)
+        week = stamp.isocalendar()[:2]
+        if stamp > now - timedelta(weeks=keep_weekly) and week not in weeks:
+            weeks.add(week)
+            keep.add(path)
+
+    removed = []
+    for _, path in backups:
+        if path not in keep:
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+class BackupService(Service):
+    """
+    Takes a backup every `interval_hours` while enabled; run_once() also
+    serves the !backup command. `config` returns the current BackupSettings.
+    """
+
+    name = 'backup'
+
+    def __init__(self, db_path: str, config):
+        self.db_path = db_path
+        self.config = config
+        self.task = None
+        self.last = None
+        self._lock = asyncio.Lock()
+        self._abort = threading.Event()
+
+    async def run_once(self) -> BackupResult:
+        """Run a backup off the event loop; concurrent callers wait for the running one"""
+        async with self._lock:
+            config = self.config()
+            self.last = await asyncio.to_thread(
+                run_backup,
+                self.db_path,
+                config.directory,
+                config.pages_per_step,
+                config.step_pause_ms,
+                {'keep_last': config.keep_last, 'keep_daily': config.keep_daily, 'keep_weekly': config.keep_weekly},
+                self._abort
+            )
+            return self.last
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.config().interval_hours * 3600)
+            if not self.config().enabled:
+                continue
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f'Scheduled backup failed: {e}')
+
+    async def start(self):
+        self._abort.clear()
+        self.task = asyncio.get_running_loop().create_task(self.run(), name='backup')
+
+    async def stop(self):
+        # Backup yang sedang berjalan dibatalkan di langkah berikutnya
+        self._abort.set()
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        async with self._lock:
+            pass
+        return f'last backup {self.last.path}' if self.last else 'no backup taken'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Take a hot backup of the store database')
+    parser.add_argument('--db', default='shop.db')
+    parser.add_argument('--dir', default=BACKUP_DIR)
+    parser.add_argument('--pages', type=int, default=PAGES_PER_STEP)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    result = run_backup(args.db, args.dir, args.pages)
+    print(f'{result.path} {result.db_size:,} -> {result.compressed_size:,} bytes in {result.duration:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Read latency of the world-info and catalog paths: SQLite vs snapshot.
+
+Usage (from the repository root):
+    python bench/catalog_reads.py [--products 50] [--iterations 20000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog  # noqa: E402
+import database  # noqa: E402
+import storage  # noqa: E402
+
+GUILD_ID = 1
+
+
+def seed(products):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO products (guild_id, code, name, price, description) VALUES (?, ?, ?, ?, ?)",
+        [(GUILD_ID, f"P{i}", f"Product {i}", 100 + i, f"Description for product {i}") for i in range(products)]
+    )
+    cursor.execute(
+        "INSERT INTO world_info (guild_id, world, owner, bot) VALUES (?, 'WORLD', 'owner', 'bot')", (GUILD_ID,)
+    )
+    conn.commit()
+    conn.close()
+
+
+def sqlite_world():
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT world, owner, bot FROM world_info WHERE guild_id = ?", (GUILD_ID,))
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+
+def sqlite_product(code):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT name, price, stock, description FROM products WHERE guild_id = ? AND code = ?", (GUILD_ID, code)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return row
+
+
+def sqlite_catalog():
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT code, name, price, description FROM products WHERE guild_id = ? ORDER BY name", (GUILD_ID,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def snapshot_world():
+    return catalog.current(GUILD_ID).world
+
+
+def snapshot_product(code):
+    return catalog.current(GUILD_ID).get(code)
+
+
+def snapshot_catalog():
+    return catalog.current(GUILD_ID).products
+
+
+def timeit(fn, iterations, *args):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        fn(*args)
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return statistics.median(samples) / 1000, samples[int(len(samples) * 0.99)] / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalog read latency')
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='catalog-bench-'))
+    storage.use(storage.SqliteStorage()).setup(GUILD_ID)
+    seed(args.products)
+    catalog.refresh(GUILD_ID)
+
+    cases = [
+        ('world info', sqlite_world, snapshot_world, ()),
+        ('product lookup', sqlite_product, snapshot_product, ('P7',)),
+        ('full catalog', sqlite_catalog, snapshot_catalog, ()),
+    ]
+    print(f"{'path':<16} {'sqlite p50':>11} {'p99':>9} {'snapshot p50':>13} {'p99':>9}  (us)")
+    for name, slow, fast, call_args in cases:
+        s50, s99 = timeit(slow, args.iterations, *call_args)
+        f50, f99 = timeit(fast, args.iterations, *call_args)
+        print(f"{name:<16} {s50:>11.2f} {s99:>9.2f} {f50:>13.3f} {f99:>9.3f}")
+
+    start = time.perf_counter()
+    catalog.refresh(GUILD_ID)
+    print(f"snapshot rebuild ({args.products} products): {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
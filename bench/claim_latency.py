@@ -0,0 +1,90 @@
+"""
+Stock claim latency against order quantity.
+
+Compares the previous claim (SELECT ... LIMIT n, then one UPDATE per
+item) with the single UPDATE ... RETURNING statement SqlStorage uses
+now, both inside BEGIN IMMEDIATE on the same SQLite file, plus the
+memory backend as a floor.
+
+Usage (from the repository root):
+    python bench/claim_latency.py [--quantities 1,10,100,500,1000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+GUILD_ID = 1
+CODE = 'ACC'
+
+
+def legacy_claim(store, quantity):
+    """The previous claim: select, then one UPDATE per row"""
+    with store.transaction(immediate=True) as cursor:
+        items = cursor.execute("""
+            SELECT id, content FROM product_stock
+            WHERE guild_id = ? AND product_code = ? AND used = 0
+            ORDER BY id
+            LIMIT ?
+        """, (GUILD_ID, CODE, quantity)).fetchall()
+        if len(items) < quantity:
+            raise storage.InsufficientStock(CODE, len(items))
+        for item_id, _ in items:
+            cursor.execute("""
+                UPDATE product_stock SET used = 1, used_by = ?, used_at = CURRENT_TIMESTAMP WHERE id = ?
+            """, ('bench', item_id))
+        cursor.execute(
+            "UPDATE products SET stock = stock - ? WHERE guild_id = ? AND code = ?", (len(items), GUILD_ID, CODE)
+        )
+        return items
+
+
+def measure(claim, store, quantity, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        items = claim(store, quantity)
+        samples.append(time.perf_counter_ns() - start)
+        assert len(items) == quantity
+    return statistics.median(samples) / 1000
+
+
+def fresh(store, stock):
+    store.setup(GUILD_ID)
+    store.add_product(GUILD_ID, CODE, 'Account', 100)
+    # Isi payload mirip data asli: baris akun "user:password"
+    store.add_stock(GUILD_ID, CODE, [f'user{i:07d}@mail.example:pw{i * 7919:010d}' for i in range(stock)], 'bench')
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stock claim latency by quantity')
+    parser.add_argument('--quantities', default='1,10,100,500,1000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    quantities = [int(q) for q in args.quantities.split(',')]
+    stock = sum(quantities) * args.repeat + 1000
+
+    directory = tempfile.mkdtemp(prefix='claim-bench-')
+    runs = [
+        ('legacy', fresh(storage.SqliteStorage(os.path.join(directory, 'legacy.db')), stock), legacy_claim),
+        ('returning', fresh(storage.SqliteStorage(os.path.join(directory, 'returning.db')), stock),
+         lambda store, q: store.claim_stock(GUILD_ID, CODE, q, 'bench')),
+        ('memory', fresh(storage.MemoryStorage(), stock),
+         lambda store, q: store.claim_stock(GUILD_ID, CODE, q, 'bench')),
+    ]
+
+    print(f"{'quantity':>8}" + "".join(f"{name + ' p50 us':>18}" for name, _, _ in runs) + f"{'speedup':>10}")
+    for quantity in quantities:
+        results = [measure(claim, store, quantity, args.repeat) for _, store, claim in runs]
+        print(f"{quantity:>8}" + "".join(f"{r:>18.1f}" for r in results) + f"{results[0] / results[1]:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Interaction latency during a donation flood.
+
+Simulates the bot's event loop answering button interactions (a GrowID
+lookup plus a balance read, like StockView's callbacks) while a client
+process floods the donation webhook. Compares:
+
+  inprocess  webhook thread inside the bot process, crediting directly
+  external   webhook in its own process writing to donation_queue,
+             bot side crediting the queue in batches
+
+Usage (from the repository root):
+    python bench/donation_flood.py [--seconds 10] [--clients 8]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+PORT = 18081
+GUILD_ID = 1
+
+
+def _parse(body):
+    data = json.loads(body)
+    return data['GrowID'], int(data['Deposit'].split()[0])
+
+
+class DirectHandler(BaseHTTPRequestHandler):
+    """Old behaviour: credit inside the request"""
+
+    def do_POST(self):
+        growid, wl = _parse(self.rfile.read(int(self.headers['Content-Length'])))
+        storage.get().change_balance(GUILD_ID, growid, wl, 0, 0, 'DONATION', f'{wl} WL')
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class QueueHandler(BaseHTTPRequestHandler):
+    """New behaviour: durable hand-off only"""
+
+    def do_POST(self):
+        growid, wl = _parse(self.rfile.read(int(self.headers['Content-Length'])))
+        storage.get().enqueue_donation(GUILD_ID, growid, wl, 0, 0, f"{wl} World Lock")
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(workdir, handler_name, ready):
+    os.chdir(workdir)
+    storage.use(storage.SqliteStorage())
+    handler = QueueHandler if handler_name == 'queue' else DirectHandler
+    server = HTTPServer(('127.0.0.1', PORT), handler)
+    ready.set()
+    server.serve_forever()
+
+
+def flood(seconds, clients, counter):
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', PORT)
+        deadline = time.monotonic() + seconds
+        i = 0
+        while time.monotonic() < deadline:
+            body = json.dumps({'GrowID': f'donor{i % 50}', 'Deposit': '5 World Lock'})
+            try:
+                conn.request('POST', '/', body, {'Content-Type': 'application/json'})
+                conn.getresponse().read()
+                with counter.get_lock():
+                    counter.value += 1
+            except (ConnectionError, http.client.HTTPException):
+                conn = http.client.HTTPConnection('127.0.0.1', PORT)
+            i += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def interaction():
+    """What a StockView balance button does: two synchronous reads"""
+    storage.get().get_growid(GUILD_ID, 1)
+    storage.get().get_balance(GUILD_ID, 'buyer')
+
+
+async def measure(seconds, consume):
+    latencies = []
+    credited = 0
+    stop = time.monotonic() + seconds
+
+    async def consumer():
+        nonlocal credited
+        while time.monotonic() < stop:
+            rows = await asyncio.to_thread(storage.get().credit_queued_donations, 100)
+            credited += len(rows)
+            if len(rows) < 100:
+                await asyncio.sleep(0.2)
+
+    task = asyncio.create_task(consumer()) if consume else None
+    while time.monotonic() < stop:
+        scheduled = time.perf_counter()
+        await asyncio.sleep(0.01)
+        interaction()
+        latencies.append((time.perf_counter() - scheduled - 0.01) * 1000)
+    if task:
+        await task
+    return latencies, credited
+
+
+def run_mode(mode, seconds, clients):
+    workdir = tempfile.mkdtemp(prefix=f'flood-{mode}-')
+    os.chdir(workdir)
+    storage.use(storage.SqliteStorage()).setup(GUILD_ID)
+
+    counter = multiprocessing.Value('i', 0)
+    ready = multiprocessing.Event()
+    server_proc = None
+    if mode == 'external':
+        server_proc = multiprocessing.Process(target=serve, args=(workdir, 'queue', ready), daemon=True)
+        server_proc.start()
+        ready.wait()
+    else:
+        server = HTTPServer(('127.0.0.1', PORT), DirectHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    flooder = multiprocessing.Process(target=flood, args=(seconds, clients, counter))
+    flooder.start()
+    latencies, credited = asyncio.run(measure(seconds, consume=(mode == 'external')))
+    flooder.join()
+
+    if server_proc:
+        server_proc.terminate()
+        server_proc.join()
+    else:
+        server.shutdown()
+        server.server_close()
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    print(
+        f"{mode:<10} donations={counter.value:>6} credited_in_loop={credited:>6} "
+        f"interactions={len(latencies):>5} "
+        f"p50={statistics.median(latencies):7.2f}ms p99={p(0.99):7.2f}ms max={latencies[-1]:7.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--mode', choices=['inprocess', 'external', 'both'], default='both')
+    args = parser.parse_args()
+
+    modes = ['inprocess', 'external'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        run_mode(mode, args.seconds, args.clients)
+
+
+if __name__ == '__main__':
+    main()
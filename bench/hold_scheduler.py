@@ -0,0 +1,76 @@
+"""
+Cost of cart holds as the number of concurrent carts grows.
+
+Places N holds with random TTLs, releases a third of them (confirmed or
+cancelled carts), then sweeps expiry in one-second ticks, and reports
+the per-operation cost for each N. With the heap every operation should
+grow roughly with log N, not N.
+
+Usage (from the repository root):
+    python bench/hold_scheduler.py [--carts 1000,10000,100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import holds  # noqa: E402
+
+PRODUCTS = [f'P{i}' for i in range(50)]
+
+
+def run(carts, rng):
+    book = holds.HoldBook()
+    now = 1_000_000.0
+
+    start = time.perf_counter_ns()
+    placed = [
+        book.place(rng.randint(1, 5), user_id, rng.choice(PRODUCTS), rng.randint(1, 5), rng.uniform(30, 300), now)
+        for user_id in range(carts)
+    ]
+    place_ns = (time.perf_counter_ns() - start) / carts
+
+    released = placed[::3]
+    start = time.perf_counter_ns()
+    for hold in released:
+        book.release(hold.id)
+    release_ns = (time.perf_counter_ns() - start) / len(released)
+
+    start = time.perf_counter_ns()
+    for guild_id in range(1, 6):
+        for code in PRODUCTS:
+            book.held_quantity(guild_id, code)
+    lookup_ns = (time.perf_counter_ns() - start) / (5 * len(PRODUCTS))
+
+    expired = 0
+    ticks = 0
+    worst_tick = 0
+    start = time.perf_counter_ns()
+    while len(book):
+        now += 1
+        tick = time.perf_counter_ns()
+        expired += len(book.expire(now))
+        worst_tick = max(worst_tick, time.perf_counter_ns() - tick)
+        ticks += 1
+    expire_ns = (time.perf_counter_ns() - start) / max(expired, 1)
+    assert not book.held, 'held totals must drain to zero'
+    return place_ns, release_ns, lookup_ns, expire_ns, worst_tick / 1000, ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hold book cost by number of concurrent carts')
+    parser.add_argument('--carts', default='1000,10000,100000')
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"{'carts':>8}{'place ns':>11}{'release ns':>12}{'held() ns':>11}{'expire ns':>11}{'worst tick us':>15}")
+    for carts in (int(n) for n in args.carts.split(',')):
+        place, release, lookup, expire, worst, _ = run(carts, rng)
+        print(f"{carts:>8}{place:>11.0f}{release:>12.0f}{lookup:>11.0f}{expire:>11.0f}{worst:>15.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Size and latency of compressed stock payloads.
+
+Loads the same account-shaped stock lines into two SQLite stores, one
+plain and one with compression on, then reports the payload bytes,
+database file size after VACUUM, add_stock time, and claim latency
+(which includes decompression, i.e. the delivery path).
+
+Usage (from the repository root):
+    python bench/stock_compression.py [--rows 20000] [--claims 200] [--quantity 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+GUILD_ID = 1
+CODE = 'ACC'
+DOMAINS = ('gmail.com', 'yahoo.com', 'hotmail.com', 'outlook.com')
+COUNTRIES = ('ID', 'MY', 'PH', 'US', 'SG')
+
+
+def account_line(rng):
+    """One stock line shaped like the Growtopia accounts the store sells"""
+    name = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(6, 12))) + str(rng.randint(1, 999))
+    password = ''.join(rng.choices(string.ascii_letters + string.digits, k=12))
+    return (
+        f"{name}@{rng.choice(DOMAINS)}:{password} | GrowID: {name.capitalize()} | Level: {rng.randint(1, 125)} | "
+        f"Gems: {rng.randint(0, 50000)} | Country: {rng.choice(COUNTRIES)} | Verified: Yes | "
+        f"Backup code: {''.join(rng.choices(string.digits, k=8))}"
+    )
+
+
+def load(path, lines, compress):
+    store = storage.SqliteStorage(path)
+    store.setup(GUILD_ID)
+    store.add_product(GUILD_ID, CODE, 'Account', 100)
+    if compress:
+        store.set_compression(GUILD_ID, CODE, True)
+    start = time.perf_counter()
+    for i in range(0, len(lines), 1000):
+        store.add_stock(GUILD_ID, CODE, lines[i:i + 1000], 'bench', 'accounts.txt')
+    return store, time.perf_counter() - start
+
+
+def payload_bytes(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            "SELECT SUM(LENGTH(CAST(content AS BLOB))) + COALESCE(SUM(LENGTH(content_z)), 0) FROM product_stock"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def file_bytes(path):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+    return os.path.getsize(path)
+
+
+def claim_latency(store, claims, quantity, expected):
+    samples = []
+    for i in range(claims):
+        start = time.perf_counter_ns()
+        items = store.claim_stock(GUILD_ID, CODE, quantity, 'bench')
+        samples.append(time.perf_counter_ns() - start)
+        assert [item.content for item in items] == expected[i * quantity:(i + 1) * quantity]
+    return statistics.median(samples) / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compressed stock payloads: size and claim overhead')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--claims', type=int, default=200)
+    parser.add_argument('--quantity', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    lines = [account_line(rng) for _ in range(args.rows)]
+    directory = tempfile.mkdtemp(prefix='compression-bench-')
+    raw = sum(len(line.encode('utf-8')) for line in lines)
+    print(f"{args.rows:,} lines, {raw:,} bytes raw, e.g.\n  {lines[0]}\n")
+
+    results = []
+    for name, compress in (('plain', False), ('compressed', True)):
+        path = os.path.join(directory, f'{name}.db')
+        store, load_time = load(path, lines, compress)
+        latency = claim_latency(store, args.claims, args.quantity, lines)
+        results.append((name, payload_bytes(path), file_bytes(path), load_time, latency))
+
+    print(f"{'store':<12}{'payload bytes':>15}{'db file bytes':>15}{'add_stock s':>13}{'claim p50 us':>14}")
+    for name, payload, size, load_time, latency in results:
+        print(f"{name:<12}{payload:>15,}{size:>15,}{load_time:>13.2f}{latency:>14.1f}")
+    (_, plain_payload, plain_size, plain_load, plain_claim), (_, payload, size, load_time, claim) = results
+    print(
+        f"\npayload {payload / plain_payload:.0%} of plain, file {size / plain_size:.0%} of plain; "
+        f"add_stock {load_time / plain_load:.1f}x, claim {claim - plain_claim:+.1f} us per {args.quantity} items"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Run the same store workload against each storage backend, check they
+end in the same state, and compare per-operation latency.
+
+Usage (from the repository root):
+    python bench/storage_backends.py [--rounds 200] [--pg-dsn postgresql://localhost/store_bench]
+
+The postgres backend is only run when --pg-dsn (or STORE_BENCH_PG_DSN)
+points at a scratch database; its tables are dropped first.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+GUILDS = (1, 2)
+TABLES = (
+    'users', 'user_growid', 'products', 'product_stock', 'transaction_log', 'donation_queue', 'world_info',
+    'product_purge', 'stock_dictionary', 'stock_holds', 'purchase_keys', 'sales_rollup',
+)
+
+
+def timed(samples, name, fn, *args):
+    start = time.perf_counter_ns()
+    result = fn(*args)
+    samples.setdefault(name, []).append(time.perf_counter_ns() - start)
+    return result
+
+
+# Saldo seperti yang ditulis format_balance sebelum storage layer ada
+LEGACY_BALANCE = "• {:,} WL\n• 0 DL (= 0 WL)\n• 0 BGL (= 0 WL)\nTotal: {:,} WL"
+
+
+def legacy_purchase(store, guild_id, growid):
+    """Insert a PURCHASE entry in the pre-storage ledger format; returns its id"""
+    old, new = LEGACY_BALANCE.format(100, 100), LEGACY_BALANCE.format(60, 60)
+    details = 'Purchased 2x Beta (B)'
+    if isinstance(store, storage.MemoryStorage):
+        with store._lock:
+            entry_id = store._next_id('ledger')
+            store.ledger.append({
+                'id': entry_id, 'guild_id': guild_id, 'growid': growid, 'amount': -40, 'type': 'PURCHASE',
+                'details': details, 'old_balance': old, 'new_balance': new,
+                'timestamp': '2024-12-01 12:00:00', 'reverses': None,
+            })
+            store.purchases.setdefault((guild_id, growid), []).append(entry_id)
+        return entry_id
+    with store.transaction() as cursor:
+        return store.execute(cursor, """
+            INSERT INTO transaction_log (guild_id, growid, amount, type, details, old_balance, new_balance, timestamp)
+            VALUES (?, ?, -40, 'PURCHASE', ?, ?, ?, '2024-12-01 12:00:00')
+            RETURNING id
+        """, (guild_id, growid, details, old, new)).fetchone()[0]
+
+
+def workload(store, rounds):
+    """Mixed traffic; returns (final state, latency samples)"""
+    samples = {}
+    store.setup(GUILDS[0])
+    for guild_id in GUILDS:
+        store.add_product(guild_id, 'A', 'Alpha', 150, 'first')
+        store.add_product(guild_id, 'B', 'Beta', 20, '')
+        store.set_world(guild_id, f'WORLD{guild_id}', 'owner', 'bot')
+        store.add_stock(guild_id, 'A', [f'a-{guild_id}-{i}' for i in range(rounds)], 'bench', 'a.txt')
+        store.add_stock(guild_id, 'B', [f'b-{guild_id}-{i}' for i in range(rounds * 2)], 'bench', 'b.txt')
+
+    for i in range(rounds):
+        guild_id = GUILDS[i % len(GUILDS)]
+        growid = f'user{i % 10}'
+        timed(samples, 'set_growid', store.set_growid, guild_id, 1000 + i % 10, growid)
+        timed(samples, 'enqueue_donation', store.enqueue_donation, guild_id, growid, 50, 1, 0, '50 WL, 1 DL')
+        if i % 5 == 4:
+            timed(samples, 'credit_donations', store.credit_queued_donations, 100)
+        timed(samples, 'get_growid', store.get_growid, guild_id, 1000 + i % 10)
+        timed(samples, 'get_balance', store.get_balance, guild_id, growid)
+        timed(samples, 'stock_count', store.stock_count, guild_id, 'B')
+        try:
+            timed(samples, 'purchase', store.purchase, guild_id, growid, 'B', 1,
+                  storage.Balance(-20, 0, 0), growid, 'bench purchase')
+        except storage.InsufficientBalance:
+            pass
+        if i % 10 == 0:
+            timed(samples, 'claim_stock', store.claim_stock, guild_id, 'A', 1, 'admin')
+            timed(samples, 'stock_counts', store.stock_counts)
+    store.credit_queued_donations(10000)
+
+    # Refund pembelian baru dan entri ledger format lama
+    refunds = []
+    for guild_id in GUILDS:
+        orders = store.purchase_history(guild_id, 'user1', limit=1)
+        entry_ids = [legacy_purchase(store, guild_id, 'user2')] + [order.id for order in orders]
+        refunds += timed(samples, 'refund_orders', store.refund_orders, guild_id, entry_ids, False, 'bench')
+
+    state = {
+        'balances': {(g, f'user{u}'): tuple(store.get_balance(g, f'user{u}')) for g in GUILDS for u in range(10)},
+        'stock': store.stock_counts(),
+        'stats': {(g, c): tuple(store.stock_stats(g, c))[:3] for g in GUILDS for c in ('A', 'B')},
+        'products': {g: sorted(store.list_products(g)) for g in GUILDS},
+        'worlds': {g: store.get_world(g) for g in GUILDS},
+        'refunds': [(r.guild_id, r.growid, tuple(r.credited), r.items, tuple(r.balance)) for r in refunds],
+    }
+    return state, samples
+
+
+def backends(args):
+    yield storage.MemoryStorage()
+    yield storage.SqliteStorage(os.path.join(tempfile.mkdtemp(prefix='storage-bench-'), 'shop.db'))
+    if args.pg_dsn:
+        from storage.postgres import PostgresStorage
+        store = PostgresStorage(args.pg_dsn)
+        with store.transaction() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {', '.join(TABLES)}")
+        yield store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Storage backend parity and latency')
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--pg-dsn', default=os.environ.get('STORE_BENCH_PG_DSN'))
+    args = parser.parse_args()
+
+    reference = None
+    results = []
+    for store in backends(args):
+        state, samples = workload(store, args.rounds)
+        if reference is None:
+            reference = (store.name, state)
+        elif state != reference[1]:
+            for key in state:
+                if state[key] != reference[1][key]:
+                    print(f"MISMATCH {store.name} vs {reference[0]} in {key}:\n  {state[key]}\n  {reference[1][key]}")
+            sys.exit(1)
+        results.append((store.name, samples))
+        store.close()
+
+    print(f"all {len(results)} backends ended in the same state\n")
+    names = [name for name, _ in results]
+    print(f"{'operation':<18}" + "".join(f"{name + ' p50':>16}" for name in names) + "  (us)")
+    for op in results[0][1]:
+        row = "".join(f"{statistics.median(samples[op]) / 1000:>16.1f}" for _, samples in results)
+        print(f"{op:<18}{row}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Immutable in-memory snapshot of products and world info.
+
+Readers call catalog.current(guild_id) and get a CatalogSnapshot that
+never changes under them; no lock is taken on the read path. Writers
+commit to storage first and then call catalog.refresh(guild_id), which
+builds a new snapshot for that guild and swaps in a new guild map in
+one assignment.
+"""
+import logging
+import threading
+from types import MappingProxyType
+import storage
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    """One immutable version of the catalog"""
+
+    __slots__ = ('version', 'products', 'by_code', 'world')
+
+    def __init__(self, version: int, products, world):
+        self.version = version
+        self.products = tuple(sorted(products, key=lambda p: p.name))
+        self.by_code = MappingProxyType({p.code: p for p in self.products})
+        self.world = world
+
+    def get(self, code: str):
+        return self.by_code.get(code)
+
+
+_EMPTY = CatalogSnapshot(0, (), None)
+_snapshots = MappingProxyType({})
+_rebuild_lock = threading.Lock()
+
+
+def load_snapshot(guild_id: int, version: int) -> CatalogSnapshot:
+    """Read one guild's products and world info from storage"""
+    store = storage.get()
+    return CatalogSnapshot(version, store.list_products(guild_id), store.get_world(guild_id))
+
+
+def refresh(guild_id: int) -> CatalogSnapshot:
+    """Rebuild one guild's snapshot after a committed catalog change"""
+    global _snapshots
+    with _rebuild_lock:
+        snapshot = load_snapshot(guild_id, current(guild_id).version + 1)
+        # Copy-on-write: pembaca tidak pernah melihat map setengah jadi
+        _snapshots = MappingProxyType({**_snapshots, guild_id: snapshot})
+    logger.info(f'Catalog snapshot guild {guild_id} v{snapshot.version}: {len(snapshot.products)} products')
+    return snapshot
+
+
+def refresh_all(guild_ids=()):
+    """Build snapshots for the configured guilds and any guild with products"""
+    for guild_id in sorted(storage.get().catalog_guilds() | set(guild_ids)):
+        refresh(guild_id)
+
+
+def current(guild_id: int) -> CatalogSnapshot:
+    """Current snapshot for a guild; safe to hold for the duration of a request"""
+    return _snapshots.get(guild_id, _EMPTY)
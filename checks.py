@@ -0,0 +1,20 @@
+"""
+Command checks shared by the cogs.
+
+Kept out of main.py: importing main from a cog would run the entry script
+a second time under the module name `main`.
+"""
+import logging
+from discord.ext import commands
+import settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_admin():
+    """Check if user is admin"""
+    async def predicate(ctx):
+        is_admin = ctx.author.id == settings.get().admin_id
+        logger.info(f'Admin check for {ctx.author} (ID: {ctx.author.id}): {is_admin}')
+        return is_admin
+    return commands.check(predicate)
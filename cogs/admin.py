@@ -2,26 +2,41 @@ import discord
 from discord.ext import commands
 import logging
 import datetime
-from main import is_admin
-from database import get_connection, add_balance, subtract_balance
-
-# Konfigurasi logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+import asyncio
+import os
+import io
+import csv
+from checks import is_admin
+import storage
+import query_trace
+import loop_monitor
+import extension_loader
+import settings
+import catalog
+import holds
+import grants
+import analytics
+import forecast
+
 logger = logging.getLogger(__name__)
 
 DATABASE = 'store.db'
 
+# clearChat tuning
+PURGE_BATCH_SIZE = 100
+SINGLE_DELETE_DELAY = 1.0
+PROGRESS_INTERVAL = 3.0
+
 class AdminCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.current_time = datetime.datetime.utcnow()
         self._last_command = {}  # Untuk mencegah duplikasi command
+        self._purges = {}  # channel_id -> cancel event untuk clearChat
 
-    def db_connect(self):
-        return get_connection()
+    def guild_id(self, ctx):
+        """Guild yang datanya dikelola; DM jatuh ke guild utama"""
+        return ctx.guild.id if ctx.guild else settings.get().guild_id
 
     async def check_duplicate_command(self, ctx, command_name, timeout=3):
         """Mencegah duplikasi command dalam waktu tertentu"""
@@ -47,19 +62,9 @@ class AdminCommands(commands.Cog):
         """
         logging.info(f'addProduct command invoked by {ctx.author}')
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("❌ Database connection failed.")
-                return
-
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO products (name, code, price, stock, description) 
-                VALUES (?, ?, ?, 0, ?)
-            """, (name, code, price, description))
-            
-            conn.commit()
-            conn.close()
+            guild_id = self.guild_id(ctx)
+            storage.get().add_product(guild_id, code, name, price, description)
+            catalog.refresh(guild_id)
 
             embed = discord.Embed(
                 title="✅ Product Added Successfully",
@@ -76,6 +81,10 @@ class AdminCommands(commands.Cog):
             await ctx.send(embed=embed)
             logger.info(f'Product {code} added by {ctx.author}')
 
+        except storage.ProductExists:
+            await ctx.send(f"❌ Product with code {code} already exists.")
+        except storage.ProductPurging:
+            await ctx.send(f"⚠️ Stock of the deleted product `{code}` is still being purged. Check `!purges` and try again later.")
         except Exception as e:
             logger.error(f'Error in addProduct: {e}')
             await ctx.send(f"❌ An error occurred: {e}")
@@ -103,78 +112,34 @@ class AdminCommands(commands.Cog):
 
             # Membaca dan memproses file
             with open(file_path, 'r', encoding='utf-8') as file:
-                lines = file.readlines()
-                valid_lines = [line.strip() for line in lines if line.strip()]
-                count = len(valid_lines)
-
-                if count == 0:
-                    await ctx.send("❌ File is empty or contains no valid content.")
-                    return
-
-                conn = self.db_connect()
-                if conn is None:
-                    await ctx.send("❌ Database connection failed.")
-                    return
-
-                cursor = conn.cursor()
-
-                # Create product_stock table if not exists
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS product_stock (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        product_code TEXT,
-                        content TEXT,
-                        used INTEGER DEFAULT 0,
-                        used_by TEXT DEFAULT NULL,
-                        used_at TIMESTAMP DEFAULT NULL,
-                        added_by TEXT,
-                        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        source_file TEXT,
-                        FOREIGN KEY (product_code) REFERENCES products (code)
-                    )
-                """)
-
-                # Verify product exists
-                cursor.execute("SELECT code FROM products WHERE code = ?", (product_code,))
-                if not cursor.fetchone():
-                    await ctx.send(f"❌ Product with code {product_code} does not exist.")
-                    conn.close()
-                    return
-
-                # Update stock count
-                cursor.execute("""
-                    UPDATE products 
-                    SET stock = stock + ? 
-                    WHERE code = ?
-                """, (count, product_code))
-
-                # Insert stock items
-                for content in valid_lines:
-                    cursor.execute("""
-                        INSERT INTO product_stock (
-                            product_code, content, added_by, source_file
-                        ) VALUES (?, ?, ?, ?)
-                    """, (product_code, content, str(ctx.author), file_path))
-
-                conn.commit()
-                conn.close()
-
-                # Send confirmation
-                embed = discord.Embed(
-                    title="✅ Stock Added Successfully",
-                    color=discord.Color.green(),
-                    timestamp=self.current_time
-                )
-                embed.add_field(name="Product Code", value=product_code, inline=True)
-                embed.add_field(name="Items Added", value=str(count), inline=True)
-                embed.add_field(name="Source File", value=file_path, inline=True)
-                embed.set_footer(text=f"Added by {ctx.author}")
+                valid_lines = [line.strip() for line in file if line.strip()]
 
-                await ctx.send(embed=embed)
-                logger.info(f'Added {count} stock items to {product_code} by {ctx.author}')
+            if not valid_lines:
+                await ctx.send("❌ File is empty or contains no valid content.")
+                return
+
+            count = storage.get().add_stock(
+                self.guild_id(ctx), product_code, valid_lines, str(ctx.author), file_path
+            )
+
+            # Send confirmation
+            embed = discord.Embed(
+                title="✅ Stock Added Successfully",
+                color=discord.Color.green(),
+                timestamp=self.current_time
+            )
+            embed.add_field(name="Product Code", value=product_code, inline=True)
+            embed.add_field(name="Items Added", value=str(count), inline=True)
+            embed.add_field(name="Source File", value=file_path, inline=True)
+            embed.set_footer(text=f"Added by {ctx.author}")
+
+            await ctx.send(embed=embed)
+            logger.info(f'Added {count} stock items to {product_code} by {ctx.author}')
 
         except FileNotFoundError:
             await ctx.send(f"❌ File not found: {file_path}")
+        except storage.UnknownProduct:
+            await ctx.send(f"❌ Product with code {product_code} does not exist.")
         except Exception as e:
             logger.error(f'Error in addStock: {e}')
             await ctx.send(f"❌ An error occurred: {e}")
@@ -183,7 +148,7 @@ class AdminCommands(commands.Cog):
     @is_admin()
     async def deleteProduct(self, ctx, code: str):
         """
-        Menghapus produk dan stoknya
+        Menghapus produk; stoknya dibersihkan bertahap di background
         Usage: !deleteProduct <code>
         """
         if await self.check_duplicate_command(ctx, 'deleteProduct'):
@@ -191,32 +156,21 @@ class AdminCommands(commands.Cog):
 
         logging.info(f'deleteProduct command invoked by {ctx.author}')
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("❌ Database connection failed.")
-                return
+            guild_id = self.guild_id(ctx)
+            product = storage.get().delete_product(guild_id, code, str(ctx.author))
 
-            cursor = conn.cursor()
-            
-            # Get product info before deletion
-            cursor.execute("SELECT name FROM products WHERE code = ?", (code,))
-            product = cursor.fetchone()
-            
             if not product:
                 await ctx.send(f"❌ Product with code {code} does not exist.")
-                conn.close()
                 return
 
-            # Delete product and its stock
-            cursor.execute("DELETE FROM products WHERE code = ?", (code,))
-            cursor.execute("DELETE FROM product_stock WHERE product_code = ?", (code,))
-            
-            conn.commit()
-            conn.close()
+            catalog.refresh(guild_id)
+            purger = getattr(self.bot, 'stock_purge', None)
+            if purger:
+                purger.wake()
 
             embed = discord.Embed(
                 title="✅ Product Deleted Successfully",
-                description=f"Product `{code}` and its stock have been deleted.",
+                description=f"Product `{code}` has been removed. Its stock is purged in the background; see `!purges`.",
                 color=discord.Color.red(),
                 timestamp=self.current_time
             )
@@ -251,49 +205,36 @@ class AdminCommands(commands.Cog):
                 return
 
             # Add balance
-            add_balance(growid, wl, dl, bgl)
-
-            # Get updated balance
-            conn = self.db_connect()
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT balance_wl, balance_dl, balance_bgl 
-                FROM users 
-                WHERE growid = ?
-            """, (growid,))
-            balance = cursor.fetchone()
-            conn.close()
-
-            if balance:
-                balance_wl, balance_dl, balance_bgl = balance
-                embed = discord.Embed(
-                    title="💰 Balance Added Successfully",
-                    color=discord.Color.green(),
-                    timestamp=self.current_time
-                )
-                embed.add_field(name="GrowID", value=growid, inline=True)
-                
-                added_amounts = []
-                if wl > 0: added_amounts.append(f"{wl:,} WL")
-                if dl > 0: added_amounts.append(f"{dl:,} DL")
-                if bgl > 0: added_amounts.append(f"{bgl:,} BGL")
-                embed.add_field(
-                    name="Amount Added", 
-                    value=", ".join(added_amounts), 
-                    inline=True
-                )
-                
-                embed.add_field(
-                    name="Current Balance",
-                    value=f"```\n{balance_wl:,} WL\n{balance_dl:,} DL\n{balance_bgl:,} BGL```",
-                    inline=False
-                )
-                embed.set_footer(text=f"Added by {ctx.author}")
+            balance_wl, balance_dl, balance_bgl = storage.get().change_balance(
+                self.guild_id(ctx), growid, wl, dl, bgl, 'ADD', f"Added {wl} WL, {dl} DL, {bgl} BGL"
+            )
 
-                await ctx.send(embed=embed)
-                logger.info(f'Added {wl} WL, {dl} DL, {bgl} BGL to {growid} by {ctx.author}')
-            else:
-                await ctx.send("❌ Failed to retrieve updated balance!")
+            embed = discord.Embed(
+                title="💰 Balance Added Successfully",
+                color=discord.Color.green(),
+                timestamp=self.current_time
+            )
+            embed.add_field(name="GrowID", value=growid, inline=True)
+            
+            added_amounts = []
+            if wl > 0: added_amounts.append(f"{wl:,} WL")
+            if dl > 0: added_amounts.append(f"{dl:,} DL")
+            if bgl > 0: added_amounts.append(f"{bgl:,} BGL")
+            embed.add_field(
+                name="Amount Added", 
+                value=", ".join(added_amounts), 
+                inline=True
+            )
+            
+            embed.add_field(
+                name="Current Balance",
+                value=f"```\n{balance_wl:,} WL\n{balance_dl:,} DL\n{balance_bgl:,} BGL```",
+                inline=False
+            )
+            embed.set_footer(text=f"Added by {ctx.author}")
+
+            await ctx.send(embed=embed)
+            logger.info(f'Added {wl} WL, {dl} DL, {bgl} BGL to {growid} by {ctx.author}')
 
         except Exception as e:
             logger.error(f'Error in addBal: {e}')
@@ -321,50 +262,39 @@ class AdminCommands(commands.Cog):
                 return
 
             # Reduce balance
-            subtract_balance(growid, wl, dl, bgl)
-
-            # Get updated balance
-            conn = self.db_connect()
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT balance_wl, balance_dl, balance_bgl 
-                FROM users 
-                WHERE growid = ?
-            """, (growid,))
-            balance = cursor.fetchone()
-            conn.close()
-
-            if balance:
-                balance_wl, balance_dl, balance_bgl = balance
-                embed = discord.Embed(
-                    title="💰 Balance Reduced Successfully",
-                    color=discord.Color.red(),
-                    timestamp=self.current_time
-                )
-                embed.add_field(name="GrowID", value=growid, inline=True)
-                
-                reduced_amounts = []
-                if wl > 0: reduced_amounts.append(f"{wl:,} WL")
-                if dl > 0: reduced_amounts.append(f"{dl:,} DL")
-                if bgl > 0: reduced_amounts.append(f"{bgl:,} BGL")
-                embed.add_field(
-                    name="Amount Reduced", 
-                    value=", ".join(reduced_amounts), 
-                    inline=True
-                )
-                
-                embed.add_field(
-                    name="Current Balance",
-                    value=f"```\n{balance_wl:,} WL\n{balance_dl:,} DL\n{balance_bgl:,} BGL```",
-                    inline=False
-                )
-                embed.set_footer(text=f"Reduced by {ctx.author}")
+            balance_wl, balance_dl, balance_bgl = storage.get().change_balance(
+                self.guild_id(ctx), growid, -wl, -dl, -bgl, 'SUBTRACT', f"Removed {wl} WL, {dl} DL, {bgl} BGL"
+            )
 
-                await ctx.send(embed=embed)
-                logger.info(f'Reduced {wl} WL, {dl} DL, {bgl} BGL from {growid} by {ctx.author}')
-            else:
-                await ctx.send("❌ Failed to retrieve updated balance!")
+            embed = discord.Embed(
+                title="💰 Balance Reduced Successfully",
+                color=discord.Color.red(),
+                timestamp=self.current_time
+            )
+            embed.add_field(name="GrowID", value=growid, inline=True)
+            
+            reduced_amounts = []
+            if wl > 0: reduced_amounts.append(f"{wl:,} WL")
+            if dl > 0: reduced_amounts.append(f"{dl:,} DL")
+            if bgl > 0: reduced_amounts.append(f"{bgl:,} BGL")
+            embed.add_field(
+                name="Amount Reduced", 
+                value=", ".join(reduced_amounts), 
+                inline=True
+            )
+            
+            embed.add_field(
+                name="Current Balance",
+                value=f"```\n{balance_wl:,} WL\n{balance_dl:,} DL\n{balance_bgl:,} BGL```",
+                inline=False
+            )
+            embed.set_footer(text=f"Reduced by {ctx.author}")
+
+            await ctx.send(embed=embed)
+            logger.info(f'Reduced {wl} WL, {dl} DL, {bgl} BGL from {growid} by {ctx.author}')
 
+        except storage.InsufficientBalance:
+            await ctx.send(f"❌ Insufficient balance! `{growid}` does not have that much.")
         except Exception as e:
             logger.error(f'Error in reduceBal: {e}')
             await ctx.send(f"❌ An error occurred: {e}")
@@ -385,40 +315,22 @@ class AdminCommands(commands.Cog):
                 await ctx.send("❌ Price must be positive!")
                 return
 
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("❌ Database connection failed.")
-                return
-
-            cursor = conn.cursor()
-            
-            # Check if product exists and get old price
-            cursor.execute("SELECT name, price FROM products WHERE code = ?", (code,))
-            product = cursor.fetchone()
+            guild_id = self.guild_id(ctx)
+            product = storage.get().update_product(guild_id, code, price=new_price)
             
             if not product:
                 await ctx.send(f"❌ Product with code {code} does not exist.")
-                conn.close()
                 return
 
-            name, old_price = product
-
-            # Update price
-            cursor.execute("""
-                UPDATE products 
-                SET price = ? 
-                WHERE code = ?
-            """, (new_price, code))
-            
-            conn.commit()
-            conn.close()
+            catalog.refresh(guild_id)
+            old_price = product.price
 
             embed = discord.Embed(
                 title="✅ Price Changed Successfully",
                 color=discord.Color.blue(),
                 timestamp=self.current_time
             )
-            embed.add_field(name="Product", value=name, inline=True)
+            embed.add_field(name="Product", value=product.name, inline=True)
             embed.add_field(name="Code", value=code, inline=True)
             embed.add_field(name="Old Price", value=f"{old_price:,} WL", inline=True)
             embed.add_field(name="New Price", value=f"{new_price:,} WL", inline=True)
@@ -443,38 +355,21 @@ class AdminCommands(commands.Cog):
 
         logging.info(f'setDescription command invoked by {ctx.author}')
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("❌ Database connection failed.")
-                return
-
-            cursor = conn.cursor()
-            
-            # Check if product exists
-            cursor.execute("SELECT name FROM products WHERE code = ?", (code,))
-            product = cursor.fetchone()
+            guild_id = self.guild_id(ctx)
+            product = storage.get().update_product(guild_id, code, description=description)
             
             if not product:
                 await ctx.send(f"❌ Product with code {code} does not exist.")
-                conn.close()
                 return
 
-            # Update description
-            cursor.execute("""
-                UPDATE products 
-                SET description = ? 
-                WHERE code = ?
-            """, (description, code))
-            
-            conn.commit()
-            conn.close()
+            catalog.refresh(guild_id)
 
             embed = discord.Embed(
                 title="✅ Description Updated Successfully",
                 color=discord.Color.blue(),
                 timestamp=self.current_time
             )
-            embed.add_field(name="Product", value=product[0], inline=True)
+            embed.add_field(name="Product", value=product.name, inline=True)
             embed.add_field(name="Code", value=code, inline=True)
             embed.add_field(name="New Description", value=description, inline=False)
             embed.set_footer(text=f"Updated by {ctx.author}")
@@ -498,37 +393,16 @@ class AdminCommands(commands.Cog):
 
         logging.info(f'setWorld command invoked by {ctx.author}')
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("❌ Database connection failed.")
-                return
-
-            cursor = conn.cursor()
+            guild_id = self.guild_id(ctx)
+            store = storage.get()
             
             # Check current world info
-            cursor.execute("SELECT world, owner, bot FROM world_info WHERE id = 1")
-            existing = cursor.fetchone()
-
-            # Update or insert world info
-            if existing:
-                if existing == (world, owner, bot_name):
-                    await ctx.send(f"⚠️ World info is already set to these values.")
-                    conn.close()
-                    return
-                    
-                cursor.execute("""
-                    UPDATE world_info 
-                    SET world = ?, owner = ?, bot = ? 
-                    WHERE id = 1
-                """, (world, owner, bot_name))
-            else:
-                cursor.execute("""
-                    INSERT INTO world_info (id, world, owner, bot) 
-                    VALUES (1, ?, ?, ?)
-                """, (world, owner, bot_name))
+            if store.get_world(guild_id) == (world, owner, bot_name):
+                await ctx.send(f"⚠️ World info is already set to these values.")
+                return
 
-            conn.commit()
-            conn.close()
+            existing = store.set_world(guild_id, world, owner, bot_name)
+            catalog.refresh(guild_id)
 
             embed = discord.Embed(
                 title="✅ World Info Updated Successfully",
@@ -569,59 +443,22 @@ class AdminCommands(commands.Cog):
                 await ctx.send("❌ Count must be positive!")
                 return
 
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("❌ Database connection failed.")
-                return
-
-            cursor = conn.cursor()
-
-            # Get available stock items
-            cursor.execute("""
-                SELECT id, content 
-                FROM product_stock 
-                WHERE product_code = ? AND used = 0 
-                LIMIT ?
-            """, (code, count))
-            
-            items = cursor.fetchall()
-            if not items:
-                await ctx.send("❌ No stock available.")
-                conn.close()
+            guild_id = self.guild_id(ctx)
+            try:
+                items = storage.get().claim_stock(
+                    guild_id, code, count, str(user), holds.book.held_quantity(guild_id, code)
+                )
+            except storage.UnknownProduct:
+                await ctx.send(f"❌ Product with code {code} does not exist.")
                 return
-            
-            if len(items) < count:
-                await ctx.send(f"❌ Not enough stock available. Only {len(items)} items left.")
-                conn.close()
+            except storage.InsufficientStock as e:
+                if e.available == 0:
+                    await ctx.send("❌ No stock available.")
+                else:
+                    await ctx.send(f"❌ Not enough stock available. Only {e.available} items left.")
                 return
 
-            # Update stock status
-            current_time = self.current_time.strftime('%Y-%m-%d %H:%M:%S')
-            for item_id, _ in items:
-                cursor.execute("""
-                    UPDATE product_stock 
-                    SET used = 1, used_by = ?, used_at = ? 
-                    WHERE id = ?
-                """, (str(user), current_time, item_id))
-
-            # Update product stock count
-            cursor.execute("""
-                UPDATE products 
-                SET stock = stock - ? 
-                WHERE code = ?
-            """, (len(items), code))
-
-            conn.commit()
-
-            # Get product info for embed
-            cursor.execute("""
-                SELECT name, price 
-                FROM products 
-                WHERE code = ?
-            """, (code,))
-            product = cursor.fetchone()
-            
-            conn.close()
+            product = catalog.current(guild_id).get(code)
 
             # Send items to user
             content_message = f"You received {len(items)} items of {code}:\n\n"
@@ -643,7 +480,7 @@ class AdminCommands(commands.Cog):
                     timestamp=self.current_time
                 )
                 embed.add_field(name="Recipient", value=user.mention, inline=True)
-                embed.add_field(name="Product", value=product[0] if product else code, inline=True)
+                embed.add_field(name="Product", value=product.name if product else code, inline=True)
                 embed.add_field(name="Amount", value=str(len(items)), inline=True)
                 embed.set_footer(text=f"Sent by {ctx.author}")
 
@@ -658,6 +495,341 @@ class AdminCommands(commands.Cog):
             logger.error(f'Error in send: {e}')
             await ctx.send(f"❌ An error occurred: {e}")
 
+    async def resolve_grant(self, guild_id, rows):
+        """Validasi semua baris sekaligus; mengembalikan (users, errors)"""
+        errors = []
+        users = {}
+        for user_id in dict.fromkeys(row.user_id for row in rows):
+            user = self.bot.get_user(user_id)
+            if user is None:
+                try:
+                    user = await self.bot.fetch_user(user_id)
+                except discord.NotFound:
+                    user = None
+            users[user_id] = user
+
+        snapshot = catalog.current(guild_id)
+        needed = {}
+        for row in rows:
+            if users[row.user_id] is None:
+                errors.append(f"line {row.line}: user {row.user_id} not found")
+            if snapshot.get(row.code) is None:
+                errors.append(f"line {row.line}: product {row.code} does not exist")
+            else:
+                needed[row.code] = needed.get(row.code, 0) + row.count
+
+        store = storage.get()
+        for code, count in needed.items():
+            available = await asyncio.to_thread(store.stock_count, guild_id, code)
+            available -= holds.book.held_quantity(guild_id, code)
+            if available < count:
+                errors.append(f"{code}: grant needs {count} items, only {max(available, 0)} available")
+        return users, errors
+
+    @commands.command()
+    @is_admin()
+    async def bulkGrant(self, ctx):
+        """
+        Mengirim produk ke banyak user dari file CSV berisi user,product,count
+        Usage: !bulkGrant (lampirkan file CSV)
+        """
+        if await self.check_duplicate_command(ctx, 'bulkGrant'):
+            return
+
+        logging.info(f'bulkGrant command invoked by {ctx.author}')
+        try:
+            if not ctx.message.attachments:
+                await ctx.send("❌ Attach a CSV file with `user,product,count` rows.")
+                return
+            text = (await ctx.message.attachments[0].read()).decode('utf-8-sig')
+            rows, errors = grants.parse_csv(text, settings.get().bulk_grant.max_rows)
+            if not rows and not errors:
+                await ctx.send("❌ File is empty or contains no valid content.")
+                return
+
+            guild_id = self.guild_id(ctx)
+            users, problems = await self.resolve_grant(guild_id, rows)
+            errors += problems
+            if errors:
+                shown = errors[:20] + ([f"... and {len(errors) - 20} more"] if len(errors) > 20 else [])
+                await ctx.send(f"❌ {len(errors)} problem(s) found, nothing was sent:\n" + "\n".join(shown))
+                return
+
+            # Semua stok diklaim dalam satu transaksi; gagal berarti tidak ada yang diklaim
+            reserved = {row.code: holds.book.held_quantity(guild_id, row.code) for row in rows}
+            try:
+                claimed = await asyncio.to_thread(
+                    storage.get().claim_batch, guild_id,
+                    [(row.code, row.count, str(users[row.user_id])) for row in rows], reserved
+                )
+            except storage.InsufficientStock as e:
+                await ctx.send(f"❌ Stock of {e.code} changed while validating, only {e.available} left. Nothing was sent.")
+                return
+            except storage.UnknownProduct as e:
+                await ctx.send(f"❌ Product {e.code} was deleted while validating. Nothing was sent.")
+                return
+
+            total = sum(len(items) for items in claimed)
+            await ctx.send(f"📦 Claimed {total:,} items for {len(rows):,} rows; delivering DMs...")
+
+            futures = []
+            for row, items in zip(rows, claimed):
+                message = f"You received {len(items)} items of {row.code}:\n\n"
+                message += "".join(f"{i}. {content}\n" for i, (_, content) in enumerate(items, 1))
+                futures.append(self.bot.delivery.submit(users[row.user_id], grants.split_message(message)))
+            statuses = await asyncio.gather(*futures)
+
+            # Item yang sama sekali tidak terkirim dikembalikan ke stok
+            undelivered = [item.id for status, items in zip(statuses, claimed)
+                           if status in (grants.DM_CLOSED, grants.FAILED) for item in items]
+            returned = 0
+            if undelivered:
+                returned = await asyncio.to_thread(storage.get().return_stock, guild_id, undelivered)
+
+            report = io.StringIO()
+            writer = csv.writer(report)
+            writer.writerow(['line', 'user_id', 'product', 'count', 'status'])
+            counts = {}
+            for row, status in zip(rows, statuses):
+                counts[status] = counts.get(status, 0) + 1
+                writer.writerow([row.line, row.user_id, row.code, row.count, status])
+
+            embed = discord.Embed(
+                title="✅ Bulk Grant Finished",
+                color=discord.Color.green() if counts.get(grants.DELIVERED) == len(rows) else discord.Color.orange(),
+                timestamp=self.current_time
+            )
+            embed.add_field(name="Delivered", value=str(counts.get(grants.DELIVERED, 0)), inline=True)
+            embed.add_field(name="DMs Closed", value=str(counts.get(grants.DM_CLOSED, 0)), inline=True)
+            embed.add_field(name="Failed", value=str(counts.get(grants.FAILED, 0)), inline=True)
+            if counts.get(grants.PARTIAL):
+                embed.add_field(name="Partially Delivered", value=str(counts[grants.PARTIAL]), inline=True)
+            embed.add_field(name="Returned to Stock", value=f"{returned:,} items", inline=True)
+            embed.set_footer(text=f"Granted by {ctx.author}")
+
+            await ctx.send(embed=embed, file=discord.File(io.BytesIO(report.getvalue().encode('utf-8')),
+                                                           filename='grant_results.csv'))
+            logger.info(f'Bulk grant of {total} items to {len(rows)} rows by {ctx.author}: {counts}')
+
+        except Exception as e:
+            logger.error(f'Error in bulkGrant: {e}')
+            await ctx.send(f"❌ An error occurred: {e}")
+
+    @commands.command()
+    @is_admin()
+    async def setCompression(self, ctx, code: str, mode: str):
+        """
+        Mengaktifkan kompresi untuk stok baru suatu produk
+        Usage: !setCompression <code> <on|off|retrain>
+        """
+        logging.info(f'setCompression command invoked by {ctx.author}')
+        mode = mode.lower()
+        if mode not in ('on', 'off', 'retrain'):
+            await ctx.send("❌ Mode must be `on`, `off` or `retrain`.")
+            return
+        try:
+            guild_id = self.guild_id(ctx)
+            store = storage.get()
+            previous = await asyncio.to_thread(store.set_compression, guild_id, code, mode != 'off')
+            message = f"✅ Compression for `{code}` is now {'off' if mode == 'off' else 'on'} (was {'on' if previous else 'off'})."
+            if mode == 'retrain' or (mode == 'on' and not previous):
+                # Dictionary dari stok yang sudah ada; kalau kosong, dilatih dari addStock berikutnya
+                dict_id = await asyncio.to_thread(store.train_dictionary, guild_id, code)
+                message += f"\nDictionary #{dict_id} trained from existing stock." if dict_id else \
+                    "\nNo stock to train on yet; the next addStock batch trains the dictionary."
+            message += "\nOnly stock added from now on is affected."
+            await ctx.send(message)
+            logger.info(f'Compression for {code} set to {mode} by {ctx.author}')
+        except storage.UnknownProduct:
+            await ctx.send(f"❌ Product with code {code} does not exist.")
+        except Exception as e:
+            logger.error(f'Error in setCompression: {e}')
+            await ctx.send(f"❌ An error occurred: {e}")
+
+    @commands.command()
+    @is_admin()
+    async def purges(self, ctx):
+        """
+        Menampilkan progress penghapusan stok produk yang dihapus
+        Usage: !purges
+        """
+        logging.info(f'purges command invoked by {ctx.author}')
+        try:
+            guild_id = self.guild_id(ctx)
+            jobs = [job for job in await asyncio.to_thread(storage.get().purge_jobs, True)
+                    if job.guild_id == guild_id][-10:]
+            if not jobs:
+                await ctx.send("✅ No stock purges recorded.")
+                return
+
+            lines = []
+            for job in jobs:
+                total = f"{job.rows_total:,}" if job.rows_total is not None else "?"
+                if job.finished_at:
+                    status = f"done {job.finished_at}"
+                elif job.rows_total:
+                    status = f"{job.rows_purged / job.rows_total:.0%}"
+                else:
+                    status = "pending"
+                lines.append(f"#{job.id} `{job.code}` {job.rows_purged:,}/{total} rows, {status} (by {job.requested_by})")
+            await ctx.send("🧹 Stock purges:\n" + "\n".join(lines))
+        except Exception as e:
+            logger.error(f'Error in purges: {e}')
+            await ctx.send(f"❌ An error occurred: {e}")
+
+    async def run_refund(self, ctx, entry_ids, mode):
+        """Refund ledger entries sekaligus dan melaporkan hasilnya"""
+        mode = mode.lower()
+        if mode not in ('void', 'restock'):
+            await ctx.send("❌ Mode must be `void` or `restock`.")
+            return
+        try:
+            refunds = await asyncio.to_thread(
+                storage.get().refund_orders, self.guild_id(ctx), entry_ids, mode == 'restock', str(ctx.author)
+            )
+        except storage.NotRefundable as e:
+            await ctx.send(f"❌ {e}. Nothing was refunded.")
+            return
+
+        lines = [
+            f"#{r.entry_id} → #{r.refund_id} `{r.growid}`: +{r.credited.wl:,} WL, {r.credited.dl:,} DL, {r.credited.bgl:,} BGL, "
+            f"{r.items} items {'restocked' if mode == 'restock' else 'voided'}"
+            for r in refunds
+        ]
+        if len(lines) > 15:
+            lines = lines[:15] + [f"... and {len(lines) - 15} more"]
+        await ctx.send(f"✅ Refunded {len(refunds)} order(s):\n" + "\n".join(lines))
+        logger.info(f'Refunded {[r.entry_id for r in refunds]} ({mode}) by {ctx.author}')
+
+    @commands.command()
+    @is_admin()
+    async def refund(self, ctx, entry_id: int, mode: str = 'void'):
+        """
+        Membatalkan pembelian: balance dikembalikan, item di-void atau dikembalikan ke stok
+        Usage: !refund <transaction_id> [void|restock]
+        """
+        if await self.check_duplicate_command(ctx, 'refund'):
+            return
+
+        logging.info(f'refund command invoked by {ctx.author}')
+        try:
+            await self.run_refund(ctx, [entry_id], mode)
+        except Exception as e:
+            logger.error(f'Error in refund: {e}')
+            await ctx.send(f"❌ An error occurred: {e}")
+
+    @commands.command()
+    @is_admin()
+    async def refundFile(self, ctx, source_file: str, mode: str = 'void'):
+        """
+        Membatalkan semua pembelian yang menerima item dari file stok tertentu
+        (pembelian lama tanpa purchase_id tidak ikut)
+        Usage: !refundFile <source_file> [void|restock]
+        """
+        if await self.check_duplicate_command(ctx, 'refundFile'):
+            return
+
+        logging.info(f'refundFile command invoked by {ctx.author}')
+        try:
+            entry_ids = await asyncio.to_thread(
+                storage.get().purchase_entries_for_file, self.guild_id(ctx), source_file
+            )
+            # Item yang terjual sebelum purchase_id dicatat tidak terhubung ke pembeliannya
+            legacy_note = "Purchases made before orders were linked to stock are not included; refund those with `!refund <id>`."
+            if not entry_ids:
+                await ctx.send(f"❌ No purchases found with items from `{source_file}`. {legacy_note}")
+                return
+            await self.run_refund(ctx, entry_ids, mode)
+            await ctx.send(f"ℹ️ {legacy_note}")
+        except Exception as e:
+            logger.error(f'Error in refundFile: {e}')
+            await ctx.send(f"❌ An error occurred: {e}")
+
+    @commands.command(name='analytics')
+    @is_admin()
+    async def analytics_report(self, ctx, days: int = 7):
+        """
+        Menampilkan produk terlaris, pembeli teratas, dan tren pendapatan
+        Usage: !analytics [days]
+        """
+        logging.info(f'analytics command invoked by {ctx.author}')
+        if not 1 <= days <= 365:
+            await ctx.send("❌ Days must be between 1 and 365.")
+            return
+        try:
+            guild_id = self.guild_id(ctx)
+            report = await asyncio.to_thread(analytics.report, storage.get(), guild_id, days)
+            if not report.trend:
+                await ctx.send(f"❌ No sales in the last {days} day(s).")
+                return
+
+            snapshot = catalog.current(guild_id)
+            embed = discord.Embed(
+                title=f"📈 Sales, last {days} day(s)",
+                color=discord.Color.blue(),
+                timestamp=self.current_time
+            )
+            revenue = sum(total.revenue for total in report.trend)
+            orders = sum(total.orders for total in report.trend)
+            embed.add_field(name="Revenue", value=f"{revenue:,} WL", inline=True)
+            embed.add_field(name="Orders", value=f"{orders:,}", inline=True)
+            embed.add_field(name="Items", value=f"{sum(total.items for total in report.trend):,}", inline=True)
+
+            def product_name(code):
+                product = snapshot.get(code)
+                return f"{product.name} ({code})" if product else code
+
+            embed.add_field(
+                name="Top Products",
+                value="\n".join(f"{i}. {product_name(total.key)}: {total.revenue:,} WL, {total.items:,} items"
+                                for i, total in enumerate(report.top_products, 1)) or "-",
+                inline=False
+            )
+            embed.add_field(
+                name="Top Buyers",
+                value="\n".join(f"{i}. {total.key}: {total.revenue:,} WL, {total.orders:,} orders"
+                                for i, total in enumerate(report.top_buyers, 1)) or "-",
+                inline=False
+            )
+
+            # Tren dalam bentuk bar teks; bucket tanpa penjualan tidak ditampilkan
+            fmt = '%m-%d %H:00' if report.period == 'hour' else '%Y-%m-%d'
+            peak = max(total.revenue for total in report.trend) or 1
+            lines = [
+                f"{datetime.datetime.utcfromtimestamp(total.key).strftime(fmt)} "
+                f"{'█' * max(0, round(total.revenue / peak * 12)):<12} {total.revenue:,}"
+                for total in report.trend[-24:]
+            ]
+            embed.add_field(name=f"Revenue per {report.period} (UTC)", value="```\n" + "\n".join(lines) + "```", inline=False)
+            embed.set_footer(text="From sales rollups")
+
+            await ctx.send(embed=embed)
+        except Exception as e:
+            logger.error(f'Error in analytics: {e}')
+            await ctx.send(f"❌ An error occurred: {e}")
+
+    @commands.command()
+    @is_admin()
+    async def rebuildRollups(self, ctx):
+        """
+        Menghitung ulang rollup penjualan dari riwayat transaksi
+        Usage: !rebuildRollups
+        """
+        if await self.check_duplicate_command(ctx, 'rebuildRollups'):
+            return
+
+        logging.info(f'rebuildRollups command invoked by {ctx.author}')
+        try:
+            await ctx.send("⏳ Rebuilding sales rollups from the ledger; purchases wait until it finishes...")
+            start = datetime.datetime.utcnow()
+            counted = await asyncio.to_thread(storage.get().rebuild_rollups, self.guild_id(ctx))
+            elapsed = (datetime.datetime.utcnow() - start).total_seconds()
+            await ctx.send(f"✅ Sales rollups rebuilt from {counted:,} purchases in {elapsed:.1f}s.")
+            logger.info(f'Sales rollups rebuilt ({counted} purchases) by {ctx.author}')
+        except Exception as e:
+            logger.error(f'Error in rebuildRollups: {e}')
+            await ctx.send(f"❌ An error occurred: {e}")
+
     @commands.command()
     @is_admin()
     async def checkStock(self, ctx, product_code: str):
@@ -670,42 +842,16 @@ class AdminCommands(commands.Cog):
 
         logging.info(f'checkStock command invoked by {ctx.author}')
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("❌ Database connection failed.")
-                return
-                
-            cursor = conn.cursor()
-            
-            # Get product info
-            cursor.execute("""
-                SELECT name, price, description 
-                FROM products 
-                WHERE code = ?
-            """, (product_code,))
-            
-            product_info = cursor.fetchone()
-            if not product_info:
+            guild_id = self.guild_id(ctx)
+            product = catalog.current(guild_id).get(product_code)
+            if not product:
                 await ctx.send(f"❌ Product with code `{product_code}` does not exist.")
-                conn.close()
                 return
 
-            name, price, description = product_info
+            name, price, description = product.name, product.price, product.description
             
             # Get stock stats
-            cursor.execute("""
-                SELECT 
-                    COUNT(CASE WHEN used = 0 THEN 1 END) as available,
-                    COUNT(CASE WHEN used = 1 THEN 1 END) as used,
-                    COUNT(*) as total,
-                    MAX(added_at) as last_added,
-                    MAX(used_at) as last_used
-                FROM product_stock 
-                WHERE product_code = ?
-            """, (product_code,))
-            
-            stats = cursor.fetchone()
-            available, used, total, last_added, last_used = stats
+            available, used, total, last_added, last_used = storage.get().stock_stats(guild_id, product_code)
             
             embed = discord.Embed(
                 title=f"📊 Stock Status: {name}",
@@ -718,25 +864,223 @@ class AdminCommands(commands.Cog):
             embed.add_field(name="Available", value=f"`{available:,}`", inline=True)
             embed.add_field(name="Used", value=f"`{used:,}`", inline=True)
             embed.add_field(name="Total", value=f"`{total:,}`", inline=True)
+
+            # Perkiraan habis dari kecepatan penjualan (EWMA)
+            rate = forecast.velocity.rate(guild_id, product_code)
+            eta = forecast.velocity.eta(guild_id, product_code, available)
+            embed.add_field(name="Sales Rate", value=f"`{rate * 24:,.1f}/day`", inline=True)
+            embed.add_field(
+                name="Est. Stock-out",
+                value=f"`{'sold out' if available == 0 and eta is not None else forecast.describe_eta(eta)}`",
+                inline=True
+            )
             
             if description:
                 embed.add_field(name="Description", value=description, inline=False)
             if last_added:
-                embed.add_field(name="Last Added", value=last_added, inline=False)
+                embed.add_field(name="Last Added", value=str(last_added), inline=False)
             if last_used:
-                embed.add_field(name="Last Used", value=last_used, inline=False)
+                embed.add_field(name="Last Used", value=str(last_used), inline=False)
             
             embed.set_footer(text=f"Requested by {ctx.author}")
             
             await ctx.send(embed=embed)
-            
-            conn.close()
             logger.info(f'Stock checked for {product_code} by {ctx.author}')
             
         except Exception as e:
             logger.error(f'Error in checkStock: {e}')
             await ctx.send(f"❌ An error occurred: {e}")
 
+    @commands.command()
+    @is_admin()
+    async def queryStats(self, ctx, n: int = None, action: str = None):
+        """
+        Menampilkan query SQL paling lambat dan paling sering
+        Usage: !queryStats [n] [reset]
+        """
+        logging.info(f'queryStats command invoked by {ctx.author}')
+        try:
+            if not query_trace.TRACE_ENABLED:
+                await ctx.send("⚠️ Query tracing is disabled. Set `query_trace.enabled` in config.json.")
+                return
+
+            n = max(1, min(query_trace.TOP_N if n is None else n, 20))
+            tables = [
+                query_trace.format_table(query_trace.tracer.slowest(n), "Slowest (by max)"),
+                query_trace.format_table(query_trace.tracer.most_frequent(n), "Most frequent"),
+                query_trace.format_table(query_trace.tracer.most_expensive(n), "Most total time"),
+            ]
+            for table in tables:
+                for i in range(0, len(table), 1900):
+                    await ctx.send(f"```\n{table[i:i+1900]}```")
+
+            if action == 'reset':
+                query_trace.tracer.reset()
+                await ctx.send("✅ Query statistics have been reset.")
+
+        except Exception as e:
+            logger.error(f'Error in queryStats: {e}')
+            await ctx.send(f"❌ An error occurred: {e}")
+
+    @commands.command()
+    @is_admin()
+    async def loopStats(self, ctx):
+        """
+        Menampilkan statistik lag event loop
+        Usage: !loopStats
+        """
+        logging.info(f'loopStats command invoked by {ctx.author}')
+        if loop_monitor.monitor is None:
+            await ctx.send("⚠️ Loop monitor is disabled. Set `loop_monitor.enabled` in config.json.")
+            return
+        await ctx.send(f"```\n{loop_monitor.monitor.summary()[:1900]}```")
+
+    @commands.command()
+    @is_admin()
+    async def extensions(self, ctx):
+        """
+        Menampilkan laporan startup extension
+        Usage: !extensions
+        """
+        report = getattr(self.bot, 'startup_report', None)
+        if report is None:
+            await ctx.send("⚠️ No startup report available.")
+            return
+        loaded = ", ".join(sorted(self.bot.extensions)) or "-"
+        await ctx.send(f"```\n{report.format()[:1800]}```\nLoaded now: {loaded}")
+
+    @commands.command()
+    @is_admin()
+    async def reloadExt(self, ctx, name: str):
+        """
+        Memuat ulang satu extension tanpa restart bot
+        Usage: !reloadExt <ext.name>
+        """
+        logging.info(f'reloadExt command invoked by {ctx.author}')
+        try:
+            duration_ms = await extension_loader.reload_extension(self.bot, name)
+            await ctx.send(f"✅ Reloaded `{name}` in {duration_ms:.1f} ms")
+            logger.info(f'Extension {name} reloaded by {ctx.author} in {duration_ms:.1f} ms')
+        except Exception as e:
+            logger.error(f'Error reloading {name}: {e}')
+            await ctx.send(f"❌ Failed to reload `{name}`: {e}")
+
+    @commands.command()
+    @is_admin()
+    async def reloadConfig(self, ctx):
+        """
+        Memuat ulang config.json tanpa restart bot
+        Usage: !reloadConfig
+        """
+        logging.info(f'reloadConfig command invoked by {ctx.author}')
+        try:
+            changed = settings.reload()
+            if changed:
+                await ctx.send(f"✅ Config reloaded. Changed: `{', '.join(changed)}`")
+            else:
+                await ctx.send("ℹ️ Config reloaded, nothing changed.")
+        except settings.SettingsError as e:
+            await ctx.send(f"❌ Config rejected, keeping current settings: {e}")
+
+    @commands.command()
+    @is_admin()
+    async def backup(self, ctx):
+        """
+        Membuat backup database sekarang
+        Usage: !backup
+        """
+        logging.info(f'backup command invoked by {ctx.author}')
+        service = getattr(self.bot, 'backups', None)
+        if service is None:
+            await ctx.send("⚠️ Backups are only available with the SQLite storage backend.")
+            return
+        progress = await ctx.send("🗄️ Backup running...")
+        try:
+            result = await service.run_once()
+            await progress.edit(content=(
+                f"✅ Backup `{os.path.basename(result.path)}` done in {result.duration:.2f}s\n"
+                f"Size: {result.db_size / 1024:,.1f} KiB -> {result.compressed_size / 1024:,.1f} KiB compressed\n"
+                f"Integrity: `{result.integrity}`, {result.steps} steps, {result.restarts} restarts, "
+                f"{len(result.pruned)} old backups pruned"
+            ))
+            logger.info(f'Backup {result.path} taken by {ctx.author}')
+        except Exception as e:
+            logger.error(f'Error in backup: {e}')
+            await progress.edit(content=f"❌ Backup failed: {e}")
+
+    async def stream_purge(self, channel, limit, cancel, progress):
+        """
+        Hapus pesan secara streaming tanpa menampung seluruh history.
+
+        Messages younger than 14 days are bulk-deleted in batches of 100,
+        with the next batch collected while the previous delete is in
+        flight. Older messages fall back to rate-limited single deletes.
+        """
+        cutoff = discord.utils.utcnow() - datetime.timedelta(days=14) + datetime.timedelta(minutes=1)
+        stats = {'bulk': 0, 'single': 0, 'scanned': 0}
+        batch = []
+        pending = None
+        last_edit = 0.0
+
+        async def flush(messages):
+            if len(messages) == 1:
+                await messages[0].delete()
+            else:
+                await channel.delete_messages(messages)
+            stats['bulk'] += len(messages)
+
+        try:
+            # Pesan progress ikut terbaca di history, jadi limit ditambah satu
+            async for message in channel.history(limit=None if limit is None else limit + 1):
+                if cancel.is_set():
+                    break
+                if message.id == progress.id:
+                    continue
+                if limit is not None and stats['scanned'] >= limit:
+                    break
+                stats['scanned'] += 1
+
+                if message.created_at > cutoff:
+                    batch.append(message)
+                    if len(batch) == PURGE_BATCH_SIZE:
+                        if pending:
+                            await pending
+                        pending = asyncio.create_task(flush(batch))
+                        batch = []
+                else:
+                    # Bulk delete tidak berlaku untuk pesan > 14 hari
+                    try:
+                        await message.delete()
+                        stats['single'] += 1
+                    except discord.NotFound:
+                        pass
+                    await asyncio.sleep(SINGLE_DELETE_DELAY)
+
+                now = asyncio.get_running_loop().time()
+                if now - last_edit >= PROGRESS_INTERVAL:
+                    last_edit = now
+                    await progress.edit(content=(
+                        f"🧹 Clearing... scanned {stats['scanned']:,}, "
+                        f"deleted {stats['bulk'] + stats['single']:,} "
+                        f"({stats['single']:,} old). Use `!cancelClear` to stop."
+                    ))
+
+            if pending:
+                await pending
+                pending = None
+            if batch and not cancel.is_set():
+                await flush(batch)
+        finally:
+            # Jangan tinggalkan task flush yang masih berjalan kalau loop gagal di tengah
+            if pending and not pending.done():
+                pending.cancel()
+            if pending:
+                try:
+                    await pending
+                except (asyncio.CancelledError, Exception) as e:
+                    logger.warning(f'Pending clearChat batch did not finish: {e!r}')
+        return stats
+
     @commands.command()
     @is_admin()
     async def clearChat(self, ctx, amount: int = None):
@@ -747,42 +1091,37 @@ class AdminCommands(commands.Cog):
         if await self.check_duplicate_command(ctx, 'clearChat'):
             return
 
+        if ctx.channel.id in self._purges:
+            await ctx.send("⚠️ A clear is already running in this channel. Use `!cancelClear` to stop it.")
+            return
+
+        if amount is not None and amount < 1:
+            error_msg = await ctx.send("❌ Please specify a positive number!")
+            await error_msg.delete(delay=3)
+            return
+
+        cancel = asyncio.Event()
+        self._purges[ctx.channel.id] = cancel
+        progress = None
         try:
             # Delete command message first
             await ctx.message.delete()
+            progress = await ctx.send("🧹 Clearing messages...")
+
+            stats = await self.stream_purge(ctx.channel, amount, cancel, progress)
+            deleted = stats['bulk'] + stats['single']
 
-            if amount is None:
-                # Clear all messages
-                messages = []
-                async for message in ctx.channel.history(limit=None):
-                    messages.append(message)
-                
-                if not messages:
-                    error_msg = await ctx.send("❌ No messages to delete!")
-                    await error_msg.delete(delay=3)
-                    return
-
-                # Delete in chunks of 100
-                while messages:
-                    chunk = messages[:100]
-                    messages = messages[100:]
-                    await ctx.channel.delete_messages(chunk)
-                
-                confirm_msg = await ctx.send("✅ All messages have been cleared!")
-                await confirm_msg.delete(delay=3)
+            if cancel.is_set():
+                await progress.edit(content=f"⏹️ Clear cancelled after deleting {deleted:,} messages.")
+            elif deleted == 0:
+                await progress.edit(content="❌ No messages to delete!")
             else:
-                if amount < 1:
-                    error_msg = await ctx.send("❌ Please specify a positive number!")
-                    await error_msg.delete(delay=3)
-                    return
-                
-                deleted = await ctx.channel.purge(limit=amount)
-                confirm_msg = await ctx.send(f"✅ Deleted {len(deleted)} messages!")
-                await confirm_msg.delete(delay=3)
+                await progress.edit(content=f"✅ Deleted {deleted:,} messages ({stats['single']:,} older than 14 days).")
+            await progress.delete(delay=5)
 
             logger.info(
-                f'Chat cleared in #{ctx.channel.name} by {ctx.author} '
-                f'at {self.current_time.strftime("%Y-%m-%d %H:%M:%S UTC")}'
+                f'Chat cleared in #{ctx.channel.name} by {ctx.author}: '
+                f'{deleted} deleted, cancelled={cancel.is_set()}'
             )
 
         except discord.Forbidden:
@@ -796,6 +1135,22 @@ class AdminCommands(commands.Cog):
             error_msg = await ctx.send("❌ An unexpected error occurred!")
             await error_msg.delete(delay=3)
             logger.error(f'Unexpected error in clearChat: {e}')
+        finally:
+            self._purges.pop(ctx.channel.id, None)
+
+    @commands.command()
+    @is_admin()
+    async def cancelClear(self, ctx):
+        """
+        Menghentikan clearChat yang sedang berjalan
+        Usage: !cancelClear
+        """
+        cancel = self._purges.get(ctx.channel.id)
+        if cancel is None:
+            await ctx.send("ℹ️ No clear is running in this channel.")
+            return
+        cancel.set()
+        await ctx.message.delete()
 
 async def setup(bot):
     await bot.add_cog(AdminCommands(bot))
\ No newline at end of file
@@ -1,28 +1,48 @@
 import discord
 from discord.ext import commands
 import logging
-import os
-
-LOG_FILE = 'transactions.log'
+import time
+import audit
 
 class LoggingHandler(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.logger = logging.getLogger('discord')
-        self.logger.setLevel(logging.INFO)
-        handler = logging.FileHandler(filename=LOG_FILE, encoding='utf-8', mode='w')
-        handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
-        self.logger.addHandler(handler)
+        # Ditulis ke logs/transactions.log oleh log_pipeline
+        self.logger = logging.getLogger(__name__)
+
+    def audit_command(self, ctx, result: str, error=None):
+        """Write a structured audit entry for a finished command"""
+        started = getattr(ctx, 'audit_started', None)
+        latency_ms = round((time.perf_counter() - started) * 1000, 1) if started else None
+        audit.record(
+            'command',
+            actor_id=ctx.author.id,
+            actor=str(ctx.author),
+            command=ctx.command.qualified_name if ctx.command else None,
+            args=[str(arg) for arg in ctx.args[2:]],
+            kwargs={key: str(value) for key, value in ctx.kwargs.items()},
+            guild_id=ctx.guild.id if ctx.guild else None,
+            channel_id=ctx.channel.id,
+            latency_ms=latency_ms,
+            result=result,
+            error=str(error) if error else None
+        )
+
+    @commands.Cog.listener()
+    async def on_command(self, ctx):
+        ctx.audit_started = time.perf_counter()
 
     @commands.Cog.listener()
     async def on_command_completion(self, ctx):
         log_message = f"User: {ctx.author} (ID: {ctx.author.id}), Command: {ctx.command}, Channel: {ctx.channel}"
         self.logger.info(log_message)
+        self.audit_command(ctx, 'ok')
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
         log_message = f"User: {ctx.author} (ID: {ctx.author.id}), Command: {ctx.command}, Error: {error}, Channel: {ctx.channel}"
         self.logger.error(log_message)
+        self.audit_command(ctx, 'error', error)
 
 async def setup(bot):
     await bot.add_cog(LoggingHandler(bot))
\ No newline at end of file
@@ -1,109 +1,245 @@
 import sqlite3
 import logging
 from datetime import datetime
+import query_trace
 
 logger = logging.getLogger(__name__)
 
-def get_connection():
+DATABASE_FILE = 'shop.db'
+
+def get_connection(path: str = DATABASE_FILE):
     """Get SQLite database connection"""
-    return sqlite3.connect('shop.db')
+    if query_trace.TRACE_ENABLED:
+        return sqlite3.connect(path, factory=query_trace.TracedConnection)
+    return sqlite3.connect(path)
 
-def get_balance(growid: str):
-    """Get user balance from database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            SELECT balance_wl, balance_dl, balance_bgl 
-            FROM users 
-            WHERE growid = ?
-        """, (growid,))
-        balance = cursor.fetchone()
-        return balance if balance else (0, 0, 0)
-    except Exception as e:
-        logger.error(f"Error getting balance: {e}")
-        return (0, 0, 0)
-    finally:
-        conn.close()
+# Skema per tabel. Semua data di-partisi per guild_id.
+TABLES = {
+    'users': """
+        CREATE TABLE IF NOT EXISTS users (
+            guild_id INTEGER NOT NULL,
+            growid TEXT NOT NULL,
+            balance_wl INTEGER DEFAULT 0,
+            balance_dl INTEGER DEFAULT 0,
+            balance_bgl INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (guild_id, growid)
+        )
+    """,
+    'user_growid': """
+        CREATE TABLE IF NOT EXISTS user_growid (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            growid TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (guild_id, user_id),
+            UNIQUE (guild_id, growid)
+        )
+    """,
+    'products': """
+        CREATE TABLE IF NOT EXISTS products (
+            guild_id INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            name TEXT NOT NULL,
+            price INTEGER NOT NULL,
+            stock INTEGER DEFAULT 0,
+            description TEXT,
+            compress INTEGER DEFAULT 0,
+            PRIMARY KEY (guild_id, code)
+        )
+    """,
+    'product_stock': """
+        CREATE TABLE IF NOT EXISTS product_stock (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            product_code TEXT NOT NULL,
+            content TEXT NOT NULL,
+            used INTEGER DEFAULT 0,
+            used_by TEXT DEFAULT NULL,
+            used_at TIMESTAMP DEFAULT NULL,
+            added_by TEXT NOT NULL,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            source_file TEXT,
+            content_z BLOB DEFAULT NULL,
+            dict_id INTEGER DEFAULT NULL,
+            purchase_id INTEGER DEFAULT NULL,
+            FOREIGN KEY (guild_id, product_code) REFERENCES products(guild_id, code)
+        )
+    """,
+    'transaction_log': """
+        CREATE TABLE IF NOT EXISTS transaction_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            growid TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            details TEXT,
+            old_balance TEXT,
+            new_balance TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            reverses INTEGER DEFAULT NULL,
+            FOREIGN KEY (guild_id, growid) REFERENCES users(guild_id, growid)
+        )
+    """,
+    'donation_queue': """
+        CREATE TABLE IF NOT EXISTS donation_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            growid TEXT NOT NULL,
+            wl INTEGER NOT NULL DEFAULT 0,
+            dl INTEGER NOT NULL DEFAULT 0,
+            bgl INTEGER NOT NULL DEFAULT 0,
+            raw TEXT,
+            received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            processed_at DATETIME DEFAULT NULL
+        )
+    """,
+    'world_info': """
+        CREATE TABLE IF NOT EXISTS world_info (
+            guild_id INTEGER PRIMARY KEY,
+            world TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            bot TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    # Bayangan persisten dari hold keranjang di holds.py
+    'stock_holds': """
+        CREATE TABLE IF NOT EXISTS stock_holds (
+            id TEXT PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            product_code TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """,
+    # Idempotency key pembelian (interaction id asal); result NULL = masih diproses
+    'purchase_keys': """
+        CREATE TABLE IF NOT EXISTS purchase_keys (
+            key TEXT PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            result TEXT DEFAULT NULL,
+            created_at REAL NOT NULL
+        )
+    """,
+    # Rollup penjualan per jam/hari, diperbarui di transaksi pembelian
+    'sales_rollup': """
+        CREATE TABLE IF NOT EXISTS sales_rollup (
+            guild_id INTEGER NOT NULL,
+            dimension TEXT NOT NULL,
+            period TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            orders INTEGER NOT NULL DEFAULT 0,
+            items INTEGER NOT NULL DEFAULT 0,
+            revenue INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, dimension, period, bucket, key)
+        )
+    """,
+    # Dictionary kompresi per produk (lihat storage/compression.py)
+    'stock_dictionary': """
+        CREATE TABLE IF NOT EXISTS stock_dictionary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            product_code TEXT NOT NULL,
+            data BLOB NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    # Stok produk yang dihapus dibersihkan bertahap oleh stock_purge
+    'product_purge': """
+        CREATE TABLE IF NOT EXISTS product_purge (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            product_code TEXT NOT NULL,
+            requested_by TEXT,
+            requested_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            rows_total INTEGER DEFAULT NULL,
+            rows_purged INTEGER NOT NULL DEFAULT 0,
+            finished_at DATETIME DEFAULT NULL
+        )
+    """,
+}
+
+INDEXES = [
+    # Klaim FIFO: urut added_at lalu rowid langsung dari index
+    "DROP INDEX IF EXISTS idx_product_stock_available",
+    "CREATE INDEX IF NOT EXISTS idx_product_stock_fifo ON product_stock (guild_id, product_code, used, added_at)",
+    "CREATE INDEX IF NOT EXISTS idx_transaction_log_growid ON transaction_log (guild_id, growid, id)",
+    # Riwayat pembelian per user (keyset pagination, My Orders)
+    "CREATE INDEX IF NOT EXISTS idx_transaction_log_purchases ON transaction_log (guild_id, growid, id) WHERE type = 'PURCHASE'",
+    "CREATE INDEX IF NOT EXISTS idx_donation_queue_pending ON donation_queue (id) WHERE processed_at IS NULL",
+    # Refund: item per pembelian, dan satu reversal per entry ledger
+    "CREATE INDEX IF NOT EXISTS idx_product_stock_purchase ON product_stock (purchase_id) WHERE purchase_id IS NOT NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_transaction_log_reverses ON transaction_log (reverses) WHERE reverses IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_purchase_keys_created ON purchase_keys (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_product_purge_pending ON product_purge (guild_id, product_code) WHERE finished_at IS NULL",
+]
+
+# Kolom yang ditambahkan setelah tabelnya ada: (table, column, definisi)
+ADDED_COLUMNS = [
+    ('products', 'compress', 'INTEGER DEFAULT 0'),
+    ('product_stock', 'content_z', 'BLOB DEFAULT NULL'),
+    ('product_stock', 'dict_id', 'INTEGER DEFAULT NULL'),
+    ('product_stock', 'purchase_id', 'INTEGER DEFAULT NULL'),
+    ('transaction_log', 'reverses', 'INTEGER DEFAULT NULL'),
+]
 
-def setup_database():
+def _columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+def _migrate_to_guilds(cursor, default_guild_id: int):
+    """
+    Rebuild single-guild tables with a guild_id column.
+
+    Existing rows are assigned to the default (primary) guild. Uses the
+    create-copy-drop-rename sequence because SQLite cannot change a
+    primary key in place.
+    """
+    for table, schema in TABLES.items():
+        columns = _columns(cursor, table)
+        if not columns or 'guild_id' in columns:
+            continue
+        logger.info(f"Migrating {table} to per-guild schema (guild {default_guild_id})")
+        copied = [c for c in columns if c != 'id' or table != 'world_info']
+        cursor.execute(schema.replace(f"CREATE TABLE IF NOT EXISTS {table} (", f"CREATE TABLE {table}_new ("))
+        column_list = ", ".join(copied)
+        cursor.execute(
+            f"INSERT INTO {table}_new (guild_id, {column_list}) "
+            f"SELECT ?, {column_list} FROM {table}",
+            (default_guild_id,)
+        )
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+def _add_columns(cursor):
+    for table, column, definition in ADDED_COLUMNS:
+        if column not in _columns(cursor, table):
+            logger.info(f"Adding column {table}.{column}")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def setup_database(default_guild_id: int = 0, path: str = DATABASE_FILE):
     """Initialize database tables"""
-    conn = get_connection()
+    conn = get_connection(path)
     cursor = conn.cursor()
     
     try:
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                growid TEXT PRIMARY KEY,
-                balance_wl INTEGER DEFAULT 0,
-                balance_dl INTEGER DEFAULT 0,
-                balance_bgl INTEGER DEFAULT 0,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Create user_growid table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_growid (
-                user_id INTEGER PRIMARY KEY,
-                growid TEXT UNIQUE NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Create products table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                code TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                price INTEGER NOT NULL,
-                stock INTEGER DEFAULT 0,
-                description TEXT
-            )
-        """)
-
-        # Create product_stock table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS product_stock (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                product_code TEXT NOT NULL,
-                content TEXT NOT NULL,
-                used INTEGER DEFAULT 0,
-                used_by TEXT DEFAULT NULL,
-                used_at TIMESTAMP DEFAULT NULL,
-                added_by TEXT NOT NULL,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                source_file TEXT,
-                FOREIGN KEY (product_code) REFERENCES products(code)
-            )
-        """)
-
-        # Create transaction_log table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transaction_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                growid TEXT NOT NULL,
-                amount INTEGER NOT NULL,
-                type TEXT NOT NULL,
-                details TEXT,
-                old_balance TEXT,
-                new_balance TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (growid) REFERENCES users(growid)
-            )
-        """)
-
-        # Create world_info table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS world_info (
-                id INTEGER PRIMARY KEY CHECK (id = 1),
-                world TEXT NOT NULL,
-                owner TEXT NOT NULL,
-                bot TEXT NOT NULL,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        # Hanya berlaku untuk file baru; DB lama dikonversi oleh maintenance
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL: the donation worker and the bot can write from separate processes
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        for schema in TABLES.values():
+            cursor.execute(schema)
+
+        _migrate_to_guilds(cursor, default_guild_id)
+        _add_columns(cursor)
+
+        for index in INDEXES:
+            cursor.execute(index)
 
         conn.commit()
         logger.info("Database initialized successfully")
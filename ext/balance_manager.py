@@ -1,81 +1,54 @@
 import discord
 from discord.ext import commands
 import logging
-from database import get_connection
 from datetime import datetime
+import audit
+import settings
+import storage
 
 logger = logging.getLogger(__name__)
 
+CURRENCIES = ('WL', 'DL', 'BGL')
+
+def currency_delta(currency: str, amount: int):
+    """(wl, dl, bgl) delta for an amount in one currency"""
+    delta = [0, 0, 0]
+    delta[CURRENCIES.index(currency)] = amount
+    return delta
+
 class BalanceManager(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    def guild_id(self, ctx):
+        """Guild yang saldonya diubah; DM jatuh ke guild utama"""
+        return ctx.guild.id if ctx.guild else settings.get().guild_id
+
     async def add_balance(self, ctx, growid: str, amount: int, currency: str):
         """Add balance to user"""
-        conn = None
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
             # Verify currency
             currency = currency.upper()
-            if currency not in ['WL', 'DL', 'BGL']:
+            if currency not in CURRENCIES:
                 return "❌ Invalid currency! Use WL, DL, or BGL"
-                
-            # Get current balance
-            cursor.execute("""
-                SELECT balance_wl, balance_dl, balance_bgl
-                FROM users
-                WHERE growid = ?
-            """, (growid,))
-            
-            balance = cursor.fetchone()
-            if not balance:
-                cursor.execute("""
-                    INSERT INTO users (growid, balance_wl, balance_dl, balance_bgl)
-                    VALUES (?, 0, 0, 0)
-                """, (growid,))
-                balance = (0, 0, 0)
-            
-            old_wl, old_dl, old_bgl = balance
-            
-            # Update balance based on currency
-            if currency == 'WL':
-                new_wl = old_wl + amount
-                new_dl = old_dl
-                new_bgl = old_bgl
-            elif currency == 'DL':
-                new_wl = old_wl
-                new_dl = old_dl + amount
-                new_bgl = old_bgl
-            else:  # BGL
-                new_wl = old_wl
-                new_dl = old_dl
-                new_bgl = old_bgl + amount
-                
-            # Update balance
-            cursor.execute("""
-                UPDATE users
-                SET balance_wl = ?, balance_dl = ?, balance_bgl = ?
-                WHERE growid = ?
-            """, (new_wl, new_dl, new_bgl, growid))
-            
-            # Log transaction
-            cursor.execute("""
-                INSERT INTO transaction_log (
-                    growid, amount, type, details,
-                    old_balance, new_balance, timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
-            """, (
-                growid,
-                amount,
-                'ADMIN_ADD',
-                f"Added {amount} {currency} by {ctx.author}",
-                f"WL: {old_wl}, DL: {old_dl}, BGL: {old_bgl}",
-                f"WL: {new_wl}, DL: {new_dl}, BGL: {new_bgl}"
-            ))
-            
-            conn.commit()
+
+            guild_id = self.guild_id(ctx)
+            store = storage.get()
+            old_wl, old_dl, old_bgl = store.get_balance(guild_id, growid)
+            new_wl, new_dl, new_bgl = store.change_balance(
+                guild_id, growid, *currency_delta(currency, amount),
+                'ADMIN_ADD', f"Added {amount} {currency} by {ctx.author}"
+            )
+            audit.record(
+                'balance',
+                actor_id=ctx.author.id,
+                actor=str(ctx.author),
+                guild_id=guild_id,
+                growid=growid,
+                type='ADMIN_ADD',
+                amount=amount,
+                delta={currency.lower(): amount}
+            )
             
             # Return success embed
             embed = discord.Embed(
@@ -93,82 +66,37 @@ class BalanceManager(commands.Cog):
             
         except Exception as e:
             logger.error(f"Error adding balance: {e}")
-            if conn:
-                conn.rollback()
             return f"❌ An error occurred: {str(e)}"
-            
-        finally:
-            if conn:
-                conn.close()
 
     async def remove_balance(self, ctx, growid: str, amount: int, currency: str):
         """Remove balance from user"""
-        conn = None
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
             # Verify currency
             currency = currency.upper()
-            if currency not in ['WL', 'DL', 'BGL']:
+            if currency not in CURRENCIES:
                 return "❌ Invalid currency! Use WL, DL, or BGL"
-                
-            # Get current balance
-            cursor.execute("""
-                SELECT balance_wl, balance_dl, balance_bgl
-                FROM users
-                WHERE growid = ?
-            """, (growid,))
-            
-            balance = cursor.fetchone()
-            if not balance:
-                return "❌ User not found!"
-                
-            old_wl, old_dl, old_bgl = balance
-            
-            # Calculate new balance
-            if currency == 'WL':
-                if old_wl < amount:
-                    return "❌ Insufficient WL balance!"
-                new_wl = old_wl - amount
-                new_dl = old_dl
-                new_bgl = old_bgl
-            elif currency == 'DL':
-                if old_dl < amount:
-                    return "❌ Insufficient DL balance!"
-                new_wl = old_wl
-                new_dl = old_dl - amount
-                new_bgl = old_bgl
-            else:  # BGL
-                if old_bgl < amount:
-                    return "❌ Insufficient BGL balance!"
-                new_wl = old_wl
-                new_dl = old_dl
-                new_bgl = old_bgl - amount
-                
-            # Update balance
-            cursor.execute("""
-                UPDATE users
-                SET balance_wl = ?, balance_dl = ?, balance_bgl = ?
-                WHERE growid = ?
-            """, (new_wl, new_dl, new_bgl, growid))
-            
-            # Log transaction
-            cursor.execute("""
-                INSERT INTO transaction_log (
-                    growid, amount, type, details,
-                    old_balance, new_balance, timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
-            """, (
-                growid,
-                amount,
-                'ADMIN_REMOVE',
-                f"Removed {amount} {currency} by {ctx.author}",
-                f"WL: {old_wl}, DL: {old_dl}, BGL: {old_bgl}",
-                f"WL: {new_wl}, DL: {new_dl}, BGL: {new_bgl}"
-            ))
-            
-            conn.commit()
+
+            guild_id = self.guild_id(ctx)
+            store = storage.get()
+            old_wl, old_dl, old_bgl = store.get_balance(guild_id, growid)
+            try:
+                new_wl, new_dl, new_bgl = store.change_balance(
+                    guild_id, growid, *currency_delta(currency, -amount),
+                    'ADMIN_REMOVE', f"Removed {amount} {currency} by {ctx.author}"
+                )
+            except storage.InsufficientBalance:
+                return f"❌ Insufficient {currency} balance!"
+
+            audit.record(
+                'balance',
+                actor_id=ctx.author.id,
+                actor=str(ctx.author),
+                guild_id=guild_id,
+                growid=growid,
+                type='ADMIN_REMOVE',
+                amount=amount,
+                delta={currency.lower(): -amount}
+            )
             
             # Return success embed
             embed = discord.Embed(
@@ -186,59 +114,25 @@ class BalanceManager(commands.Cog):
             
         except Exception as e:
             logger.error(f"Error removing balance: {e}")
-            if conn:
-                conn.rollback()
             return f"❌ An error occurred: {str(e)}"
-            
-        finally:
-            if conn:
-                conn.close()
 
     async def set_balance(self, ctx, growid: str, wl: int = 0, dl: int = 0, bgl: int = 0):
         """Set user balance directly"""
-        conn = None
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            # Get current balance
-            cursor.execute("""
-                SELECT balance_wl, balance_dl, balance_bgl
-                FROM users
-                WHERE growid = ?
-            """, (growid,))
-            
-            old_balance = cursor.fetchone()
-            if not old_balance:
-                old_wl, old_dl, old_bgl = 0, 0, 0
-                cursor.execute("""
-                    INSERT INTO users (growid, balance_wl, balance_dl, balance_bgl)
-                    VALUES (?, ?, ?, ?)
-                """, (growid, wl, dl, bgl))
-            else:
-                old_wl, old_dl, old_bgl = old_balance
-                cursor.execute("""
-                    UPDATE users
-                    SET balance_wl = ?, balance_dl = ?, balance_bgl = ?
-                    WHERE growid = ?
-                """, (wl, dl, bgl, growid))
-            
-            # Log transaction
-            cursor.execute("""
-                INSERT INTO transaction_log (
-                    growid, amount, type, details,
-                    old_balance, new_balance, timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
-            """, (
-                growid,
-                0,
-                'ADMIN_SET',
-                f"Balance set by {ctx.author}",
-                f"WL: {old_wl}, DL: {old_dl}, BGL: {old_bgl}",
-                f"WL: {wl}, DL: {dl}, BGL: {bgl}"
-            ))
-            
-            conn.commit()
+            guild_id = self.guild_id(ctx)
+            (old_wl, old_dl, old_bgl), _ = storage.get().set_balance(
+                guild_id, growid, wl, dl, bgl, 'ADMIN_SET', f"Balance set by {ctx.author}"
+            )
+            audit.record(
+                'balance',
+                actor_id=ctx.author.id,
+                actor=str(ctx.author),
+                guild_id=guild_id,
+                growid=growid,
+                type='ADMIN_SET',
+                amount=0,
+                new_balance={'wl': wl, 'dl': dl, 'bgl': bgl}
+            )
             
             # Return success embed
             embed = discord.Embed(
@@ -255,13 +149,7 @@ class BalanceManager(commands.Cog):
             
         except Exception as e:
             logger.error(f"Error setting balance: {e}")
-            if conn:
-                conn.rollback()
             return f"❌ An error occurred: {str(e)}"
-            
-        finally:
-            if conn:
-                conn.close()
 
 async def setup(bot):
-    await bot.add_cog(BalanceManager(bot))
\ No newline at end of file
+    await bot.add_cog(BalanceManager(bot))
@@ -1,22 +1,38 @@
 import sqlite3
+import asyncio
+import threading
 import json
 import logging
+from urllib.parse import urlparse, parse_qs
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from discord.ext import commands
-from ext.balance_manager import add_balance
-from database import get_connection
-
-# Baca konfigurasi dari config.json
-with open('config.json') as config_file:
-    config = json.load(config_file)
+from lifecycle import Service
+import audit
+import log_channels
+import settings
+import storage
 
 DATABASE = 'store.db'
-PORT = 8081  # Ganti port jika diperlukan untuk menghindari bentrok
-DONATION_LOG_CHANNEL_ID = config['id_donation_log']
+BATCH_SIZE = 100
+POLL_INTERVAL = 1.0
 
 class DonateHandler(BaseHTTPRequestHandler):
-    def db_connect(self):
-        return get_connection()
+    def target_guild(self):
+        """
+        Guild from the request path: /donate/<guild_id> or ?guild=<id>.
+        Requests without one go to the primary guild.
+        """
+        url = urlparse(self.path)
+        guild = parse_qs(url.query).get('guild', [None])[0]
+        parts = [p for p in url.path.split('/') if p]
+        if guild is None and len(parts) >= 2 and parts[0] == 'donate':
+            guild = parts[1]
+        config = settings.get()
+        if guild is None:
+            return config.guild_id
+        if not guild.isdigit() or config.guild(int(guild)) is None:
+            return None
+        return int(guild)
 
     def do_POST(self):
         content_length = int(self.headers['Content-Length'])
@@ -24,6 +40,13 @@ class DonateHandler(BaseHTTPRequestHandler):
         logging.info(f"Received donation data: {post_data}")
 
         try:
+            guild_id = self.target_guild()
+            if guild_id is None:
+                self.send_response(404)
+                self.end_headers()
+                self.wfile.write(b"Unknown guild")
+                return
+
             data = json.loads(post_data)
             growid = data.get('GrowID')
             deposit = data.get('Deposit')
@@ -50,13 +73,16 @@ class DonateHandler(BaseHTTPRequestHandler):
                     bgl += int(d.split()[0])
 
             total_wl = wl + (dl * 100) + (bgl * 10000)
-            add_balance(growid, wl=total_wl)
+            queue_id = storage.get().enqueue_donation(guild_id, growid, wl, dl, bgl, deposit)
 
             self.send_response(200)
             self.end_headers()
-            self.wfile.write(f"Donation received. Added {total_wl} WL to {growid}'s balance.".encode())
+            self.wfile.write(f"Donation received. {total_wl} WL will be added to {growid}'s balance.".encode())
 
-            logging.info(f"Added {total_wl} WL to {growid}'s balance.")
+            logging.info(f"Queued donation #{queue_id}: {total_wl} WL for {growid} in guild {guild_id}")
+            notify = getattr(self.server, 'on_enqueue', None)
+            if notify:
+                notify()
 
         except Exception as e:
             logging.error(f"Error processing donation: {e}")
@@ -64,33 +90,152 @@ class DonateHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(b"Internal server error")
 
-def run(server_class=HTTPServer, handler_class=DonateHandler, port=PORT):
+def run(server_class=HTTPServer, handler_class=DonateHandler, port=None):
+    """
+    Run the donation webhook as its own process.
+
+    Accepted deposits go to the donation_queue table; the bot's
+    DonationConsumer credits them. Start with: python -m ext.donate
+    """
+    port = port or settings.get().donation_port
     logging.basicConfig(level=logging.INFO)
+    storage.get().setup(settings.get().guild_id)
     server_address = ('', port)
     httpd = server_class(server_address, handler_class)
     logging.info(f'Starting server on port {port}...')
     httpd.serve_forever()
 
-class DonateCog(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-        self.server = None
+class DonationServer(Service):
+    """HTTP donation endpoint on its own thread, independent of the gateway"""
 
-    @commands.Cog.listener()
-    async def on_ready(self):
+    name = 'donation-server'
+
+    def __init__(self, on_enqueue=None):
+        self.server = None
+        self.thread = None
+        self.on_enqueue = on_enqueue
+
+    async def start(self):
+        if self.server is not None:
+            return
+        port = settings.get().donation_port
+        self.server = HTTPServer(('0.0.0.0', port), DonateHandler)
+        self.server.on_enqueue = self.on_enqueue
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name='donation-server', daemon=True
+        )
+        self.thread.start()
+        logging.info(f'Starting donation server on port {port}')
+
+    async def stop(self):
         if self.server is None:
+            return 'not running'
+        server, self.server = self.server, None
+        # shutdown() menunggu request yang sedang diproses selesai
+        await asyncio.to_thread(server.shutdown)
+        server.server_close()
+        await asyncio.to_thread(self.thread.join)
+        self.thread = None
+        return 'stopped'
+
+    async def restart(self):
+        await self.stop()
+        await self.start()
+
+class DonationConsumer(Service):
+    """Credits queued donations in batches and posts notifications"""
+
+    name = 'donation-consumer'
+
+    def __init__(self, bot, batch_size: int = BATCH_SIZE, interval: float = POLL_INTERVAL):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.interval = interval
+        self.task = None
+        self.credited = 0
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def notify(self):
+        """Wake the consumer from another thread (in-process webhook)"""
+        self.bot.loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self):
+        self._stopping = False
+        self.task = asyncio.get_running_loop().create_task(self.run(), name='donation-consumer')
+
+    async def run(self):
+        while True:
             try:
-                self.server = HTTPServer(('0.0.0.0', PORT), DonateHandler)
-                logging.info(f'Starting donation server on port {PORT}')
-                self.bot.loop.run_in_executor(None, self.server.serve_forever)
-            except OSError as e:
-                logging.error(f"Error starting HTTP server: {e}")
-
-    @commands.Cog.listener()
-    async def on_disconnect(self):
-        if self.server:
-            self.server.shutdown()
-            self.server = None
+                credited = await asyncio.to_thread(storage.get().credit_queued_donations, self.batch_size)
+            except Exception as e:
+                logging.error(f"Error in donation consumer: {e}")
+                credited = []
+            if credited:
+                self.credited += len(credited)
+                await self.announce(credited)
+            if self._stopping and len(credited) < self.batch_size:
+                return
+            if len(credited) < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def announce(self, credited):
+        for queue_id, guild_id, growid, wl, dl, bgl, total_wl, raw, received_at, new_balance in credited:
+            logging.info(f"Credited donation #{queue_id}: {total_wl} WL to {growid} in guild {guild_id}")
+            audit.record(
+                'donation',
+                guild_id=guild_id,
+                growid=growid,
+                amount=total_wl,
+                deposit=raw,
+                breakdown={'wl': wl, 'dl': dl, 'bgl': bgl},
+                queue_id=queue_id,
+                received_at=received_at
+            )
+            # Diposting sebagai digest oleh log_channels.DigestService
+            log_channels.digest.publish(
+                guild_id, 'donation', f"`{growid}` donated {raw or f'{total_wl} WL'} (+{total_wl:,} WL)", total_wl
+            )
+
+    async def stop(self):
+        # Habiskan antrean yang tersisa sebelum berhenti
+        self._stopping = True
+        self._wakeup.set()
+        if self.task:
+            await self.task
+            self.task = None
+        return f'credited {self.credited} donations'
+
+class DonateCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.consumer = DonationConsumer(bot)
+        self.service = DonationServer(on_enqueue=self.consumer.notify)
+
+    def in_process(self):
+        return settings.get().donation_mode == 'inprocess'
+
+    async def cog_load(self):
+        settings.on_reload(self.on_settings_reload)
+        await self.bot.lifecycle.register(self.consumer)
+        if self.in_process():
+            await self.bot.lifecycle.register(self.service)
+        else:
+            logging.info('Donation webhook runs out of process; consuming donation_queue only')
+
+    async def cog_unload(self):
+        settings.remove_listener(self.on_settings_reload)
+        await self.bot.lifecycle.unregister(self.service)
+        await self.bot.lifecycle.unregister(self.consumer)
+
+    def on_settings_reload(self, old, new):
+        """Rebind the donation server when the port changes"""
+        if old.donation_port != new.donation_port and self.service.server:
+            self.bot.loop.create_task(self.service.restart())
 
 async def setup(bot):
     await bot.add_cog(DonateCog(bot))
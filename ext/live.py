@@ -4,20 +4,24 @@ from discord.ui import Button, Modal, TextInput, View
 import logging
 from datetime import datetime
 import asyncio
-from database import get_connection, get_balance
-import json
+import time
+import settings
+import catalog
+import storage
+import holds
+import forecast
 
-# Load config
-with open('config.json') as config_file:
-    config = json.load(config_file)
-
-LIVE_STOCK_CHANNEL_ID = int(config['id_live_stock'])
-COOLDOWN_SECONDS = 3
+ORDERS_PER_PAGE = 5
 
 def format_datetime():
     """Get current datetime in UTC"""
     return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
 
+def interaction_guild(interaction):
+    """Guild of an interaction; DMs fall back to the primary guild"""
+    return interaction.guild_id or settings.get().guild_id
+
+
 class BuyModal(Modal):
     def __init__(self, bot):
         super().__init__(title="Buy Product")
@@ -48,14 +52,39 @@ class BuyModal(Modal):
             if quantity <= 0:
                 await interaction.response.send_message("❌ Quantity must be positive.", ephemeral=True)
                 return
+
+            product_code = self.product_code.value.strip()
+            guild_id = interaction_guild(interaction)
+            if catalog.current(guild_id).get(product_code) is None:
+                await interaction.response.send_message(
+                    f"❌ Product with code `{product_code}` not found!", ephemeral=True
+                )
+                return
                 
             transaction_cog = self.bot.get_cog('TransactionCog')
             if not transaction_cog:
                 await interaction.response.send_message("❌ Transaction system not available!", ephemeral=True)
                 return
 
-            result = await transaction_cog.process_purchase(interaction.user, self.product_code.value, quantity)
-            await interaction.response.send_message(result, ephemeral=True)
+            if not settings.get().checkout.enabled:
+                result = await transaction_cog.process_purchase(
+                    interaction.user, product_code, quantity, guild_id, key=str(interaction.id)
+                )
+                await interaction.response.send_message(result, ephemeral=True)
+                return
+
+            # Checkout dua langkah: hold stok dulu, beli saat dikonfirmasi
+            hold, error = await transaction_cog.reserve(interaction.user, product_code, quantity, guild_id)
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
+                return
+            product = catalog.current(guild_id).get(product_code)
+            await interaction.response.send_message(
+                f"🛒 Reserved {quantity}x **{product.name}** for {product.price * quantity:,} WL.\n"
+                f"Confirm <t:{int(hold.expires_at)}:R> or the items go back on sale.",
+                view=ConfirmView(self.bot, hold, str(interaction.id)),
+                ephemeral=True
+            )
             
         except ValueError:
             await interaction.response.send_message("❌ Invalid quantity.", ephemeral=True)
@@ -63,6 +92,113 @@ class BuyModal(Modal):
             logging.error(f"Error in BuyModal: {e}")
             await interaction.response.send_message(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
+class ConfirmView(View):
+    """
+    Confirm/Cancel buttons for one hold; the view times out with the hold.
+    Purchases are keyed by the modal submission, so extra Confirm clicks
+    get the first result back.
+    """
+
+    def __init__(self, bot, hold, key):
+        super().__init__(timeout=max(hold.expires_at - time.time(), 1))
+        self.bot = bot
+        self.hold = hold
+        self.key = key
+
+    @discord.ui.button(label="Confirm", style=discord.ButtonStyle.success, emoji="✅")
+    async def confirm(self, interaction, button):
+        transaction_cog = self.bot.get_cog('TransactionCog')
+        if not transaction_cog:
+            await interaction.response.send_message("❌ Transaction system not available!", ephemeral=True)
+            return
+        self.stop()
+        result = await transaction_cog.process_purchase(
+            interaction.user, self.hold.code, self.hold.quantity, self.hold.guild_id, self.hold.id, self.key
+        )
+        await interaction.response.edit_message(content=result, view=None)
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary, emoji="✖️")
+    async def cancel(self, interaction, button):
+        holds.book.release(self.hold.id)
+        self.stop()
+        await interaction.response.edit_message(content="🛒 Reservation cancelled.", view=None)
+
+class OrdersView(View):
+    """
+    One user's purchases, ORDERS_PER_PAGE at a time. Pages are fetched by
+    keyset (the last id of the previous page), so an old page costs the
+    same as the first; `pages` keeps the key of each page for going back.
+    """
+
+    def __init__(self, guild_id, growid):
+        super().__init__(timeout=300)
+        self.guild_id = guild_id
+        self.growid = growid
+        self.pages = [None]
+        self.orders = []
+        self.has_older = False
+
+    async def load(self):
+        # Ambil satu baris ekstra untuk tahu apakah masih ada halaman berikutnya
+        orders = await asyncio.to_thread(
+            storage.get().purchase_history, self.guild_id, self.growid, self.pages[-1], ORDERS_PER_PAGE + 1
+        )
+        self.orders, self.has_older = orders[:ORDERS_PER_PAGE], len(orders) > ORDERS_PER_PAGE
+        self.newer.disabled = len(self.pages) == 1
+        self.older.disabled = not self.has_older
+        self.resend.options = [
+            discord.SelectOption(label=f"#{order.id} {order.details or 'Purchase'}"[:100], value=str(order.id))
+            for order in self.orders if not order.refunded_by
+        ] or [discord.SelectOption(label="No orders to re-send", value="0")]
+        self.resend.disabled = all(order.refunded_by for order in self.orders)
+
+    def embed(self):
+        embed = discord.Embed(
+            title="🧾 My Orders",
+            description=f"GrowID: `{self.growid}` • page {len(self.pages)}",
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+        for order in self.orders:
+            status = f" • refunded (#{order.refunded_by})" if order.refunded_by else ""
+            embed.add_field(
+                name=f"#{order.id} • {order.timestamp}",
+                value=f"{order.details or 'Purchase'}\n{-order.amount:,} WL{status}",
+                inline=False
+            )
+        if not self.orders:
+            embed.add_field(name="No orders", value="You have not bought anything yet.", inline=False)
+        return embed
+
+    @discord.ui.button(label="Newer", style=discord.ButtonStyle.secondary, emoji="◀️")
+    async def newer(self, interaction, button):
+        self.pages.pop()
+        await self.load()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Older", style=discord.ButtonStyle.secondary, emoji="▶️")
+    async def older(self, interaction, button):
+        self.pages.append(self.orders[-1].id)
+        await self.load()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.select(placeholder="Re-send an order's items to my DMs")
+    async def resend(self, interaction, select):
+        entry_id = int(select.values[0])
+        items = await asyncio.to_thread(storage.get().order_items, self.guild_id, self.growid, entry_id)
+        if not items:
+            await interaction.response.send_message("❌ No items found for this order.", ephemeral=True)
+            return
+        message = f"📦 Items of order #{entry_id}:\n\n" + "".join(
+            f"{i}. {content}\n" for i, (_, content) in enumerate(items, 1)
+        )
+        try:
+            for start in range(0, len(message), 1900):
+                await interaction.user.send(message[start:start + 1900])
+            await interaction.response.send_message(f"✅ Sent {len(items)} items to your DMs.", ephemeral=True)
+        except discord.Forbidden:
+            await interaction.response.send_message("❌ Could not send you a DM. Please enable DMs.", ephemeral=True)
+
 class SetGrowIDModal(Modal):
     def __init__(self, bot):
         super().__init__(title="Set GrowID")
@@ -89,18 +225,7 @@ class SetGrowIDModal(Modal):
                 )
                 return
             
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT OR REPLACE INTO user_growid (user_id, growid) VALUES (?, ?)",
-                (interaction.user.id, growid)
-            )
-            cursor.execute(
-                "INSERT OR IGNORE INTO users (growid) VALUES (?)",
-                (growid,)
-            )
-            conn.commit()
-            conn.close()
+            storage.get().set_growid(interaction_guild(interaction), interaction.user.id, growid)
             
             await interaction.response.send_message(
                 f"✅ GrowID set to: `{growid}`", 
@@ -122,7 +247,7 @@ class StockView(PersistentView):
     def __init__(self, bot):
         super().__init__()
         self.bot = bot
-        self._last_use = {}
+        self._last_use = {}  # guild_id -> {user_id: timestamp}
         
         # Add buttons
         self.button_balance = Button(
@@ -155,6 +280,12 @@ class StockView(PersistentView):
             emoji="🌍",
             custom_id="world_info"
         )
+        self.button_orders = Button(
+            label="My Orders",
+            style=discord.ButtonStyle.secondary,
+            emoji="🧾",
+            custom_id="my_orders"
+        )
 
         # Set callbacks
         self.button_balance.callback = self.button_balance_callback
@@ -162,6 +293,7 @@ class StockView(PersistentView):
         self.button_set_growid.callback = self.button_set_growid_callback
         self.button_check_growid.callback = self.button_check_growid_callback
         self.button_world.callback = self.button_world_callback
+        self.button_orders.callback = self.button_orders_callback
 
         # Add buttons to view
         self.add_item(self.button_balance)
@@ -169,33 +301,32 @@ class StockView(PersistentView):
         self.add_item(self.button_set_growid)
         self.add_item(self.button_check_growid)
         self.add_item(self.button_world)
+        self.add_item(self.button_orders)
 
     async def check_cooldown(self, interaction: discord.Interaction) -> bool:
         current_time = datetime.utcnow().timestamp()
-        last_use = self._last_use.get(interaction.user.id, 0)
+        guild_last_use = self._last_use.setdefault(interaction_guild(interaction), {})
+        last_use = guild_last_use.get(interaction.user.id, 0)
         
-        if current_time - last_use < COOLDOWN_SECONDS:
+        if current_time - last_use < settings.get().cooldown_seconds:
             await interaction.response.send_message(
                 "⚠️ Please wait a few seconds before using buttons again.", 
                 ephemeral=True
             )
             return False
         
-        self._last_use[interaction.user.id] = current_time
+        guild_last_use[interaction.user.id] = current_time
         return True
 
     async def button_balance_callback(self, interaction: discord.Interaction):
         if not await self.check_cooldown(interaction):
             return
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT growid FROM user_growid WHERE user_id = ?", (interaction.user.id,))
-        growid = cursor.fetchone()
-        conn.close()
+        guild_id = interaction_guild(interaction)
+        growid = storage.get().get_growid(guild_id, interaction.user.id)
         
         if growid:
-            balance = get_balance(growid[0])
+            balance = storage.get().get_balance(guild_id, growid)
             if balance:
                 balance_wl, balance_dl, balance_bgl = balance
                 total_wls = balance_wl + (balance_dl * 100) + (balance_bgl * 10000)
@@ -205,7 +336,7 @@ class StockView(PersistentView):
                     color=discord.Color.green(),
                     timestamp=datetime.utcnow()
                 )
-                embed.add_field(name="GrowID", value=growid[0], inline=False)
+                embed.add_field(name="GrowID", value=growid, inline=False)
                 embed.add_field(name="World Locks", value=f"{balance_wl:,} WL", inline=True)
                 embed.add_field(name="Diamond Locks", value=f"{balance_dl:,} DL", inline=True)
                 embed.add_field(name="Blue Gem Locks", value=f"{balance_bgl:,} BGL", inline=True)
@@ -221,11 +352,7 @@ class StockView(PersistentView):
         if not await self.check_cooldown(interaction):
             return
             
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT growid FROM user_growid WHERE user_id = ?", (interaction.user.id,))
-        growid = cursor.fetchone()
-        conn.close()
+        growid = storage.get().get_growid(interaction_guild(interaction), interaction.user.id)
         
         if not growid:
             await interaction.response.send_message("❌ Please set your GrowID first!", ephemeral=True)
@@ -244,16 +371,12 @@ class StockView(PersistentView):
         if not await self.check_cooldown(interaction):
             return
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT growid FROM user_growid WHERE user_id = ?", (interaction.user.id,))
-        growid = cursor.fetchone()
-        conn.close()
+        growid = storage.get().get_growid(interaction_guild(interaction), interaction.user.id)
         
         if growid:
             embed = discord.Embed(
                 title="🔍 GrowID Information",
-                description=f"Your registered GrowID: `{growid[0]}`",
+                description=f"Your registered GrowID: `{growid}`",
                 color=discord.Color.blue(),
                 timestamp=datetime.utcnow()
             )
@@ -265,11 +388,7 @@ class StockView(PersistentView):
         if not await self.check_cooldown(interaction):
             return
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT world, owner, bot FROM world_info WHERE id = 1")
-        world_info = cursor.fetchone()
-        conn.close()
+        world_info = catalog.current(interaction_guild(interaction)).world
         
         if world_info:
             world, owner, bot_name = world_info
@@ -285,114 +404,138 @@ class StockView(PersistentView):
         else:
             await interaction.response.send_message("❌ No world information available.", ephemeral=True)
 
+    async def button_orders_callback(self, interaction: discord.Interaction):
+        if not await self.check_cooldown(interaction):
+            return
+
+        guild_id = interaction_guild(interaction)
+        growid = storage.get().get_growid(guild_id, interaction.user.id)
+        if not growid:
+            await interaction.response.send_message("❌ No GrowID registered for your account.", ephemeral=True)
+            return
+
+        view = OrdersView(guild_id, growid)
+        await view.load()
+        await interaction.response.send_message(embed=view.embed(), view=view, ephemeral=True)
+
 class LiveStock(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.message_id = None
+        self.message_ids = {}  # guild_id -> board message id
         self.update_lock = asyncio.Lock()
         self.last_update = 0
         self.stock_view = StockView(bot)
+        self.live_stock.change_interval(seconds=settings.get().live_stock_interval)
         self.live_stock.start()
-
-    def db_connect(self):
-        return get_connection()
+        settings.on_reload(self.on_settings_reload)
 
     def cog_unload(self):
         self.live_stock.cancel()
+        settings.remove_listener(self.on_settings_reload)
+
+    def on_settings_reload(self, old, new):
+        """Apply new refresh interval without restarting the task"""
+        if old.live_stock_interval != new.live_stock_interval:
+            self.live_stock.change_interval(seconds=new.live_stock_interval)
+            logging.info(f'Live stock interval changed to {new.live_stock_interval}s')
 
     @commands.Cog.listener()
     async def on_ready(self):
         self.bot.add_view(self.stock_view)
 
+    def build_embed(self, snapshot, stock_counts, held=None):
+        """Render one guild's stock board from its snapshot; held stock is not shown as available"""
+        held = held or {}
+        products = [
+            (p.name, p.code, max(stock_counts.get(p.code, 0) - held.get(p.code, 0), 0), p.price, p.description)
+            for p in snapshot.products
+        ]
+        world_info = snapshot.world
+
+        embed = discord.Embed(
+            title="🏪 Store Stock Status",
+            color=discord.Color.blue(),
+            timestamp=datetime.utcnow()
+        )
+
+        if world_info:
+            world, owner, bot_name = world_info
+            embed.add_field(
+                name="🌍 World Information",
+                value=f"World: `{world}`\nOwner: `{owner}`\nBot: `{bot_name}`",
+                inline=False
+            )
+
+        if products:
+            for name, code, stock, price, description in products:
+                value = (
+                    f"💎 Code: `{code}`\n"
+                    f"📦 Stock: `{stock}`\n"
+                    f"💰 Price: `{price} WL`\n"
+                )
+                if description:
+                    value += f"📝 Info: {description}\n"
+                
+                embed.add_field(
+                    name=f"🔸 {name} 🔸",
+                    value=value,
+                    inline=False
+                )
+        else:
+            embed.description = "No products available."
+
+        current_time = format_datetime()
+        embed.set_footer(text=f"Last Update: {current_time} UTC")
+        return embed
+
+    async def update_board(self, guild_id, channel_id, stock_counts):
+        channel = self.bot.get_channel(channel_id)
+        if not channel:
+            logging.error(f'Live stock channel not found for guild {guild_id}')
+            return
+
+        embed = self.build_embed(catalog.current(guild_id), stock_counts, holds.book.held_for(guild_id))
+        message_id = self.message_ids.get(guild_id)
+        try:
+            if message_id:
+                try:
+                    message = await channel.fetch_message(message_id)
+                    await message.edit(embed=embed, view=self.stock_view)
+                except discord.NotFound:
+                    message = await channel.send(embed=embed, view=self.stock_view)
+                    self.message_ids[guild_id] = message.id
+            else:
+                message = await channel.send(embed=embed, view=self.stock_view)
+                self.message_ids[guild_id] = message.id
+        except Exception as e:
+            logging.error(f"Error updating stock message for guild {guild_id}: {e}")
+            self.message_ids.pop(guild_id, None)
+
     @tasks.loop(minutes=1)
     async def live_stock(self):
         if not self.update_lock.locked():
             async with self.update_lock:
                 current_time = datetime.utcnow().timestamp()
-                if current_time - self.last_update < 55:
+                if current_time - self.last_update < settings.get().live_stock_interval - 5:
                     return
                 self.last_update = current_time
-                
-                channel = self.bot.get_channel(LIVE_STOCK_CHANNEL_ID)
-                if not channel:
-                    logging.error('Live stock channel not found')
-                    return
 
-                conn = self.db_connect()
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    SELECT 
-                        p.name, 
-                        p.code, 
-                        COUNT(CASE WHEN ps.used = 0 THEN 1 END) as available_stock,
-                        p.price,
-                        p.description
-                    FROM products p
-                    LEFT JOIN product_stock ps ON p.code = ps.product_code
-                    GROUP BY p.code
-                    ORDER BY p.name
-                """)
-                products = cursor.fetchall()
-                
-                cursor.execute("SELECT world, owner, bot FROM world_info WHERE id = 1")
-                world_info = cursor.fetchone()
-                
-                conn.close()
-
-                embed = discord.Embed(
-                    title="🏪 Store Stock Status",
-                    color=discord.Color.blue(),
-                    timestamp=datetime.utcnow()
-                )
+                config = settings.get()
+                guild_ids = config.guild_ids()
 
-                if world_info:
-                    world, owner, bot_name = world_info
-                    embed.add_field(
-                        name="🌍 World Information",
-                        value=f"World: `{world}`\nOwner: `{owner}`\nBot: `{bot_name}`",
-                        inline=False
-                    )
-
-                if products:
-                    for name, code, stock, price, description in products:
-                        value = (
-                            f"💎 Code: `{code}`\n"
-                            f"📦 Stock: `{stock}`\n"
-                            f"💰 Price: `{price} WL`\n"
-                        )
-                        if description:
-                            value += f"📝 Info: {description}\n"
-                        
-                        embed.add_field(
-                            name=f"🔸 {name} 🔸",
-                            value=value,
-                            inline=False
-                        )
-                else:
-                    embed.description = "No products available."
-
-                current_time = format_datetime()
-                embed.set_footer(text=f"Last Update: {current_time} UTC")
+                # Satu query untuk semua guild; sisanya dari snapshot per guild
+                stock_counts = storage.get().stock_counts()
+                for guild_id in guild_ids:
+                    forecast.velocity.observe(guild_id, stock_counts.get(guild_id, {}))
 
-                try:
-                    if self.message_id:
-                        try:
-                            message = await channel.fetch_message(self.message_id)
-                            await message.edit(embed=embed, view=self.stock_view)
-                        except discord.NotFound:
-                            message = await channel.send(embed=embed, view=self.stock_view)
-                            self.message_id = message.id
-                    else:
-                        message = await channel.send(embed=embed, view=self.stock_view)
-                        self.message_id = message.id
-                except Exception as e:
-                    logging.error(f"Error updating stock message: {e}")
-                    self.message_id = None
+                await asyncio.gather(*(
+                    self.update_board(guild_id, config.guild(guild_id).id_live_stock, stock_counts.get(guild_id, {}))
+                    for guild_id in guild_ids
+                ))
 
     @live_stock.before_loop
     async def before_live_stock(self):
         await self.bot.wait_until_ready()
 
 async def setup(bot):
-    await bot.add_cog(LiveStock(bot))
\ No newline at end of file
+    await bot.add_cog(LiveStock(bot))
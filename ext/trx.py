@@ -1,24 +1,27 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import logging
-from database import get_connection
 import datetime
+import asyncio
+import time
 import aiofiles
 import os
-
-# Di awal file, setelah imports
-def init_logger():
-    """Initialize logger for this module"""
-    logger = logging.getLogger(__name__)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler = logging.StreamHandler()
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    return logger
-
-logger = init_logger()
+import audit
+import settings
+import storage
+import catalog
+import maintenance
+import forecast
+import log_channels
+import holds
+from lifecycle import InFlight
+
+# Handler diatur oleh log_pipeline (QueueHandler di root logger)
 logger = logging.getLogger(__name__)
 
+# Pembelian paralel maksimum per guild, supaya guild besar tidak menghabiskan slot guild lain
+PURCHASE_SLOTS_PER_GUILD = 4
+
 def format_datetime():
     """Get current datetime in UTC"""
     return datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
@@ -39,112 +42,53 @@ def format_balance(balance_wl, balance_dl, balance_bgl):
 class TransactionCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.purchases = InFlight('purchases')
+        self._guild_slots = {}  # guild_id -> Semaphore
 
-    async def initialize_database(self):
-        """Initialize database tables"""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Create users table if not exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                growid TEXT PRIMARY KEY,
-                balance_wl INTEGER DEFAULT 0,
-                balance_dl INTEGER DEFAULT 0,
-                balance_bgl INTEGER DEFAULT 0,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Create transaction_log table if not exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transaction_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                growid TEXT NOT NULL,
-                amount INTEGER NOT NULL,
-                type TEXT NOT NULL,
-                details TEXT,
-                old_balance TEXT,
-                new_balance TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (growid) REFERENCES users(growid)
-            )
-        """)
-
-        conn.commit()
-        conn.close()
-
-    async def get_user_balance(self, growid: str):
-        """Get user's balance, create account if not exists"""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT balance_wl, balance_dl, balance_bgl FROM users WHERE growid = ?", (growid,))
-        balance = cursor.fetchone()
-        
-        if not balance:
-            cursor.execute("""
-                INSERT INTO users (growid, balance_wl, balance_dl, balance_bgl)
-                VALUES (?, 0, 0, 0)
-            """, (growid,))
-            conn.commit()
-            balance = (0, 0, 0)
-        
-        conn.close()
-        return balance
-
-    async def update_balance(self, growid: str, wl: int, dl: int, bgl: int, transaction_type: str, details: str = ""):
+    async def cog_load(self):
+        await self.bot.lifecycle.register(self.purchases)
+        self.expire_purchase_keys.start()
+
+    async def cog_unload(self):
+        self.expire_purchase_keys.cancel()
+        await self.bot.lifecycle.unregister(self.purchases)
+
+    @tasks.loop(minutes=30)
+    async def expire_purchase_keys(self):
+        """Drop idempotency keys older than checkout.key_ttl_hours so the table stays small"""
+        cutoff = time.time() - settings.get().checkout.key_ttl_hours * 3600
+        try:
+            removed = await asyncio.to_thread(storage.get().expire_purchase_keys, cutoff)
+            if removed:
+                logger.info(f"Expired {removed} purchase keys")
+        except Exception as e:
+            logger.error(f"Error expiring purchase keys: {e}")
+
+    async def get_user_balance(self, guild_id: int, growid: str):
+        """Get user's balance; unknown accounts have an empty balance"""
+        return storage.get().get_balance(guild_id, growid)
+
+    async def update_balance(self, guild_id: int, growid: str, wl: int, dl: int, bgl: int, transaction_type: str, details: str = ""):
         """Update user balance and log transaction"""
-        conn = get_connection()
-        cursor = conn.cursor()
-        
         try:
-            # Get old balance
-            cursor.execute("SELECT balance_wl, balance_dl, balance_bgl FROM users WHERE growid = ?", (growid,))
-            old_balance = cursor.fetchone()
-            if not old_balance:
-                old_balance = (0, 0, 0)
-            
-            # Calculate new balance
-            new_wl = old_balance[0] + wl
-            new_dl = old_balance[1] + dl
-            new_bgl = old_balance[2] + bgl
-            
-            # Update balance
-            cursor.execute("""
-                UPDATE users 
-                SET balance_wl = ?, balance_dl = ?, balance_bgl = ?
-                WHERE growid = ?
-            """, (new_wl, new_dl, new_bgl, growid))
-            
-            # Log transaction
-            cursor.execute("""
-                INSERT INTO transaction_log (
-                    growid, amount, type, details, old_balance, new_balance, timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
-            """, (
-                growid,
-                get_total_wls(wl, dl, bgl),
-                transaction_type,
-                details,
-                format_balance(*old_balance),
-                format_balance(new_wl, new_dl, new_bgl)
-            ))
-            
-            conn.commit()
-            return new_wl, new_dl, new_bgl
+            new_balance = storage.get().change_balance(guild_id, growid, wl, dl, bgl, transaction_type, details)
+            audit.record(
+                'balance',
+                guild_id=guild_id,
+                growid=growid,
+                type=transaction_type,
+                amount=get_total_wls(wl, dl, bgl),
+                delta={'wl': wl, 'dl': dl, 'bgl': bgl},
+                details=details
+            )
+            return new_balance
 
         except Exception as e:
             logger.error(f"Error updating balance: {e}")
-            conn.rollback()
             raise e
-        
-        finally:
-            conn.close()
 
     async def add_stock_from_file(self, ctx, product_code: str, file_path: str = None):
         """Add stock from file"""
-        conn = None
         try:
             current_time = format_datetime()
             logger.info(f"Adding stock at {current_time}")
@@ -170,49 +114,12 @@ class TransactionCog(commands.Cog):
             if not lines:
                 return "❌ File is empty!"
 
-            conn = get_connection()
-            cursor = conn.cursor()
-
-            # Verify product exists
-            cursor.execute("SELECT code FROM products WHERE code = ?", (product_code,))
-            if not cursor.fetchone():
+            guild_id = ctx.guild.id if ctx.guild else settings.get().guild_id
+            try:
+                added_count = storage.get().add_stock(guild_id, product_code, lines, str(ctx.author), file_path)
+            except storage.UnknownProduct:
                 return f"❌ Product with code {product_code} does not exist!"
 
-            # Create product_stock table if not exists
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS product_stock (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    product_code TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    used INTEGER DEFAULT 0,
-                    used_by TEXT DEFAULT NULL,
-                    used_at TIMESTAMP DEFAULT NULL,
-                    added_by TEXT NOT NULL,
-                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    source_file TEXT,
-                    FOREIGN KEY (product_code) REFERENCES products(code)
-                )
-            """)
-
-            # Add stock items
-            added_count = 0
-            for line in lines:
-                cursor.execute("""
-                    INSERT INTO product_stock (
-                        product_code, content, added_by, source_file
-                    ) VALUES (?, ?, ?, ?)
-                """, (product_code, line, str(ctx.author), file_path))
-                added_count += 1
-
-            # Update product stock count
-            cursor.execute("""
-                UPDATE products 
-                SET stock = stock + ? 
-                WHERE code = ?
-            """, (added_count, product_code))
-
-            conn.commit()
-
             # Create embed response
             embed = discord.Embed(
                 title="✅ Stock Added Successfully",
@@ -232,55 +139,129 @@ class TransactionCog(commands.Cog):
 
         except Exception as e:
             logger.error(f"Error adding stock: {e}")
-            if conn:
-                conn.rollback()
             return f"❌ An error occurred: {str(e)}"
 
+    async def reserve(self, user, product_code: str, quantity: int, guild_id: int):
+        """Hold stock for a two-step checkout; returns (Hold, None) or (None, error message)"""
+        store = storage.get()
+        if not store.get_growid(guild_id, user.id):
+            return None, "❌ Please set your GrowID first using the 'Set GrowID' button!"
+        product = catalog.current(guild_id).get(product_code)
+        if not product:
+            return None, f"❌ Product with code `{product_code}` not found!"
+
+        # Hold lama user ini diganti, jadi tidak dihitung sebagai milik orang lain
+        previous = holds.book.get(holds.book.by_user.get((guild_id, user.id)))
+        reserved = holds.book.held_quantity(guild_id, product_code)
+        if previous and previous.code == product_code:
+            reserved -= previous.quantity
+        available = store.stock_count(guild_id, product_code) - reserved
+        if available < quantity:
+            return None, f"❌ Not enough stock! Only {max(available, 0)} items available."
+
+        hold = holds.book.place(guild_id, user.id, product_code, quantity, settings.get().checkout.hold_seconds)
+        logger.info(f"Hold {hold.id}: {quantity}x {product_code} for {user} (guild {guild_id})")
+        return hold, None
+
+    async def process_purchase(self, user, product_code: str, quantity: int, guild_id: int = None,
+                               hold_id: str = None, key: str = None):
+        """
+        Process purchase of products; with hold_id, buys the reserved stock.
+        `key` (the originating interaction id) makes repeated submissions
+        return the first result instead of charging again.
+        """
+        if not self.purchases.accepting:
+            self._release_hold(user, hold_id)
+            return "❌ The store is restarting, please try again in a moment."
+        if guild_id is None:
+            guild_id = settings.get().guild_id
+
+        if key is not None:
+            existing = storage.get().reserve_purchase_key(key, guild_id, user.id)
+            if existing is not None:
+                logger.info(f"Repeated purchase submission {key} from {user}")
+                if existing.result is None:
+                    return "⏳ This purchase is already being processed."
+                return existing.result
+
+        slots = self._guild_slots.get(guild_id)
+        if slots is None:
+            slots = self._guild_slots[guild_id] = asyncio.Semaphore(PURCHASE_SLOTS_PER_GUILD)
+        result = None
+        try:
+            async with self.purchases, slots:
+                result = await self._process_purchase(user, product_code, quantity, guild_id, hold_id)
+        except Exception as e:
+            # Error sementara (mis. database terkunci) tidak disimpan di key, jadi bisa dicoba lagi
+            logger.error(f"Error in process_purchase: {e}")
+            return f"❌ Error processing purchase: {str(e)}"
         finally:
-            if conn:
-                conn.close()
-
-    async def process_purchase(self, user, product_code: str, quantity: int):
-        """Process purchase of products"""
-        conn = None
+            # Pembelian sukses sudah melepas hold-nya; yang gagal tidak boleh menahan stok sampai hold habis
+            self._release_hold(user, hold_id)
+            if key is not None:
+                # Hanya hasil akhir (sukses atau penolakan) yang disimpan; selain itu key dilepas
+                try:
+                    if result is not None:
+                        storage.get().complete_purchase_key(key, result)
+                    else:
+                        storage.get().release_purchase_key(key)
+                except Exception as e:
+                    logger.error(f"Failed to settle purchase key {key}: {e}")
+        return result
+
+    def _release_hold(self, user, hold_id: str):
+        if hold_id is None:
+            return
+        hold = holds.book.get(hold_id)
+        if hold is not None and hold.user_id == user.id:
+            holds.book.release(hold_id)
+
+    async def _process_purchase(self, user, product_code: str, quantity: int, guild_id: int, hold_id: str = None):
+        """
+        The final result message: success or a rejection that a retry would
+        repeat. Unexpected errors before the charge are raised instead.
+        """
+        charged = False
         try:
             current_time = format_datetime()
             logger.info(f"Processing purchase at {current_time}")
             
-            conn = get_connection()
-            cursor = conn.cursor()
+            store = storage.get()
 
             # Get user's GrowID
-            cursor.execute("SELECT growid FROM user_growid WHERE user_id = ?", (user.id,))
-            user_data = cursor.fetchone()
+            growid = store.get_growid(guild_id, user.id)
 
-            if not user_data:
+            if not growid:
                 return "❌ Please set your GrowID first using the 'Set GrowID' button!"
 
-            growid = user_data[0]
             logger.info(f"Processing purchase for GrowID: {growid}")
 
-            # Get product information
-            cursor.execute("""
-                SELECT name, price, stock, description 
-                FROM products 
-                WHERE code = ?
-            """, (product_code,))
-            product = cursor.fetchone()
+            # Get product information from the catalog snapshot
+            product = catalog.current(guild_id).get(product_code)
 
             if not product:
                 return f"❌ Product with code `{product_code}` not found!"
 
-            name, price, stock, description = product
-            logger.info(f"Product info - Name: {name}, Price: {price}, Stock: {stock}")
+            name, price = product.name, product.price
+
+            hold = None
+            if hold_id:
+                hold = holds.book.get(hold_id)
+                if hold is None or hold.user_id != user.id:
+                    return "❌ Your reservation has expired. Please start a new purchase."
+
+            # Stok yang di-hold pembeli lain tidak bisa dibeli
+            reserved = holds.book.held_quantity(guild_id, product_code) - (hold.quantity if hold else 0)
+            stock = store.stock_count(guild_id, product_code) - reserved
+            logger.info(f"Product info - Name: {name}, Price: {price}, Stock: {stock} ({reserved} held)")
 
             if stock < quantity:
-                return f"❌ Not enough stock! Only {stock} items available."
+                return f"❌ Not enough stock! Only {max(stock, 0)} items available."
 
             required_wls = price * quantity
 
             # Get user's balance
-            balance_wl, balance_dl, balance_bgl = await self.get_user_balance(growid)
+            balance_wl, balance_dl, balance_bgl = await self.get_user_balance(guild_id, growid)
             total_wls = get_total_wls(balance_wl, balance_dl, balance_bgl)
 
             logger.info(f"User balance - Total: {total_wls} WL")
@@ -315,108 +296,113 @@ class TransactionCog(commands.Cog):
             else:
                 return "❌ Balance conversion error!"
 
-            # Get items from stock
-            cursor.execute("""
-                SELECT id, content 
-                FROM product_stock 
-                WHERE product_code = ? AND used = 0 
-                LIMIT ?
-            """, (product_code, quantity))
-            
-            items = cursor.fetchall()
-            
-            if len(items) < quantity:
-                return f"❌ Not enough stock available. Only {len(items)} items left."
+            delta = storage.Balance(new_wl - balance_wl, new_dl - balance_dl, new_bgl - balance_bgl)
+            details = storage.purchase_details(quantity, name, product_code)
 
             try:
-                # Update user's balance
-                await self.update_balance(
-                    growid,
-                    new_wl - balance_wl,
-                    new_dl - balance_dl,
-                    new_bgl - balance_bgl,
-                    'PURCHASE',
-                    f"Purchased {quantity}x {name} ({product_code})"
+                # Klaim stok dan potong saldo dalam satu transaksi
+                items, (new_wl, new_dl, new_bgl) = store.purchase(
+                    guild_id, growid, product_code, quantity, delta, str(user), details, reserved
                 )
-
-                # Mark items as used
-                for item_id, _ in items:
-                    cursor.execute("""
-                        UPDATE product_stock 
-                        SET used = 1, 
-                            used_by = ?, 
-                            used_at = ? 
-                        WHERE id = ?
-                    """, (str(user), current_time, item_id))
-
-                # Update product stock
-                cursor.execute("""
-                    UPDATE products 
-                    SET stock = stock - ? 
-                    WHERE code = ?
-                """, (quantity, product_code))
-
-                conn.commit()
-
-                # Prepare DM content
-                content_message = (
-                    f"🛍️ Purchase Details:\n"
-                    f"Product: {name}\n"
-                    f"Quantity: {quantity}\n"
-                    f"Total Price: {required_wls:,} WLs\n"
-                    f"Time: {current_time}\n\n"
-                    f"Your Items:\n"
+            except storage.InsufficientStock as e:
+                return f"❌ Not enough stock available. Only {e.available} items left."
+            except storage.InsufficientBalance:
+                # Saldo berubah sejak dicek di atas
+                return "❌ Insufficient balance!"
+            except Exception as e:
+                logger.error(f"Error processing purchase: {e}")
+                audit.record(
+                    'purchase',
+                    actor_id=user.id,
+                    actor=str(user),
+                    guild_id=guild_id,
+                    growid=growid,
+                    product=product_code,
+                    quantity=quantity,
+                    amount=required_wls,
+                    result='error',
+                    error=str(e)
                 )
-                for i, (_, content) in enumerate(items, 1):
-                    content_message += f"{i}. {content}\n"
+                raise
+
+            charged = True
+            if hold:
+                holds.book.release(hold.id)
+            # Dipakai scheduler maintenance untuk mencari jam sepi
+            maintenance.traffic.record()
+            # Stok sebelum pembelian dikurangi jumlah yang dibeli, tanpa query tambahan
+            forecast.velocity.record(guild_id, product_code, quantity, stock + reserved - quantity)
+            log_channels.digest.publish(
+                guild_id, 'purchase', f"`{growid}` bought {quantity}x {name} for {required_wls:,} WL", required_wls
+            )
+            audit.record(
+                'balance',
+                guild_id=guild_id,
+                growid=growid,
+                type='PURCHASE',
+                amount=-required_wls,
+                delta=delta._asdict(),
+                details=details
+            )
+            audit.record(
+                'purchase',
+                actor_id=user.id,
+                actor=str(user),
+                guild_id=guild_id,
+                growid=growid,
+                product=product_code,
+                quantity=quantity,
+                amount=required_wls,
+                result='ok'
+            )
 
-                # Send items to user
-                try:
-                    if len(content_message) > 1900:
-                        parts = [content_message[i:i+1900] for i in range(0, len(content_message), 1900)]
-                        for part in parts:
-                            await user.send(part)
-                    else:
-                        await user.send(content_message)
-
-                    return (
-                        f"✅ Purchase Successful!\n"
-                        f"• Product: {name}\n"
-                        f"• Quantity: {quantity}\n"
-                        f"• Price Paid: {required_wls:,} WLs\n"
-                        f"• New Balance:\n{format_balance(new_wl, new_dl, new_bgl)}\n"
-                        f"Check your DMs for the items!"
-                    )
-
-                except discord.Forbidden:
-                    return (
-                        f"✅ Purchase Successful!\n"
-                        f"• Product: {name}\n"
-                        f"• Quantity: {quantity}\n"
-                        f"• Price Paid: {required_wls:,} WLs\n"
-                        f"• New Balance:\n{format_balance(new_wl, new_dl, new_bgl)}\n"
-                        f"❗ Couldn't send items via DM. Please enable DMs!"
-                    )
+            # Prepare DM content
+            content_message = (
+                f"🛍️ Purchase Details:\n"
+                f"Product: {name}\n"
+                f"Quantity: {quantity}\n"
+                f"Total Price: {required_wls:,} WLs\n"
+                f"Time: {current_time}\n\n"
+                f"Your Items:\n"
+            )
+            for i, (_, content) in enumerate(items, 1):
+                content_message += f"{i}. {content}\n"
 
-            except Exception as e:
-                conn.rollback()
-                logger.error(f"Error processing purchase: {e}")
-                return f"❌ Error processing purchase: {str(e)}"
+            # Send items to user
+            try:
+                if len(content_message) > 1900:
+                    parts = [content_message[i:i+1900] for i in range(0, len(content_message), 1900)]
+                    for part in parts:
+                        await user.send(part)
+                else:
+                    await user.send(content_message)
+
+                return (
+                    f"✅ Purchase Successful!\n"
+                    f"• Product: {name}\n"
+                    f"• Quantity: {quantity}\n"
+                    f"• Price Paid: {required_wls:,} WLs\n"
+                    f"• New Balance:\n{format_balance(new_wl, new_dl, new_bgl)}\n"
+                    f"Check your DMs for the items!"
+                )
+
+            except discord.Forbidden:
+                return (
+                    f"✅ Purchase Successful!\n"
+                    f"• Product: {name}\n"
+                    f"• Quantity: {quantity}\n"
+                    f"• Price Paid: {required_wls:,} WLs\n"
+                    f"• New Balance:\n{format_balance(new_wl, new_dl, new_bgl)}\n"
+                    f"❗ Couldn't send items via DM. Please enable DMs!"
+                )
 
         except Exception as e:
-            logger.error(f"Error in process_purchase: {e}")
+            if not charged:
+                raise
+            # Saldo sudah terpotong: hasil ini final, jangan sampai dicoba ulang
+            logger.error(f"Error after purchase was charged: {e}")
             return f"❌ An error occurred: {str(e)}"
 
-        finally:
-            if conn:
-                conn.close()
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        """Initialize database when bot is ready"""
-        await self.initialize_database()
-        logger.info("Transaction system initialized")
-
 async def setup(bot):
     cog = TransactionCog(bot)
     await bot.add_cog(cog)
\ No newline at end of file
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'extensions.json'
+
+# Dipakai untuk menghitung time-to-ready
+PROCESS_START = time.perf_counter()
+
+
+class ExtensionSpec:
+    """One entry from the extension manifest"""
+
+    def __init__(self, name: str, enabled: bool = True, required: bool = False, after=None):
+        self.name = name
+        self.enabled = enabled
+        self.required = required
+        self.after = list(after or [])
+
+
+class LoadResult:
+    __slots__ = ('name', 'status', 'duration_ms', 'error', 'level')
+
+    def __init__(self, name, status, duration_ms=0.0, error=None, level=0):
+        self.name = name
+        self.status = status
+        self.duration_ms = duration_ms
+        self.error = error
+        self.level = level
+
+
+class StartupReport:
+    """Per-extension load timings and time-to-ready"""
+
+    def __init__(self):
+        self.results = []
+        self.load_started = None
+        self.load_finished = None
+        self.ready_at = None
+
+    @property
+    def load_ms(self):
+        if self.load_started is None or self.load_finished is None:
+            return None
+        return (self.load_finished - self.load_started) * 1000
+
+    @property
+    def ready_ms(self):
+        if self.ready_at is None:
+            return None
+        return (self.ready_at - PROCESS_START) * 1000
+
+    def mark_ready(self):
+        if self.ready_at is None:
+            self.ready_at = time.perf_counter()
+
+    def format(self) -> str:
+        lines = [f"{'extension':<24} {'lvl':>3} {'status':<9} {'ms':>8}"]
+        for result in self.results:
+            lines.append(
+                f"{result.name:<24} {result.level:>3} {result.status:<9} {result.duration_ms:>8.1f}"
+            )
+            if result.error:
+                lines.append(f"    {result.error}")
+        if self.load_ms is not None:
+            lines.append(f"Extensions loaded in {self.load_ms:.1f} ms")
+        if self.ready_ms is not None:
+            lines.append(f"Time to ready: {self.ready_ms:.0f} ms")
+        return "\n".join(lines)
+
+
+def load_manifest(path: str = MANIFEST_FILE):
+    """Parse the manifest and return specs in declaration order"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    specs = []
+    seen = set()
+    for entry in data.get('extensions', []):
+        spec = ExtensionSpec(
+            entry['name'],
+            entry.get('enabled', True),
+            entry.get('required', False),
+            entry.get('after', [])
+        )
+        if spec.name in seen:
+            raise ValueError(f"Duplicate extension in manifest: {spec.name}")
+        seen.add(spec.name)
+        specs.append(spec)
+    return specs
+
+
+def plan_levels(specs):
+    """
+    Group enabled extensions into dependency levels.
+
+    Every extension in a level only depends on extensions from earlier
+    levels, so a whole level can be loaded concurrently.
+    """
+    enabled = {spec.name: spec for spec in specs if spec.enabled}
+    for spec in enabled.values():
+        for dep in spec.after:
+            if dep not in enabled:
+                raise ValueError(f"{spec.name} depends on {dep}, which is missing or disabled")
+
+    levels = []
+    placed = {}
+    remaining = [spec for spec in specs if spec.enabled]
+    while remaining:
+        level = [spec for spec in remaining if all(dep in placed for dep in spec.after)]
+        if not level:
+            cycle = ', '.join(spec.name for spec in remaining)
+            raise ValueError(f"Dependency cycle between extensions: {cycle}")
+        for spec in level:
+            placed[spec.name] = len(levels)
+        levels.append(level)
+        remaining = [spec for spec in remaining if spec.name not in placed]
+    return levels
+
+
+async def _load_one(bot, spec, level, failed):
+    blocked = [dep for dep in spec.after if dep in failed]
+    if blocked:
+        failed.add(spec.name)
+        return LoadResult(spec.name, 'skipped', error=f"dependency failed: {', '.join(blocked)}", level=level)
+
+    start = time.perf_counter()
+    try:
+        await bot.load_extension(spec.name)
+    except Exception as e:
+        failed.add(spec.name)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if spec.required:
+            raise RuntimeError(f"Required extension {spec.name} failed to load: {e}") from e
+        logger.error(f'Failed to load {spec.name}: {e}')
+        return LoadResult(spec.name, 'failed', duration_ms, str(e), level)
+
+    duration_ms = (time.perf_counter() - start) * 1000
+    logger.info(f'Loaded {spec.name} in {duration_ms:.1f} ms')
+    return LoadResult(spec.name, 'loaded', duration_ms, level=level)
+
+
+async def load_from_manifest(bot, path: str = MANIFEST_FILE) -> StartupReport:
+    """Load every enabled extension, level by level"""
+    report = StartupReport()
+    report.load_started = time.perf_counter()
+
+    specs = load_manifest(path)
+    for spec in specs:
+        if not spec.enabled:
+            report.results.append(LoadResult(spec.name, 'disabled'))
+
+    failed = set()
+    for level, level_specs in enumerate(plan_levels(specs)):
+        results = await asyncio.gather(*(_load_one(bot, spec, level, failed) for spec in level_specs))
+        report.results.extend(results)
+
+    report.load_finished = time.perf_counter()
+    logger.info(f'Startup report:\n{report.format()}')
+    return report
+
+
+async def reload_extension(bot, name: str) -> float:
+    """Reload one extension in place; returns duration in ms"""
+    start = time.perf_counter()
+    if name in bot.extensions:
+        await bot.reload_extension(name)
+    else:
+        await bot.load_extension(name)
+    return (time.perf_counter() - start) * 1000
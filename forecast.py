@@ -0,0 +1,190 @@
+"""
+Sales velocity, stock-out ETA and low-stock alerts.
+
+Each product keeps an exponentially weighted sales rate, updated in O(1)
+per purchase: the rate decays with a configurable half-life and each
+purchase adds quantity / tau. Stock levels come from the same events
+(purchases report what is left, the live board reports the counts it
+already fetched), so forecasting never queries product_stock on its own.
+
+ForecastService re-evaluates the in-memory state every check_seconds
+and DMs the admin once when a product is predicted to sell out within
+alert_hours. The alert is re-armed only after the ETA climbs past
+clear_hours (restock or slower sales), so a product hovering around the
+threshold does not alert on every check.
+"""
+import asyncio
+import logging
+import math
+import time
+import settings
+import catalog
+import storage
+from lifecycle import Service
+
+logger = logging.getLogger(__name__)
+
+# Berapa half-life riwayat rollup per jam yang dibaca saat start
+SEED_HALF_LIVES = 4
+# Riwayat minimum untuk koreksi bias, agar satu pembelian tidak dianggap laju tak hingga
+MIN_HISTORY_SECONDS = 3600
+
+
+class SalesVelocity:
+    """EWMA sales rate and last known stock per (guild_id, code)"""
+
+    def __init__(self, half_life_hours: float = 6):
+        self.tau = half_life_hours * 3600 / math.log(2)
+        self.rates = {}     # (guild_id, code) -> [items per second, update terakhir, penjualan pertama]
+        self.stock = {}     # (guild_id, code) -> stok tersedia terakhir yang diketahui
+
+    def set_half_life(self, half_life_hours: float):
+        self.tau = half_life_hours * 3600 / math.log(2)
+
+    def record(self, guild_id: int, code: str, quantity: int, remaining: int = None, now: float = None):
+        """A purchase of `quantity`; `remaining` is the stock left after it, if known"""
+        now = time.time() if now is None else now
+        state = self.rates.setdefault((guild_id, code), [0.0, now, now])
+        state[0] = state[0] * math.exp(-max(now - state[1], 0) / self.tau) + quantity / self.tau
+        state[1] = max(state[1], now)
+        if remaining is not None:
+            self.stock[(guild_id, code)] = max(remaining, 0)
+
+    def observe(self, guild_id: int, counts):
+        """Stock counts {code: available} for one guild, e.g. from the live board"""
+        for key in [key for key in self.stock if key[0] == guild_id and key[1] not in counts]:
+            self.stock[key] = 0
+        for code, count in counts.items():
+            self.stock[(guild_id, code)] = count
+
+    def rate(self, guild_id: int, code: str, now: float = None) -> float:
+        """Items per hour"""
+        state = self.rates.get((guild_id, code))
+        if state is None:
+            return 0.0
+        now = time.time() if now is None else now
+        # Koreksi bias awal: riwayat yang lebih pendek dari tau belum "terisi" penuh
+        warmup = 1 - math.exp(-max(now - state[2], MIN_HISTORY_SECONDS) / self.tau)
+        return state[0] * math.exp(-max(now - state[1], 0) / self.tau) / warmup * 3600
+
+    def eta(self, guild_id: int, code: str, stock: int = None, now: float = None):
+        """Hours until `stock` (default: last known) sells out at the current rate; None if not selling"""
+        stock = self.stock.get((guild_id, code)) if stock is None else stock
+        rate = self.rate(guild_id, code, now)
+        if stock is None or rate <= 0:
+            return None
+        return stock / rate
+
+    def seed(self, guild_id: int, buckets):
+        """Replay hourly SalesBucket rows (oldest first) as purchases at each bucket's midpoint"""
+        for bucket in buckets:
+            if bucket.items > 0:
+                self.record(guild_id, bucket.key, bucket.items, now=bucket.bucket + 1800)
+
+
+velocity = SalesVelocity()
+
+
+def describe_eta(hours) -> str:
+    if hours is None:
+        return 'no recent sales'
+    if hours < 1:
+        return f'~{hours * 60:.0f} min'
+    if hours < 48:
+        return f'~{hours:.1f} h'
+    return f'~{hours / 24:.1f} days'
+
+
+class ForecastService(Service):
+    """Seeds velocity from the rollups and sends low-stock alerts with hysteresis"""
+
+    name = 'forecast'
+
+    def __init__(self, bot, config, tracker: SalesVelocity = velocity):
+        self.bot = bot
+        self.config = config
+        self.tracker = tracker
+        self.alerted = {}   # (guild_id, code) -> ETA (jam) saat alert dikirim
+        self.task = None
+
+    def evaluate(self, now: float = None):
+        """
+        (new alerts, cleared keys) since the last call. Cleared keys leave
+        the alerted set here; new alerts join it only via mark_alerted(),
+        after the DM went out, so a failed DM is retried on the next check.
+        """
+        config = self.config()
+        alerts, cleared = [], []
+        for key in list(self.tracker.stock):
+            if catalog.current(key[0]).get(key[1]) is None:
+                self.alerted.pop(key, None)
+                continue
+            eta = self.tracker.eta(*key, now=now)
+            rate = self.tracker.rate(*key, now=now)
+            if key in self.alerted:
+                if eta is None or eta >= config.clear_hours:
+                    del self.alerted[key]
+                    cleared.append(key)
+            elif eta is not None and eta <= config.alert_hours and rate * 24 >= config.min_per_day:
+                alerts.append((key, eta, rate))
+        return alerts, cleared
+
+    def mark_alerted(self, alerts):
+        for key, eta, _ in alerts:
+            self.alerted[key] = eta
+
+    async def notify(self, alerts):
+        admin_id = settings.get().admin_id
+        admin = self.bot.get_user(admin_id) or await self.bot.fetch_user(admin_id)
+        lines = []
+        for (guild_id, code), eta, rate in alerts:
+            stock = self.tracker.stock.get((guild_id, code), 0)
+            product = catalog.current(guild_id).get(code)
+            name = f"{product.name} ({code})" if product else code
+            if stock == 0:
+                lines.append(f"• **{name}** is sold out (was selling ~{rate:.1f}/h)")
+            else:
+                lines.append(f"• **{name}**: {stock:,} left, ~{rate:.1f}/h, out in {describe_eta(eta)}")
+        await admin.send("⚠️ Low stock forecast:\n" + "\n".join(lines))
+
+    async def run(self):
+        while True:
+            config = self.config()
+            await asyncio.sleep(config.check_seconds)
+            if not config.enabled:
+                continue
+            self.tracker.set_half_life(config.half_life_hours)
+            alerts, cleared = self.evaluate()
+            for guild_id, code in cleared:
+                logger.info(f'Low stock alert for {code} (guild {guild_id}) cleared')
+            if alerts:
+                logger.info(f'Low stock alerts: {", ".join(code for (_, code), _, _ in alerts)}')
+                try:
+                    await self.notify(alerts)
+                except Exception as e:
+                    logger.error(f'Failed to send low stock alert, retrying next check: {e}')
+                else:
+                    self.mark_alerted(alerts)
+
+    async def start(self):
+        config = self.config()
+        self.tracker.set_half_life(config.half_life_hours)
+        store = storage.get()
+        since = time.time() - SEED_HALF_LIVES * config.half_life_hours * 3600
+        counts = await asyncio.to_thread(store.stock_counts)
+        for guild_id in settings.get().guild_ids():
+            buckets = await asyncio.to_thread(store.sales_rollup, guild_id, 'product', 'hour', since)
+            self.tracker.seed(guild_id, buckets)
+            self.tracker.observe(guild_id, counts.get(guild_id, {}))
+        logger.info(f'Sales velocity seeded for {len(self.tracker.rates)} products')
+        self.task = asyncio.get_running_loop().create_task(self.run(), name='forecast')
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        return f'{len(self.alerted)} products below the stock-out threshold'
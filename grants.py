@@ -0,0 +1,156 @@
+"""
+Bulk grants: deliver stock to many users from one CSV.
+
+The CSV has one `user,product,count` row per grant (user is an ID or a
+mention; a header row is skipped). parse_csv checks every row in one
+pass so the admin sees all problems at once, the cog claims the stock
+for all rows in one storage.claim_batch transaction, and the DMs go out
+through DeliveryService, which paces them with a token bucket instead
+of firing hundreds of DMs at Discord at once.
+"""
+import asyncio
+import csv
+import io
+import logging
+import re
+import time
+from collections import namedtuple
+import discord
+from lifecycle import Service
+
+logger = logging.getLogger(__name__)
+
+GrantRow = namedtuple('GrantRow', 'line user_id code count')
+
+# Status pengiriman per baris
+DELIVERED = 'delivered'
+PARTIAL = 'partial'         # sebagian pesan terkirim; item tidak dikembalikan ke stok
+DM_CLOSED = 'dm_closed'
+FAILED = 'failed'
+
+MESSAGE_LIMIT = 1900
+USER_PATTERN = re.compile(r'^<@!?(\d+)>$|^(\d+)$')
+
+
+def parse_csv(text: str, max_rows: int):
+    """(rows, errors) where errors are 'line N: reason' strings"""
+    rows, errors = [], []
+    for line, fields in enumerate(csv.reader(io.StringIO(text)), 1):
+        fields = [field.strip() for field in fields]
+        if not any(fields):
+            continue
+        if line == 1 and fields[0].lower() in ('user', 'user_id', 'userid', 'discord_id'):
+            continue
+        if len(fields) != 3:
+            errors.append(f'line {line}: expected user,product,count')
+            continue
+        user, code, count = fields
+        match = USER_PATTERN.match(user)
+        if not match:
+            errors.append(f'line {line}: {user!r} is not a user ID or mention')
+            continue
+        if not count.isdigit() or int(count) <= 0:
+            errors.append(f'line {line}: count must be a positive number, got {count!r}')
+            continue
+        rows.append(GrantRow(line, int(match.group(1) or match.group(2)), code, int(count)))
+    if len(rows) > max_rows:
+        errors.append(f'{len(rows)} rows, at most {max_rows} per grant')
+    return rows, errors
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT):
+    return [text[i:i + limit] for i in range(0, len(text), limit)] or ['']
+
+
+class DeliveryService(Service):
+    """
+    Sends queued DMs one at a time, at most `dm_per_second` with bursts
+    of `dm_burst`. submit() returns a future resolved with a status
+    constant; Forbidden (DMs closed) is final, other HTTP errors are
+    retried `dm_retries` times with backoff.
+    """
+
+    name = 'delivery'
+
+    def __init__(self, config):
+        self.config = config
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.current = None
+        self.sent = 0
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+
+    def submit(self, user, messages) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((user, messages, future))
+        return future
+
+    async def _take_token(self):
+        config = self.config()
+        while True:
+            now = time.monotonic()
+            self._tokens = min(config.dm_burst, self._tokens + (now - self._refilled) * config.dm_per_second)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / config.dm_per_second)
+
+    async def deliver(self, user, messages):
+        sent = 0
+        for message in messages:
+            attempt = 0
+            while True:
+                await self._take_token()
+                try:
+                    await user.send(message)
+                    self.sent += 1
+                    break
+                except discord.Forbidden:
+                    return PARTIAL if sent else DM_CLOSED
+                except discord.HTTPException as e:
+                    attempt += 1
+                    if attempt > self.config().dm_retries:
+                        logger.warning(f'Giving up on DM to {user} after {attempt} attempts: {e}')
+                        return PARTIAL if sent else FAILED
+                    await asyncio.sleep(2 ** attempt)
+            sent += 1
+        return DELIVERED
+
+    async def run(self):
+        while True:
+            user, messages, future = await self.queue.get()
+            self.current = future
+            try:
+                status = await self.deliver(user, messages)
+            except Exception as e:
+                logger.error(f'DM delivery to {user} failed: {e}')
+                status = FAILED
+            if not future.done():
+                future.set_result(status)
+            self.current = None
+
+    async def start(self):
+        self._refilled = time.monotonic()
+        self.task = asyncio.get_running_loop().create_task(self.run(), name='delivery')
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        # Pesan yang sedang dikirim mungkin sudah sampai; itemnya jangan dikembalikan
+        if self.current and not self.current.done():
+            self.current.set_result(PARTIAL)
+        # DM yang belum terkirim dilaporkan gagal; pemanggil mengembalikan itemnya ke stok
+        pending = 0
+        while not self.queue.empty():
+            _, _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_result(FAILED)
+            pending += 1
+        return f'{self.sent} DMs sent, {pending} undelivered'
@@ -0,0 +1,170 @@
+"""
+Cart reservations: stock held for a buyer while they confirm a purchase.
+
+Holds are counts, not rows: a hold for 3x ACC keeps 3 units of ACC out
+of everyone else's reach (claims pass the held total as `reserved`, and
+the live board subtracts it) until the buyer confirms, cancels, or the
+hold expires.
+
+The HoldBook lives in memory. Expiry uses a min-heap of
+(expires_at, hold id) with lazy deletion, so placing, releasing and
+expiring a hold are O(log n) and a sweep only touches expired entries.
+Changes are written behind to the stock_holds table in batches by
+HoldService, so holds survive a restart.
+"""
+import asyncio
+import heapq
+import logging
+import secrets
+import time
+import storage
+from lifecycle import Service
+from storage import Hold
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = 1.0
+
+
+class HoldBook:
+    """Active holds with per-product held totals and an expiry heap"""
+
+    def __init__(self):
+        self.holds = {}         # id -> Hold
+        self.by_user = {}       # (guild_id, user_id) -> id; satu keranjang per user per guild
+        self.held = {}          # (guild_id, code) -> jumlah yang di-hold
+        self._heap = []         # (expires_at, id), entri basi dilewati saat pop
+        self._upserts = {}      # id -> Hold yang belum ditulis ke shadow
+        self._deletes = set()
+
+    def __len__(self):
+        return len(self.holds)
+
+    def _add(self, hold):
+        self.holds[hold.id] = hold
+        self.by_user[(hold.guild_id, hold.user_id)] = hold.id
+        key = (hold.guild_id, hold.code)
+        self.held[key] = self.held.get(key, 0) + hold.quantity
+        heapq.heappush(self._heap, (hold.expires_at, hold.id))
+
+    def _remove(self, hold_id):
+        hold = self.holds.pop(hold_id, None)
+        if hold is None:
+            return None
+        if self.by_user.get((hold.guild_id, hold.user_id)) == hold_id:
+            del self.by_user[(hold.guild_id, hold.user_id)]
+        key = (hold.guild_id, hold.code)
+        self.held[key] -= hold.quantity
+        if not self.held[key]:
+            del self.held[key]
+        self._upserts.pop(hold_id, None)
+        self._deletes.add(hold_id)
+        # Entri heap dibiarkan; dibangun ulang kalau sudah terlalu banyak yang basi
+        if len(self._heap) > 2 * len(self.holds) + 64:
+            self._heap = [(hold.expires_at, hold.id) for hold in self.holds.values()]
+            heapq.heapify(self._heap)
+        return hold
+
+    def place(self, guild_id: int, user_id: int, code: str, quantity: int, ttl: float, now: float = None) -> Hold:
+        """Hold `quantity` of a product for a user, replacing the user's previous hold in the guild"""
+        now = time.time() if now is None else now
+        previous = self.by_user.get((guild_id, user_id))
+        if previous:
+            self._remove(previous)
+        hold = Hold(secrets.token_hex(8), guild_id, user_id, code, quantity, now + ttl)
+        self._add(hold)
+        self._upserts[hold.id] = hold
+        return hold
+
+    def get(self, hold_id: str, now: float = None):
+        """The hold if it is still active"""
+        hold = self.holds.get(hold_id)
+        if hold is None or hold.expires_at <= (time.time() if now is None else now):
+            return None
+        return hold
+
+    def release(self, hold_id: str):
+        """Drop a hold after purchase or cancel; returns it, or None if already gone"""
+        return self._remove(hold_id)
+
+    def held_quantity(self, guild_id: int, code: str) -> int:
+        return self.held.get((guild_id, code), 0)
+
+    def held_for(self, guild_id: int):
+        """{code: held quantity} for one guild"""
+        return {code: quantity for (g, code), quantity in self.held.items() if g == guild_id}
+
+    def expire(self, now: float = None):
+        """Remove every hold whose deadline has passed; returns them"""
+        now = time.time() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, hold_id = heapq.heappop(self._heap)
+            hold = self.holds.get(hold_id)
+            if hold is not None and hold.expires_at == expires_at:
+                expired.append(self._remove(hold_id))
+        return expired
+
+    def restore(self, holds, now: float = None):
+        """Load holds from the shadow table; already expired ones are dropped"""
+        now = time.time() if now is None else now
+        restored = 0
+        for hold in holds:
+            if hold.expires_at > now and (hold.guild_id, hold.user_id) not in self.by_user:
+                self._add(hold)
+                restored += 1
+            else:
+                self._deletes.add(hold.id)
+        return restored
+
+    def take_pending(self):
+        """(upserts, deleted ids) not yet written to the shadow table"""
+        upserts, deletes = list(self._upserts.values()), list(self._deletes)
+        self._upserts, self._deletes = {}, set()
+        return upserts, deletes
+
+
+book = HoldBook()
+
+
+class HoldService(Service):
+    """Expires holds and writes changes behind to storage every FLUSH_SECONDS"""
+
+    name = 'holds'
+
+    def __init__(self, hold_book: HoldBook = book):
+        self.book = hold_book
+        self.task = None
+
+    async def flush(self):
+        upserts, deletes = self.book.take_pending()
+        if upserts or deletes:
+            try:
+                await asyncio.to_thread(storage.get().sync_holds, upserts, deletes)
+            except Exception as e:
+                logger.error(f'Failed to persist {len(upserts)} holds / {len(deletes)} releases: {e}')
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(FLUSH_SECONDS)
+            expired = self.book.expire()
+            if expired:
+                logger.info(f'Expired {len(expired)} holds ({sum(hold.quantity for hold in expired)} items)')
+            await self.flush()
+
+    async def start(self):
+        restored = self.book.restore(await asyncio.to_thread(storage.get().load_holds))
+        logger.info(f'Restored {restored} active holds')
+        await self.flush()
+        self.task = asyncio.get_running_loop().create_task(self.run(), name='holds')
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+        return f'{len(self.book)} holds persisted'
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_TIMEOUT = 15.0
+
+
+class Service:
+    """
+    Base class for long-running components.
+
+    Subclasses override start() and stop(). stop() should drain pending
+    work and return a short status string for the shutdown report.
+    """
+
+    name = 'service'
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        return 'stopped'
+
+
+class InFlight(Service):
+    """
+    Counts in-flight operations so shutdown can wait for them.
+
+    Usage:
+        if not tracker.accepting: reject
+        async with tracker: ...
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.accepting = True
+        self.count = 0
+        self.completed = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __aenter__(self):
+        self.count += 1
+        self._idle.clear()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.count -= 1
+        self.completed += 1
+        if self.count == 0:
+            self._idle.set()
+
+    async def start(self):
+        self.accepting = True
+
+    async def stop(self):
+        """Stop accepting new work and wait for running work to finish"""
+        self.accepting = False
+        pending = self.count
+        await self._idle.wait()
+        return f'drained {pending} in flight, {self.completed} completed'
+
+
+class LifecycleManager:
+    """Starts services once and stops them in reverse order on shutdown"""
+
+    def __init__(self, timeout: float = SHUTDOWN_TIMEOUT):
+        self.timeout = timeout
+        self.services = []
+        self.started = False
+        self.stopping = False
+        self.report = []
+
+    async def register(self, service: Service):
+        """Add a service; starts it right away if the bot is already running"""
+        self.services.append(service)
+        if self.started and not self.stopping:
+            await self._start(service)
+
+    async def unregister(self, service: Service):
+        """Stop and remove a service (used by cog_unload on reload)"""
+        if service in self.services:
+            self.services.remove(service)
+            if self.started:
+                await self._stop(service, self.timeout)
+
+    async def start_all(self):
+        if self.started:
+            return
+        self.started = True
+        for service in list(self.services):
+            await self._start(service)
+
+    async def _start(self, service):
+        start = time.perf_counter()
+        try:
+            await service.start()
+            logger.info(f'Service {service.name} started in {(time.perf_counter() - start) * 1000:.1f} ms')
+        except Exception as e:
+            logger.error(f'Service {service.name} failed to start: {e}')
+
+    async def _stop(self, service, timeout):
+        start = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(service.stop(), timeout)
+        except asyncio.TimeoutError:
+            status = f'timed out after {timeout:.1f}s'
+        except Exception as e:
+            status = f'error: {e}'
+        duration = time.perf_counter() - start
+        self.report.append((service.name, duration, status))
+        return duration
+
+    async def stop_all(self):
+        """Stop every service within the shared shutdown budget"""
+        if self.stopping:
+            return self.report
+        self.stopping = True
+        deadline = time.perf_counter() + self.timeout
+        for service in reversed(self.services):
+            remaining = max(0.1, deadline - time.perf_counter())
+            await self._stop(service, remaining)
+        logger.info(f'Shutdown report:\n{self.format_report()}')
+        return self.report
+
+    def format_report(self) -> str:
+        lines = [f"{'service':<20} {'ms':>8}  status"]
+        for name, duration, status in self.report:
+            lines.append(f"{name:<20} {duration * 1000:>8.1f}  {status}")
+        return "\n".join(lines)
@@ -0,0 +1,186 @@
+"""
+Batched posting to the purchase and donation log channels.
+
+publish() only appends to an in-memory buffer per (guild, channel kind);
+DigestService posts each buffer as one multi-line digest when it reaches
+max_lines events or its oldest event is flush_seconds old. Events worth
+at least high_value_wl skip the digest and get their own embed.
+
+Posting respects a minimum interval per channel. A failed post (gateway
+reconnecting, channel not cached yet, HTTP error) leaves the events in
+the buffer for the next attempt, so nothing is lost across reconnects;
+only max_buffer, the cap per channel, drops the oldest events.
+"""
+import asyncio
+import logging
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+import discord
+import settings
+from lifecycle import Service
+
+logger = logging.getLogger(__name__)
+
+Event = namedtuple('Event', ['at', 'text', 'value'])
+
+# kind -> (field channel di GuildSettings, judul digest, judul embed nilai besar)
+KINDS = {
+    'purchase': ('id_log_purch', '🛒 Purchases', '💎 Large Purchase'),
+    'donation': ('id_donation_log', '💰 Donations', '💎 Large Donation'),
+}
+MESSAGE_LIMIT = 1900
+TICK_SECONDS = 1.0
+
+
+def channel_id(guild_id: int, kind: str) -> int:
+    guild = settings.get().guild(guild_id)
+    return getattr(guild, KINDS[kind][0]) if guild else 0
+
+
+class LogDigest:
+    """Pending log channel events; publish() is O(1) and never awaits"""
+
+    def __init__(self):
+        self.buffers = {}       # (guild_id, kind) -> deque of Event, terlama di kiri
+        self.urgent = deque()   # (guild_id, kind, Event) yang diposting sendiri
+        self.dropped = 0
+        self.wake = asyncio.Event()
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in self.buffers.values()) + len(self.urgent)
+
+    def publish(self, guild_id: int, kind: str, text: str, value: int = 0):
+        """Queue one event for its log channel; dropped if the guild has no such channel"""
+        if not channel_id(guild_id, kind):
+            return
+        config = settings.get().log_digest
+        event = Event(time.time(), text, value)
+        if config.high_value_wl and value >= config.high_value_wl:
+            self.urgent.append((guild_id, kind, event))
+            self.wake.set()
+            return
+        buffer = self.buffers.setdefault((guild_id, kind), deque())
+        buffer.append(event)
+        if len(buffer) > config.max_buffer:
+            buffer.popleft()
+            self.dropped += 1
+        if len(buffer) >= config.max_lines:
+            self.wake.set()
+
+
+digest = LogDigest()
+
+
+def format_digest(kind: str, events):
+    """Digest messages for `events`, each under Discord's length limit"""
+    start = datetime.utcfromtimestamp(events[0].at).strftime('%H:%M')
+    end = datetime.utcfromtimestamp(events[-1].at).strftime('%H:%M')
+    header = f"**{KINDS[kind][1]}** ({len(events)}, {start}–{end} UTC)\n"
+    messages, message = [], header
+    for event in events:
+        line = f"• {event.text}\n"
+        if len(message) + len(line) > MESSAGE_LIMIT:
+            messages.append(message)
+            message = ""
+        message += line
+    messages.append(message)
+    return messages
+
+
+class DigestService(Service):
+    """Flushes LogDigest buffers on the size/time trigger, rate limited per channel"""
+
+    name = 'log-digest'
+
+    def __init__(self, bot, config, log: LogDigest = digest):
+        self.bot = bot
+        self.config = config
+        self.log = log
+        self.task = None
+        self.posted = 0
+        self._next_post = {}    # channel id -> waktu paling awal boleh posting lagi
+
+    def channel(self, guild_id, kind):
+        target = channel_id(guild_id, kind)
+        return self.bot.get_channel(target) if target else None
+
+    def ready(self, channel, now, force):
+        return force or now >= self._next_post.get(channel.id, 0)
+
+    async def send(self, channel, **kwargs):
+        await channel.send(**kwargs)
+        self.posted += 1
+        self._next_post[channel.id] = time.time() + self.config().min_interval_seconds
+
+    async def flush(self, force: bool = False):
+        config = self.config()
+        now = time.time()
+
+        # Transaksi bernilai besar: satu embed per event
+        while self.log.urgent:
+            guild_id, kind, event = self.log.urgent[0]
+            channel = self.channel(guild_id, kind)
+            if channel is None or not self.ready(channel, now, force):
+                break
+            embed = discord.Embed(
+                title=KINDS[kind][2],
+                description=event.text,
+                color=discord.Color.gold(),
+                timestamp=datetime.utcfromtimestamp(event.at)
+            )
+            try:
+                await self.send(channel, embed=embed)
+            except discord.HTTPException as e:
+                logger.warning(f'Posting to log channel {channel.id} failed, will retry: {e}')
+                break
+            self.log.urgent.popleft()
+
+        for (guild_id, kind), buffer in list(self.log.buffers.items()):
+            if not buffer:
+                continue
+            due = force or len(buffer) >= config.max_lines or now - buffer[0].at >= config.flush_seconds
+            if not due:
+                continue
+            channel = self.channel(guild_id, kind)
+            if channel is None or not self.ready(channel, now, force):
+                continue
+            events = [buffer[i] for i in range(min(len(buffer), config.max_lines))]
+            try:
+                for message in format_digest(kind, events):
+                    await self.send(channel, content=message)
+            except discord.HTTPException as e:
+                # Tetap di buffer: lebih baik terkirim dua kali daripada hilang
+                logger.warning(f'Posting digest to log channel {channel.id} failed, will retry: {e}')
+                continue
+            for _ in events:
+                buffer.popleft()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.log.wake.wait(), timeout=TICK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.log.wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f'Log digest flush failed: {e}')
+
+    async def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run(), name='log-digest')
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            await self.flush(force=True)
+        except Exception as e:
+            logger.error(f'Final log digest flush failed: {e}')
+        return f'{self.posted} posts, {len(self.log)} events unposted, {self.log.dropped} dropped'
@@ -0,0 +1,155 @@
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_DIR = 'logs'
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+
+# Logger untuk event volume tinggi: (records per detik, burst)
+DEFAULT_RATE_LIMITS = {
+    'main.messages': (5, 20),
+}
+
+_listener = None
+_rate_filter = None
+
+
+def _gzip_namer(name):
+    return name + '.gz'
+
+
+def _gzip_rotator(source, dest):
+    """Compress the rolled-over file instead of just renaming it"""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def rotating_handler(filename, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    """Size-capped file handler that gzips old segments on rollover"""
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+class NameFilter(logging.Filter):
+    """Only pass records from the given logger name prefixes"""
+
+    def __init__(self, *prefixes):
+        super().__init__()
+        self.prefixes = prefixes
+
+    def filter(self, record):
+        return record.name.startswith(self.prefixes)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per logger name.
+
+    Records over the budget are dropped; the next record that gets
+    through carries a count of how many were suppressed. WARNING and
+    above are never sampled.
+    """
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = dict(limits)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        limit = self._limit_for(record.name)
+        if limit is None:
+            return True
+        rate, burst = limit
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, dropped = self._buckets.get(record.name, (burst, now, 0))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now, dropped + 1)
+                return False
+            self._buckets[record.name] = (tokens - 1, now, 0)
+        if dropped:
+            record.msg = f"{record.msg} [{dropped} similar records suppressed]"
+        return True
+
+    def _limit_for(self, name):
+        while name:
+            if name in self.limits:
+                return self.limits[name]
+            name = name.rpartition('.')[0]
+        return None
+
+
+def setup_logging(level=logging.INFO, log_dir=LOG_DIR, rate_limits=None,
+                  max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    """
+    Route all logging through a queue so the event loop never blocks on I/O.
+
+    The root logger only gets a QueueHandler; console and file handlers
+    run on the QueueListener's thread.
+    """
+    global _listener, _rate_filter
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+
+    bot_file = rotating_handler(os.path.join(log_dir, 'bot.log'), max_bytes, backup_count)
+    bot_file.setFormatter(formatter)
+
+    # Log command untuk LoggingHandler (dulu transactions.log mode 'w')
+    transactions_file = rotating_handler(os.path.join(log_dir, 'transactions.log'), max_bytes, backup_count)
+    transactions_file.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
+    transactions_file.addFilter(NameFilter('cogs.logging_handler'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    _rate_filter = RateLimitFilter({**DEFAULT_RATE_LIMITS, **(rate_limits or {})})
+    queue_handler.addFilter(_rate_filter)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, console, bot_file, transactions_file, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def set_rate_limits(limits):
+    """Update per-logger rate limits: {name: (per_second, burst)}"""
+    if _rate_filter is not None:
+        _rate_filter.limits.update({name: tuple(limit) for name, limit in limits.items()})
+
+
+def stop_logging():
+    """Flush the queue and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+INTERVAL = 0.1
+STALL_THRESHOLD_MS = 250
+STACK_DEPTH = 15
+MAX_RECENT_STALLS = 20
+
+# Batas atas bucket histogram lag (ms)
+LAG_BUCKETS = (5, 25, 100, 250, 1000, 5000)
+
+
+def _describe_task(task):
+    """Human readable name for the task that was running"""
+    if task is None:
+        return '<no task: plain callback>'
+    coro = task.get_coro()
+    name = getattr(coro, '__qualname__', None) or repr(coro)
+    return f"{task.get_name()} ({name})"
+
+
+class Stall:
+    """One detected event-loop stall"""
+
+    __slots__ = ('started_at', 'duration_ms', 'task', 'stack')
+
+    def __init__(self, started_at, task, stack):
+        self.started_at = started_at
+        self.duration_ms = 0.0
+        self.task = task
+        self.stack = stack
+
+
+class LoopMonitor:
+    """
+    Mengukur lag event loop secara terus-menerus.
+
+    A heartbeat coroutine ticks every INTERVAL seconds. A watchdog thread
+    notices when the heartbeat goes stale and snapshots the loop thread's
+    stack while the blocking call is still on it, so the culprit shows up
+    in the report instead of whatever ran afterwards.
+    """
+
+    def __init__(self, interval: float = INTERVAL, threshold_ms: float = STALL_THRESHOLD_MS):
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self.loop = None
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        self._heartbeat_task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+        self._current_stall = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.max_lag_ms = 0.0
+        self.last_lag_ms = 0.0
+        self.stall_count = 0
+        self.histogram = [0] * (len(LAG_BUCKETS) + 1)
+        self.recent_stalls = []
+
+    def start(self, loop=None):
+        self.loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat_task = self.loop.create_task(self._heartbeat(), name='loop-monitor-heartbeat')
+        self._watchdog = threading.Thread(target=self._watch, name='loop-monitor-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info(f'Loop monitor started (threshold {self.threshold_ms} ms)')
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag_ms = max(0.0, (now - expected) * 1000)
+            self._record_lag(lag_ms)
+            with self._lock:
+                self._last_beat = now
+                stall = self._current_stall
+                self._current_stall = None
+            if stall is not None:
+                stall.duration_ms = lag_ms
+                self._report(stall)
+
+    def _record_lag(self, lag_ms):
+        self.last_lag_ms = lag_ms
+        if lag_ms > self.max_lag_ms:
+            self.max_lag_ms = lag_ms
+        for i, bound in enumerate(LAG_BUCKETS):
+            if lag_ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def _watch(self):
+        # Berjalan di thread terpisah, tidak ikut terblokir oleh loop
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                stale_ms = (time.monotonic() - self._last_beat) * 1000
+                if stale_ms < self.threshold_ms or self._current_stall is not None:
+                    continue
+                self._current_stall = self._snapshot()
+
+    def _snapshot(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=STACK_DEPTH) if frame else []
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        return Stall(time.time(), _describe_task(task), stack)
+
+    def _report(self, stall):
+        self.stall_count += 1
+        self.recent_stalls.append(stall)
+        if len(self.recent_stalls) > MAX_RECENT_STALLS:
+            self.recent_stalls.pop(0)
+        logger.warning(
+            f'Event loop stalled for {stall.duration_ms:.0f} ms while running {stall.task}\n'
+            + ''.join(stall.stack)
+        )
+
+    def summary(self) -> str:
+        """Text summary of lag metrics and recent stalls"""
+        lines = [
+            f"Last lag: {self.last_lag_ms:.1f} ms",
+            f"Max lag: {self.max_lag_ms:.1f} ms",
+            f"Stalls (>= {self.threshold_ms} ms): {self.stall_count}",
+            "Histogram:",
+        ]
+        lower = 0
+        for bound, count in zip(LAG_BUCKETS, self.histogram):
+            lines.append(f"  {lower:>5}-{bound:<5} ms: {count}")
+            lower = bound
+        lines.append(f"  >{LAG_BUCKETS[-1]:>10} ms: {self.histogram[-1]}")
+        if self.recent_stalls:
+            lines.append("Recent stalls:")
+            for stall in self.recent_stalls[-5:]:
+                when = time.strftime('%H:%M:%S', time.gmtime(stall.started_at))
+                location = stall.stack[-1].strip().splitlines()[0] if stall.stack else '?'
+                lines.append(f"  {when} {stall.duration_ms:>6.0f} ms {stall.task}")
+                lines.append(f"    at {location}")
+        return "\n".join(lines)
+
+
+monitor = None
+
+
+def start(threshold_ms: float = STALL_THRESHOLD_MS, debug: bool = False, slow_callback_ms: float = None):
+    """Start the global loop monitor on the running loop"""
+    global monitor
+    loop = asyncio.get_running_loop()
+    if debug:
+        # asyncio debug mode: log setiap callback yang lebih lambat dari batas
+        loop.set_debug(True)
+        if slow_callback_ms is not None:
+            loop.slow_callback_duration = slow_callback_ms / 1000
+        logging.getLogger('asyncio').setLevel(logging.WARNING)
+        logger.info(f'asyncio debug mode enabled (slow callback {loop.slow_callback_duration * 1000:.0f} ms)')
+    monitor = LoopMonitor(threshold_ms=threshold_ms)
+    monitor.start(loop)
+    return monitor
+
+
+def stop():
+    if monitor:
+        monitor.stop()
@@ -1,65 +1,93 @@
 import discord
 from discord.ext import commands
 import os
-import json
 import logging
 import asyncio
-from database import setup_database, get_connection
+import log_pipeline
+import settings
+import audit
+import extension_loader
+import lifecycle
+import catalog
+import storage
+import backup
+import maintenance
+import stock_purge
+import grants
+import forecast
+import log_channels
+import holds
+import query_trace
+import loop_monitor
 from datetime import datetime
 
 # Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+log_pipeline.setup_logging(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
+message_logger = logging.getLogger(f'{__name__}.messages')
 
 # Load config
 try:
-    with open('config.json', 'r') as config_file:
-        config = json.load(config_file)
-
-    # Bot configuration
-    TOKEN = config['token']
-    GUILD_ID = config['guild_id']
-    ADMIN_ID = int(config['admin_id'])
-    LIVE_STOCK_CHANNEL_ID = int(config['id_live_stock'])
-    LOG_PURCHASE_CHANNEL_ID = int(config['id_log_purch'])
-    DONATION_LOG_CHANNEL_ID = int(config['id_donation_log'])
-
-except FileNotFoundError:
-    logger.error("config.json file not found!")
-    raise
-except json.JSONDecodeError:
-    logger.error("config.json is not valid JSON!")
-    raise
-except KeyError as e:
-    logger.error(f"Missing required configuration key: {e}")
+    config = settings.get()
+except settings.SettingsError as e:
+    logger.error(f"Invalid configuration: {e}")
     raise
 
+def apply_settings(old, new):
+    """Push runtime-tunable settings to the subsystems configured here"""
+    # Per-logger sampling overrides
+    log_pipeline.set_rate_limits(new.log_rate_limits)
+
+    # Optional slow-query tracing
+    if old is None or old.query_trace != new.query_trace:
+        if new.query_trace.enabled or query_trace.TRACE_ENABLED:
+            query_trace.configure(
+                enabled=new.query_trace.enabled,
+                slow_ms=new.query_trace.slow_ms,
+                top_n=new.query_trace.top_n
+            )
+
+    # Lag monitor threshold can change at runtime
+    if loop_monitor.monitor is not None:
+        loop_monitor.monitor.threshold_ms = new.loop_monitor.threshold_ms
+
+apply_settings(None, config)
+settings.on_reload(apply_settings)
+
 # Setup intents
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.messages = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+class StoreBot(commands.Bot):
+    """Bot with a service lifecycle tied to setup_hook and close"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lifecycle = lifecycle.LifecycleManager()
+
+    async def setup_hook(self):
+        # Dipanggil sekali setelah login, bukan di setiap reconnect
+        await self.lifecycle.start_all()
 
-def is_admin():
-    """Check if user is admin"""
-    async def predicate(ctx):
-        is_admin = ctx.author.id == ADMIN_ID
-        logger.info(f'Admin check for {ctx.author} (ID: {ctx.author.id}): {is_admin}')
-        return is_admin
-    return commands.check(predicate)
+    async def close(self):
+        await self.lifecycle.stop_all()
+        await super().close()
+
+bot = StoreBot(command_prefix='!', intents=intents)
 
 @bot.event
 async def on_ready():
     """Event when bot is ready"""
     logger.info(f'Bot {bot.user.name} is online!')
-    logger.info(f'Guild ID: {GUILD_ID}')
-    logger.info(f'Admin ID: {ADMIN_ID}')
+    report = getattr(bot, 'startup_report', None)
+    if report and report.ready_at is None:
+        report.mark_ready()
+        logger.info(f'Time to ready: {report.ready_ms:.0f} ms')
+    logger.info(f'Guild IDs: {settings.get().guild_ids()} (primary {settings.get().guild_id})')
+    logger.info(f'Admin ID: {settings.get().admin_id}')
     
     # Set custom status
     await bot.change_presence(
@@ -75,7 +103,9 @@ async def on_message(message):
     if message.author == bot.user:
         return
         
-    logger.info(f'Message from {message.author}: {message.content}')
+    message_logger.info(
+        f'Message from {message.author} in #{message.channel} ({len(message.content)} chars)'
+    )
     await bot.process_commands(message)
 
 @bot.event
@@ -90,31 +120,68 @@ async def on_command_error(ctx, error):
         await ctx.send(f"❌ An error occurred: {str(error)}")
 
 async def load_extensions():
-    """Load all extensions"""
-    # Load from ext folder
-    if os.path.exists('./ext'):
-        for filename in os.listdir('./ext'):
-            if filename.endswith('.py'):
-                try:
-                    await bot.load_extension(f'ext.{filename[:-3]}')
-                    logger.info(f'Loaded ext: {filename}')
-                except Exception as e:
-                    logger.error(f'Failed to load {filename}: {e}')
+    """Load all extensions listed in extensions.json"""
+    bot.startup_report = await extension_loader.load_from_manifest(bot)
 
 async def main():
     """Main function to run the bot"""
     try:
         # Initialize database
-        setup_database()
+        storage.get().setup(settings.get().guild_id)
+        catalog.refresh_all(settings.get().guild_ids())
+
+        # Start event-loop lag monitor
+        monitor_config = settings.get().loop_monitor
+        if monitor_config.enabled:
+            loop_monitor.start(
+                threshold_ms=monitor_config.threshold_ms,
+                debug=monitor_config.debug,
+                slow_callback_ms=monitor_config.slow_callback_ms
+            )
+
+        # Watch config.json for changes
+        asyncio.get_running_loop().create_task(settings.watch(), name='settings-watch')
         
+        # Audit log writer; registered first so it is flushed last
+        await bot.lifecycle.register(audit.AuditService(audit.audit_log))
+
+        # Purchase/donation log channels; flushed after the services that publish to it
+        await bot.lifecycle.register(log_channels.DigestService(bot, lambda: settings.get().log_digest))
+
+        # Cart holds; restored from storage before the buy buttons work
+        await bot.lifecycle.register(holds.HoldService())
+
+        # Resumes stock purges of deleted products
+        bot.stock_purge = stock_purge.StockPurgeService(lambda: settings.get().stock_purge)
+        await bot.lifecycle.register(bot.stock_purge)
+
+        # Rate-limited DMs for bulk grants
+        bot.delivery = grants.DeliveryService(lambda: settings.get().bulk_grant)
+        await bot.lifecycle.register(bot.delivery)
+
+        # Sales velocity and low-stock alerts; seeded from the hourly rollups
+        bot.forecast = forecast.ForecastService(bot, lambda: settings.get().forecast)
+        await bot.lifecycle.register(bot.forecast)
+
+        # Hot backups and maintenance only apply to the SQLite file
+        store = storage.get()
+        if isinstance(store, storage.SqliteStorage):
+            bot.backups = backup.BackupService(store.path, lambda: settings.get().backup)
+            await bot.lifecycle.register(bot.backups)
+            bot.maintenance = maintenance.MaintenanceService(store.path, lambda: settings.get().maintenance)
+            await bot.lifecycle.register(bot.maintenance)
+
         # Load extensions
         await load_extensions()
         
         # Start bot
-        await bot.start(TOKEN)
+        await bot.start(settings.get().token)
     except Exception as e:
         logger.error(f'Fatal error: {e}')
         raise
+    finally:
+        if not bot.is_closed():
+            await bot.close()
 
 if __name__ == '__main__':
     try:
@@ -122,4 +189,6 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         logger.info('Bot stopped by user')
     except Exception as e:
-        logger.error(f'Fatal error occurred: {e}')
\ No newline at end of file
+        logger.error(f'Fatal error occurred: {e}')
+    finally:
+        log_pipeline.stop_logging()
\ No newline at end of file
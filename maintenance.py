@@ -0,0 +1,266 @@
+"""
+Scheduled SQLite maintenance in low-traffic windows.
+
+A run does PRAGMA optimize, ANALYZE on tables whose row counts moved,
+incremental_vacuum and a truncating WAL checkpoint, and logs the space
+reclaimed plus before/after timings of the hot queries.
+
+Windows come from the purchase rate: TrafficProfile keeps a per-hour
+histogram seeded from transaction_log and fed by live purchases, and a
+run only starts in one of the quietest hours when the last few minutes
+were quiet too.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import statistics
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+from lifecycle import Service
+
+logger = logging.getLogger(__name__)
+
+# Tabel yang sering berubah; hanya ini yang di-ANALYZE
+CHURN_TABLES = ('product_stock', 'transaction_log', 'donation_queue', 'users')
+ANALYZE_CHANGE_RATIO = 0.1
+HISTORY_DAYS = 14
+RECENT_WINDOW = timedelta(minutes=15)
+TIMING_REPEAT = 30
+
+MaintenanceReport = namedtuple('MaintenanceReport', [
+    'started_at', 'duration', 'analyzed', 'vacuum_mode', 'reclaimed_bytes',
+    'size_before', 'size_after', 'timings_before', 'timings_after'
+])
+
+
+class TrafficProfile:
+    """Purchases per hour of day (UTC) plus a short window of recent purchases"""
+
+    def __init__(self):
+        self.hourly = [0] * 24
+        self.recent = deque()
+
+    def seed(self, counts_by_hour):
+        for hour, count in counts_by_hour.items():
+            self.hourly[int(hour)] += count
+
+    def record(self, when: datetime = None):
+        when = when or datetime.utcnow()
+        self.hourly[when.hour] += 1
+        self.recent.append(when)
+
+    def recent_count(self, now: datetime = None):
+        cutoff = (now or datetime.utcnow()) - RECENT_WINDOW
+        while self.recent and self.recent[0] < cutoff:
+            self.recent.popleft()
+        return len(self.recent)
+
+    def quiet_hours(self, count: int):
+        """The `count` hours with the fewest purchases"""
+        return set(sorted(range(24), key=lambda hour: (self.hourly[hour], hour))[:count])
+
+    def is_quiet(self, quiet_hours: int, max_recent: int, now: datetime = None):
+        now = now or datetime.utcnow()
+        return now.hour in self.quiet_hours(quiet_hours) and self.recent_count(now) <= max_recent
+
+
+traffic = TrafficProfile()
+
+
+def purchase_histogram(conn, days: int = HISTORY_DAYS):
+    """Purchases per hour of day from transaction_log"""
+    rows = conn.execute("""
+        SELECT strftime('%H', timestamp), COUNT(*)
+        FROM transaction_log
+        WHERE type = 'PURCHASE' AND timestamp >= datetime('now', ?)
+        GROUP BY 1
+    """, (f'-{days} days',)).fetchall()
+    return {int(hour): count for hour, count in rows if hour is not None}
+
+
+def _hot_queries(conn):
+    """The reads the bot issues most, with parameters taken from live data"""
+    stock = conn.execute("""
+        SELECT guild_id, product_code FROM product_stock
+        WHERE used = 0 GROUP BY guild_id, product_code ORDER BY COUNT(*) DESC LIMIT 1
+    """).fetchone() or (0, '')
+    user = conn.execute("SELECT guild_id, growid FROM users LIMIT 1").fetchone() or (0, '')
+    return {
+        'stock_counts': ("""
+            SELECT guild_id, product_code, COUNT(*) FROM product_stock
+            WHERE used = 0 GROUP BY guild_id, product_code
+        """, ()),
+        'stock_count': ("""
+            SELECT COUNT(*) FROM product_stock WHERE guild_id = ? AND product_code = ? AND used = 0
+        """, stock),
+        'claim_scan': ("""
+            SELECT id, content FROM product_stock
+            WHERE guild_id = ? AND product_code = ? AND used = 0 ORDER BY added_at, id LIMIT 10
+        """, stock),
+        'balance': ("""
+            SELECT balance_wl, balance_dl, balance_bgl FROM users WHERE guild_id = ? AND growid = ?
+        """, user),
+        'pending_donations': ("""
+            SELECT id FROM donation_queue WHERE processed_at IS NULL ORDER BY id LIMIT 100
+        """, ()),
+    }
+
+
+def time_queries(conn, queries, repeat: int = TIMING_REPEAT):
+    """Median latency in microseconds per query"""
+    timings = {}
+    for name, (sql, params) in queries.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            conn.execute(sql, params).fetchall()
+            samples.append(time.perf_counter_ns() - start)
+        timings[name] = statistics.median(samples) / 1000
+    return timings
+
+
+def _size(conn, db_path):
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    pages = conn.execute('PRAGMA page_count').fetchone()[0]
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    wal = os.path.getsize(db_path + '-wal') if os.path.exists(db_path + '-wal') else 0
+    return {'file': pages * page_size, 'free': free * page_size, 'wal': wal}
+
+
+def _row_counts(conn):
+    return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in CHURN_TABLES}
+
+
+def run_maintenance(db_path: str, vacuum_pages: int = 2000, last_counts: dict = None):
+    """Run one maintenance pass (blocking). Returns (report, row counts for the next run)."""
+    started_at = datetime.utcnow()
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        queries = _hot_queries(conn)
+        timings_before = time_queries(conn, queries)
+        size_before = _size(conn, db_path)
+
+        # ANALYZE hanya untuk tabel yang jumlah barisnya berubah signifikan
+        counts = _row_counts(conn)
+        analyzed = [
+            table for table in CHURN_TABLES
+            if last_counts is None
+            or abs(counts[table] - last_counts.get(table, 0)) > ANALYZE_CHANGE_RATIO * max(last_counts.get(table, 0), 1)
+        ]
+        for table in analyzed:
+            conn.execute(f'ANALYZE {table}')
+        conn.execute('PRAGMA optimize')
+
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            # execute() hanya menjalankan satu step (= satu halaman); executescript jalan sampai selesai
+            conn.executescript(f'PRAGMA incremental_vacuum({int(vacuum_pages)})')
+            vacuum_mode = 'incremental'
+        else:
+            # Sekali saja: DB lama dibuat tanpa auto_vacuum, konversi butuh VACUUM penuh
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+            vacuum_mode = 'full (converted to incremental)'
+
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+        size_after = _size(conn, db_path)
+        timings_after = time_queries(conn, queries)
+    finally:
+        conn.close()
+
+    reclaimed = (size_before['file'] + size_before['wal']) - (size_after['file'] + size_after['wal'])
+    report = MaintenanceReport(
+        started_at, time.perf_counter() - start, analyzed, vacuum_mode, reclaimed,
+        size_before, size_after, timings_before, timings_after
+    )
+    logger.info(format_report(report))
+    return report, counts
+
+
+def format_report(report: MaintenanceReport) -> str:
+    lines = [
+        f"Maintenance at {report.started_at:%Y-%m-%d %H:%M} UTC took {report.duration * 1000:.0f} ms, "
+        f"vacuum {report.vacuum_mode}, analyzed {', '.join(report.analyzed) or 'nothing'}",
+        f"reclaimed {report.reclaimed_bytes:,} bytes "
+        f"(file {report.size_before['file']:,} -> {report.size_after['file']:,}, "
+        f"wal {report.size_before['wal']:,} -> {report.size_after['wal']:,}, "
+        f"free {report.size_before['free']:,} -> {report.size_after['free']:,})",
+        f"{'query':<18} {'before us':>10} {'after us':>10}",
+    ]
+    for name, before in report.timings_before.items():
+        lines.append(f"{name:<18} {before:>10.1f} {report.timings_after[name]:>10.1f}")
+    return "\n".join(lines)
+
+
+class MaintenanceService(Service):
+    """
+    Checks every `check_minutes` whether maintenance is due (at least
+    `every_hours` since the last run) and the store is quiet.
+    `config` returns the current MaintenanceSettings.
+    """
+
+    name = 'maintenance'
+
+    def __init__(self, db_path: str, config, profile: TrafficProfile = traffic):
+        self.db_path = db_path
+        self.config = config
+        self.profile = profile
+        self.task = None
+        self.last = None
+        self.last_run = None
+        self._counts = None
+        self._lock = asyncio.Lock()
+
+    async def run_once(self):
+        async with self._lock:
+            self.last, self._counts = await asyncio.to_thread(
+                run_maintenance, self.db_path, self.config().vacuum_pages, self._counts
+            )
+            self.last_run = datetime.utcnow()
+            return self.last
+
+    def due(self, now: datetime = None):
+        config = self.config()
+        now = now or datetime.utcnow()
+        if not config.enabled:
+            return False
+        if self.last_run and now - self.last_run < timedelta(hours=config.every_hours):
+            return False
+        return self.profile.is_quiet(config.quiet_hours, config.max_recent_purchases, now)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.config().check_minutes * 60)
+            if not self.due():
+                continue
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f'Maintenance failed: {e}')
+
+    async def start(self):
+        def seed():
+            conn = sqlite3.connect(self.db_path)
+            try:
+                return purchase_histogram(conn)
+            finally:
+                conn.close()
+        self.profile.seed(await asyncio.to_thread(seed))
+        logger.info(f'Maintenance quiet hours (UTC): {sorted(self.profile.quiet_hours(self.config().quiet_hours))}')
+        self.task = asyncio.get_running_loop().create_task(self.run(), name='maintenance')
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        # Tunggu run yang sedang berjalan di thread
+        async with self._lock:
+            pass
+        return f'last run {self.last_run:%Y-%m-%d %H:%M}' if self.last_run else 'never ran'
@@ -0,0 +1,203 @@
+import re
+import sqlite3
+import logging
+import threading
+import time
+import heapq
+
+logger = logging.getLogger(__name__)
+
+# Default: tracing mati, aktifkan lewat configure()
+TRACE_ENABLED = False
+SLOW_QUERY_MS = 100
+TOP_N = 10
+MAX_FINGERPRINTS = 500
+PROGRESS_STEPS = 1000
+
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+# Di-trace sqlite3 di sekitar statement yang sebenarnya (transaksi implisit, trigger)
+_NOT_TRACED = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', '--')
+
+_string_re = re.compile(r"'(?:[^']|'')*'")
+_number_re = re.compile(r"\b\d+(?:\.\d+)?\b")
+_in_list_re = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_space_re = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """Normalize SQL so queries differing only in literals share one key"""
+    sql = _string_re.sub('?', sql)
+    sql = _number_re.sub('?', sql)
+    sql = _space_re.sub(' ', sql).strip()
+    sql = _in_list_re.sub('(?+)', sql)
+    return sql.rstrip(';').upper()
+
+
+class QueryStats:
+    """Aggregated timings for one query fingerprint"""
+
+    __slots__ = ('fingerprint', 'count', 'total_ms', 'max_ms', 'steps', 'sample')
+
+    def __init__(self, fp: str, sample: str):
+        self.fingerprint = fp
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.steps = 0
+        self.sample = sample
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class QueryTracer:
+    """Thread-safe rolling aggregate of statement timings"""
+
+    def __init__(self, max_fingerprints: int = MAX_FINGERPRINTS):
+        self.max_fingerprints = max_fingerprints
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, elapsed_ms: float, steps: int = 0):
+        fp = fingerprint(sql)
+        with self._lock:
+            stats = self._stats.get(fp)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    self._evict()
+                stats = self._stats[fp] = QueryStats(fp, sql)
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.steps += steps
+            if elapsed_ms > stats.max_ms:
+                stats.max_ms = elapsed_ms
+                stats.sample = sql
+
+    def _evict(self):
+        # Buang seperempat fingerprint yang paling jarang dipakai
+        drop = max(1, len(self._stats) // 4)
+        for stats in heapq.nsmallest(drop, self._stats.values(), key=lambda s: s.count):
+            del self._stats[stats.fingerprint]
+
+    def slowest(self, n: int = None):
+        n = TOP_N if n is None else n
+        with self._lock:
+            return heapq.nlargest(n, self._stats.values(), key=lambda s: s.max_ms)
+
+    def most_frequent(self, n: int = None):
+        n = TOP_N if n is None else n
+        with self._lock:
+            return heapq.nlargest(n, self._stats.values(), key=lambda s: s.count)
+
+    def most_expensive(self, n: int = None):
+        n = TOP_N if n is None else n
+        with self._lock:
+            return heapq.nlargest(n, self._stats.values(), key=lambda s: s.total_ms)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+tracer = QueryTracer()
+
+
+def configure(enabled: bool = True, slow_ms: float = None, top_n: int = None):
+    """Enable or disable statement tracing for new connections"""
+    global TRACE_ENABLED, SLOW_QUERY_MS, TOP_N
+    TRACE_ENABLED = enabled
+    if slow_ms is not None:
+        SLOW_QUERY_MS = slow_ms
+    if top_n is not None:
+        TOP_N = top_n
+    logger.info(f"Query tracing {'enabled' if enabled else 'disabled'} (slow >= {SLOW_QUERY_MS} ms)")
+
+
+def explain(conn: sqlite3.Connection, sql: str, params=()):
+    """Return EXPLAIN QUERY PLAN rows for a statement, or None if not explainable"""
+    if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    try:
+        cursor = sqlite3.Cursor(conn)
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        return [f"<explain failed: {e}>"]
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times each statement and reports it to the tracer"""
+
+    def _timed(self, method, sql, params, many=False):
+        conn = self.connection
+        conn._steps = 0
+        conn._expanded = None
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            steps = conn._steps * PROGRESS_STEPS
+            tracer.record(sql, elapsed_ms, steps)
+            if elapsed_ms >= SLOW_QUERY_MS:
+                # Diambil sebelum EXPLAIN, yang juga lewat trace callback
+                expanded = conn._expanded
+                plan = None if many else explain(conn, sql, params)
+                logger.warning(
+                    f"Slow query ({elapsed_ms:.1f} ms, ~{steps} VM steps): "
+                    f"{expanded or fingerprint(sql)}"
+                    + (f"\n  plan: {' | '.join(plan)}" if plan else "")
+                )
+
+    def execute(self, sql, params=()):
+        return self._timed(super().execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(super().executemany, sql, list(seq_of_params), many=True)
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose cursors feed the module-level tracer"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._steps = 0
+        self._expanded = None
+        self.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+        self.set_trace_callback(self._on_trace)
+
+    def _on_progress(self):
+        self._steps += 1
+        return 0
+
+    def _on_trace(self, statement):
+        # Simpan SQL yang sudah di-expand (dengan nilai parameter) untuk slow log;
+        # BEGIN implisit sebelum statement tulis dan sejenisnya dilewati
+        if not statement.lstrip().upper().startswith(_NOT_TRACED):
+            self._expanded = statement
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def format_table(rows, title: str) -> str:
+    """Render a list of QueryStats as a fixed-width text table"""
+    lines = [title, f"{'count':>7} {'avg ms':>8} {'max ms':>8} {'total ms':>10}  query"]
+    for stats in rows:
+        query = stats.fingerprint
+        if len(query) > 60:
+            query = query[:57] + '...'
+        lines.append(
+            f"{stats.count:>7} {stats.avg_ms:>8.2f} {stats.max_ms:>8.2f} "
+            f"{stats.total_ms:>10.1f}  {query}"
+        )
+    if not rows:
+        lines.append("  (no queries recorded)")
+    return "\n".join(lines)
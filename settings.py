@@ -0,0 +1,365 @@
+"""
+Typed bot settings, parsed once from config.json.
+
+Every key can be overridden from the environment with a STORE_ prefix,
+e.g. STORE_TOKEN or STORE_COOLDOWN_SECONDS. Nested keys use a double
+underscore: STORE_LOOP_MONITOR__THRESHOLD_MS=500.
+
+Code should call settings.get() at use time rather than copying values
+into module constants, so a reload reaches running cogs.
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field, fields, is_dataclass, replace
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = 'config.json'
+ENV_PREFIX = 'STORE_'
+WATCH_INTERVAL = 5.0
+
+
+class SettingsError(ValueError):
+    """Raised when config.json is missing, malformed or invalid"""
+
+
+@dataclass(frozen=True)
+class QueryTraceSettings:
+    enabled: bool = False
+    slow_ms: float = 100
+    top_n: int = 10
+
+
+@dataclass(frozen=True)
+class LoopMonitorSettings:
+    enabled: bool = True
+    threshold_ms: float = 250
+    debug: bool = False
+    slow_callback_ms: float = 100
+
+
+@dataclass(frozen=True)
+class StorageSettings:
+    backend: str = 'sqlite'
+    path: str = 'shop.db'
+    dsn: str = ''
+
+
+@dataclass(frozen=True)
+class BackupSettings:
+    enabled: bool = True
+    interval_hours: float = 6
+    directory: str = 'backups'
+    pages_per_step: int = 256
+    step_pause_ms: float = 10
+    keep_last: int = 4
+    keep_daily: int = 7
+    keep_weekly: int = 4
+
+
+@dataclass(frozen=True)
+class MaintenanceSettings:
+    enabled: bool = True
+    every_hours: float = 24
+    check_minutes: float = 10
+    # Jumlah jam paling sepi (UTC) yang boleh dipakai untuk maintenance
+    quiet_hours: int = 4
+    max_recent_purchases: int = 2
+    vacuum_pages: int = 2000
+
+
+@dataclass(frozen=True)
+class StockPurgeSettings:
+    batch_size: int = 500
+    pause_ms: float = 50
+    poll_seconds: float = 300
+
+
+@dataclass(frozen=True)
+class CheckoutSettings:
+    # Dua langkah: stok di-hold selama hold_seconds sampai pembeli konfirmasi
+    enabled: bool = True
+    hold_seconds: float = 120
+    # Umur idempotency key pembelian sebelum dihapus
+    key_ttl_hours: float = 24
+
+
+@dataclass(frozen=True)
+class BulkGrantSettings:
+    max_rows: int = 1000
+    # DM keluar dibatasi supaya tidak kena rate limit Discord
+    dm_per_second: float = 1.0
+    dm_burst: int = 5
+    dm_retries: int = 3
+
+
+@dataclass(frozen=True)
+class ForecastSettings:
+    enabled: bool = True
+    # Half-life EWMA kecepatan penjualan
+    half_life_hours: float = 6
+    # Alert saat perkiraan habis <= alert_hours; aktif lagi setelah >= clear_hours
+    alert_hours: float = 24
+    clear_hours: float = 48
+    # Produk yang terjual lebih lambat dari ini tidak memicu alert
+    min_per_day: float = 1
+    check_seconds: float = 60
+
+
+@dataclass(frozen=True)
+class LogDigestSettings:
+    # Digest dikirim saat max_lines event terkumpul atau event tertua berumur flush_seconds
+    flush_seconds: float = 60
+    max_lines: int = 20
+    # Transaksi >= high_value_wl diposting sendiri sebagai embed; 0 = tidak pernah
+    high_value_wl: int = 10000
+    min_interval_seconds: float = 2
+    max_buffer: int = 5000
+
+
+@dataclass(frozen=True)
+class GuildSettings:
+    """Channels for one community server"""
+    guild_id: int
+    id_live_stock: int
+    id_log_purch: int = 0
+    id_donation_log: int = 0
+    id_history_buy: int = 0
+
+
+@dataclass(frozen=True)
+class Settings:
+    token: str
+    guild_id: int
+    admin_id: int
+    id_live_stock: int
+    id_log_purch: int
+    id_donation_log: int
+    id_history_buy: int = 0
+    donation_port: int = 8081
+    donation_mode: str = 'inprocess'
+    cooldown_seconds: float = 3
+    live_stock_interval: float = 60
+    query_trace: QueryTraceSettings = field(default_factory=QueryTraceSettings)
+    loop_monitor: LoopMonitorSettings = field(default_factory=LoopMonitorSettings)
+    log_rate_limits: dict = field(default_factory=dict)
+    storage: StorageSettings = field(default_factory=StorageSettings)
+    backup: BackupSettings = field(default_factory=BackupSettings)
+    maintenance: MaintenanceSettings = field(default_factory=MaintenanceSettings)
+    stock_purge: StockPurgeSettings = field(default_factory=StockPurgeSettings)
+    checkout: CheckoutSettings = field(default_factory=CheckoutSettings)
+    bulk_grant: BulkGrantSettings = field(default_factory=BulkGrantSettings)
+    forecast: ForecastSettings = field(default_factory=ForecastSettings)
+    log_digest: LogDigestSettings = field(default_factory=LogDigestSettings)
+    # guild_id -> GuildSettings; guild_id di atas adalah guild utama
+    guilds: dict = field(default_factory=dict)
+
+    # Field yang tidak bisa diubah tanpa restart
+    RESTART_REQUIRED = ('token', 'guild_id', 'storage')
+
+    def guild(self, guild_id=None):
+        """GuildSettings for a configured guild (primary if omitted), else None"""
+        if guild_id is None:
+            guild_id = self.guild_id
+        return self.guilds.get(int(guild_id))
+
+    def guild_ids(self):
+        return tuple(self.guilds)
+
+
+def _coerce(name, value, target):
+    """Convert a raw JSON/env value to the annotated type"""
+    try:
+        if target is bool:
+            if isinstance(value, str):
+                return value.strip().lower() in ('1', 'true', 'yes', 'on')
+            return bool(value)
+        if target is dict:
+            if isinstance(value, str):
+                value = json.loads(value)
+            if not isinstance(value, dict):
+                raise TypeError('expected an object')
+            return value
+        return target(value)
+    except (TypeError, ValueError) as e:
+        raise SettingsError(f"Invalid value for '{name}': {value!r} ({e})")
+
+
+def _build(cls, raw: dict, env_prefix: str, path: str = ''):
+    kwargs = {}
+    for f in fields(cls):
+        key = f"{path}{f.name}"
+        env_key = f"{env_prefix}{f.name.upper()}"
+        target = f.type
+
+        if is_dataclass(target):
+            kwargs[f.name] = _build(target, raw.get(f.name, {}) or {}, env_key + '__', key + '.')
+            continue
+
+        if env_key in os.environ:
+            value = os.environ[env_key]
+        elif f.name in raw:
+            value = raw[f.name]
+        else:
+            continue  # pakai default, atau error di bawah jika wajib
+        kwargs[f.name] = _coerce(key, value, target)
+
+    try:
+        return cls(**kwargs)
+    except TypeError as e:
+        raise SettingsError(f"Missing required configuration key: {e}")
+
+
+def _validate(settings: Settings):
+    if not settings.token:
+        raise SettingsError("'token' must not be empty")
+    if not 0 < settings.donation_port < 65536:
+        raise SettingsError(f"'donation_port' out of range: {settings.donation_port}")
+    if settings.donation_mode not in ('inprocess', 'external'):
+        raise SettingsError("'donation_mode' must be 'inprocess' or 'external'")
+    if settings.cooldown_seconds < 0:
+        raise SettingsError("'cooldown_seconds' must not be negative")
+    if settings.live_stock_interval < 5:
+        raise SettingsError("'live_stock_interval' must be at least 5 seconds")
+    if settings.storage.backend not in ('sqlite', 'memory', 'postgres'):
+        raise SettingsError("'storage.backend' must be 'sqlite', 'memory' or 'postgres'")
+    if settings.backup.interval_hours <= 0 or settings.backup.pages_per_step == 0:
+        raise SettingsError("'backup.interval_hours' and 'backup.pages_per_step' must be positive")
+    if not 1 <= settings.maintenance.quiet_hours <= 24:
+        raise SettingsError("'maintenance.quiet_hours' must be between 1 and 24")
+    if settings.maintenance.every_hours <= 0 or settings.maintenance.check_minutes <= 0:
+        raise SettingsError("'maintenance.every_hours' and 'maintenance.check_minutes' must be positive")
+    if settings.stock_purge.batch_size <= 0 or settings.stock_purge.poll_seconds <= 0:
+        raise SettingsError("'stock_purge.batch_size' and 'stock_purge.poll_seconds' must be positive")
+    if not 10 <= settings.checkout.hold_seconds <= 900:
+        raise SettingsError("'checkout.hold_seconds' must be between 10 and 900")
+    if settings.checkout.key_ttl_hours <= 0:
+        raise SettingsError("'checkout.key_ttl_hours' must be positive")
+    if settings.bulk_grant.max_rows <= 0 or settings.bulk_grant.dm_per_second <= 0:
+        raise SettingsError("'bulk_grant.max_rows' and 'bulk_grant.dm_per_second' must be positive")
+    if settings.bulk_grant.dm_burst < 1 or settings.bulk_grant.dm_retries < 0:
+        raise SettingsError("'bulk_grant.dm_burst' must be at least 1 and 'bulk_grant.dm_retries' not negative")
+    if settings.forecast.half_life_hours <= 0 or settings.forecast.check_seconds <= 0:
+        raise SettingsError("'forecast.half_life_hours' and 'forecast.check_seconds' must be positive")
+    if not 0 < settings.forecast.alert_hours < settings.forecast.clear_hours:
+        raise SettingsError("'forecast.alert_hours' must be positive and below 'forecast.clear_hours'")
+    if settings.log_digest.flush_seconds <= 0 or settings.log_digest.max_lines <= 0:
+        raise SettingsError("'log_digest.flush_seconds' and 'log_digest.max_lines' must be positive")
+    if settings.log_digest.max_buffer < settings.log_digest.max_lines:
+        raise SettingsError("'log_digest.max_buffer' must be at least 'log_digest.max_lines'")
+    return settings
+
+
+def parse(path: str = CONFIG_FILE) -> Settings:
+    """Read, override from environment, and validate"""
+    try:
+        with open(path, 'r') as config_file:
+            raw = json.load(config_file)
+    except FileNotFoundError:
+        raise SettingsError(f"{path} file not found!")
+    except json.JSONDecodeError as e:
+        raise SettingsError(f"{path} is not valid JSON: {e}")
+    settings = _build(Settings, raw, ENV_PREFIX)
+
+    # Guild utama dari key top-level, guild tambahan dari "guilds"
+    guilds = {
+        settings.guild_id: GuildSettings(
+            settings.guild_id,
+            settings.id_live_stock,
+            settings.id_log_purch,
+            settings.id_donation_log,
+            settings.id_history_buy
+        )
+    }
+    for key, entry in settings.guilds.items():
+        if not isinstance(entry, dict):
+            raise SettingsError(f"Invalid value for 'guilds.{key}': expected an object")
+        guild = _build(GuildSettings, {**entry, 'guild_id': key}, f"{ENV_PREFIX}GUILDS__{key}__", f"guilds.{key}.")
+        guilds[guild.guild_id] = guild
+    return _validate(replace(settings, guilds=guilds))
+
+
+_current = None
+_mtime = None
+_listeners = []
+
+
+def load(path: str = CONFIG_FILE) -> Settings:
+    """Parse settings once at startup"""
+    global _current, _mtime
+    _current = parse(path)
+    _mtime = os.path.getmtime(path)
+    return _current
+
+
+def get() -> Settings:
+    """Current settings snapshot (immutable)"""
+    if _current is None:
+        return load()
+    return _current
+
+
+def on_reload(callback):
+    """Register callback(old, new) to run after a successful reload"""
+    if callback not in _listeners:
+        _listeners.append(callback)
+    return callback
+
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def changed_fields(old: Settings, new: Settings):
+    return [f.name for f in fields(Settings) if getattr(old, f.name) != getattr(new, f.name)]
+
+
+def reload(path: str = CONFIG_FILE):
+    """
+    Re-read config.json and push the new values to listeners.
+
+    Returns the list of changed top-level fields. On a parse or
+    validation error the old settings stay in place.
+    """
+    global _current, _mtime
+    new = parse(path)
+    old = get()
+    _mtime = os.path.getmtime(path)
+    changed = changed_fields(old, new)
+    if not changed:
+        return []
+
+    pinned = [name for name in changed if name in Settings.RESTART_REQUIRED]
+    if pinned:
+        logger.warning(f"Settings {', '.join(pinned)} changed but need a restart; keeping old values")
+        new = replace(new, **{name: getattr(old, name) for name in pinned})
+        changed = [name for name in changed if name not in pinned]
+
+    _current = new
+    logger.info(f"Settings reloaded, changed: {', '.join(changed) or 'nothing'}")
+    for callback in list(_listeners):
+        try:
+            callback(old, new)
+        except Exception as e:
+            logger.error(f"Error in settings reload listener {callback!r}: {e}")
+    return changed
+
+
+async def watch(path: str = CONFIG_FILE, interval: float = WATCH_INTERVAL):
+    """Poll config.json and reload when its mtime changes"""
+    global _mtime
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime != _mtime:
+                # Catat dulu supaya file yang invalid tidak dicoba terus-menerus
+                _mtime = mtime
+                reload(path)
+        except SettingsError as e:
+            logger.error(f"Config reload rejected: {e}")
+        except OSError as e:
+            logger.error(f"Cannot stat {path}: {e}")
@@ -0,0 +1,95 @@
+"""
+Background purge of stock rows left behind by deleteProduct.
+
+delete_product only removes the catalog row and queues a job in
+product_purge; this service deletes the stock in small batches, each in
+its own short transaction, so purchases are never stuck behind one huge
+DELETE. Jobs live in the database, so an interrupted purge resumes on
+the next start.
+"""
+import asyncio
+import logging
+import time
+import storage
+from lifecycle import Service
+
+logger = logging.getLogger(__name__)
+
+# Log progress paling sering sekali per interval ini
+PROGRESS_LOG_SECONDS = 30
+
+
+class StockPurgeService(Service):
+    """
+    Drains pending purge jobs oldest first. `config` returns the current
+    StockPurgeSettings; wake() starts work right after a delete instead
+    of waiting for the next poll.
+    """
+
+    name = 'stock-purge'
+
+    def __init__(self, config):
+        self.config = config
+        self.task = None
+        self.current = None
+        self.interrupted = None     # job yang terhenti karena stop(), untuk laporan shutdown
+        self._wake = asyncio.Event()
+        self._stopping = False
+
+    def wake(self):
+        self._wake.set()
+
+    async def purge(self, job):
+        """Run one job to completion, yielding to the event loop between batches"""
+        store = storage.get()
+        self.current = job
+        last_log = time.monotonic()
+        logger.info(f'Purging stock of deleted product {job.code} (guild {job.guild_id}, job #{job.id})')
+        while not self._stopping:
+            config = self.config()
+            job = await asyncio.to_thread(store.purge_step, job.id, config.batch_size)
+            self.current = job
+            if job is None or job.finished_at:
+                break
+            if time.monotonic() - last_log >= PROGRESS_LOG_SECONDS:
+                last_log = time.monotonic()
+                logger.info(f'Purge #{job.id} {job.code}: {job.rows_purged:,}/{job.rows_total:,} rows')
+            await asyncio.sleep(config.pause_ms / 1000)
+        self.current = None
+        if job and not job.finished_at and self._stopping:
+            self.interrupted = job
+        if job and job.finished_at:
+            logger.info(f'Purge #{job.id} {job.code} finished: {job.rows_purged:,} rows deleted')
+        return job
+
+    async def run(self):
+        while not self._stopping:
+            try:
+                jobs = await asyncio.to_thread(storage.get().purge_jobs)
+                for job in jobs:
+                    if self._stopping:
+                        break
+                    await self.purge(job)
+            except Exception as e:
+                logger.error(f'Stock purge failed: {e}')
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.config().poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        self._stopping = False
+        self.interrupted = None
+        self.task = asyncio.get_running_loop().create_task(self.run(), name='stock-purge')
+
+    async def stop(self):
+        # Batch yang sedang berjalan diselesaikan; sisanya dilanjutkan saat start berikutnya
+        self._stopping = True
+        self._wake.set()
+        if self.task:
+            await self.task
+            self.task = None
+        if self.interrupted:
+            return f'paused purge #{self.interrupted.id} at {self.interrupted.rows_purged:,} rows'
+        return 'idle'
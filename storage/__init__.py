@@ -0,0 +1,53 @@
+"""
+Persistence for the store behind one interface.
+
+Cogs call storage.get() and use the Storage methods; they never see
+SQL. The backend is chosen by the "storage" block in config.json:
+
+    "storage": {"backend": "sqlite", "path": "shop.db"}
+
+Backends: sqlite (default), memory, postgres (optional, needs psycopg).
+"""
+import logging
+from .base import (
+    Storage, StorageError, InsufficientBalance, InsufficientStock, UnknownProduct, ProductExists, ProductPurging,
+    NotRefundable, Balance, Product, WorldInfo, StockItem, StockStats, CreditedDonation, PurgeJob, Hold,
+    PurchaseKey, Refund, SalesBucket, Order, ROLLUP_PERIODS, total_wl, purchase_details
+)
+from .memory import MemoryStorage
+from .sqlite import SqliteStorage
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('sqlite', 'memory', 'postgres')
+
+_backend = None
+
+
+def create(config) -> Storage:
+    """Build the backend described by a StorageSettings"""
+    if config.backend == 'sqlite':
+        return SqliteStorage(config.path)
+    if config.backend == 'memory':
+        logger.warning('Using in-memory storage; nothing will be persisted')
+        return MemoryStorage()
+    if config.backend == 'postgres':
+        from .postgres import PostgresStorage
+        return PostgresStorage(config.dsn)
+    raise StorageError(f"Unknown storage backend '{config.backend}'. Use one of: {', '.join(BACKENDS)}")
+
+
+def use(backend: Storage) -> Storage:
+    """Install the process-wide backend"""
+    global _backend
+    _backend = backend
+    logger.info(f'Storage backend: {backend.name}')
+    return backend
+
+
+def get() -> Storage:
+    """Current backend; built from settings on first use"""
+    if _backend is None:
+        import settings
+        use(create(settings.get().storage))
+    return _backend
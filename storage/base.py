@@ -0,0 +1,380 @@
+"""
+Storage interface the cogs depend on.
+
+Methods are synchronous and each one is its own transaction. Handlers
+call them directly for single-row work, as they always called sqlite3;
+batch work (donation crediting, bulk imports) goes through
+asyncio.to_thread.
+"""
+import re
+from collections import namedtuple
+from datetime import datetime, timezone
+
+Balance = namedtuple('Balance', ['wl', 'dl', 'bgl'])
+Product = namedtuple('Product', ['code', 'name', 'price', 'description'])
+WorldInfo = namedtuple('WorldInfo', ['world', 'owner', 'bot'])
+StockItem = namedtuple('StockItem', ['id', 'content'])
+StockStats = namedtuple('StockStats', ['available', 'used', 'total', 'last_added', 'last_used'])
+CreditedDonation = namedtuple('CreditedDonation', [
+    'queue_id', 'guild_id', 'growid', 'wl', 'dl', 'bgl', 'total_wl', 'raw', 'received_at', 'balance'
+])
+Refund = namedtuple('Refund', ['entry_id', 'refund_id', 'guild_id', 'growid', 'credited', 'items', 'balance'])
+PurchaseKey = namedtuple('PurchaseKey', ['key', 'guild_id', 'user_id', 'result', 'created_at'])
+Order = namedtuple('Order', ['id', 'amount', 'details', 'timestamp', 'refunded_by'])
+# bucket: awal jam/hari dalam detik epoch UTC; key: kode produk atau GrowID
+SalesBucket = namedtuple('SalesBucket', ['bucket', 'key', 'orders', 'items', 'revenue'])
+# expires_at dalam detik epoch (time.time()) agar tetap berlaku setelah restart
+Hold = namedtuple('Hold', ['id', 'guild_id', 'user_id', 'code', 'quantity', 'expires_at'])
+PurgeJob = namedtuple('PurgeJob', [
+    'id', 'guild_id', 'code', 'requested_by', 'requested_at', 'rows_total', 'rows_purged', 'finished_at'
+])
+
+EMPTY_BALANCE = Balance(0, 0, 0)
+
+# Rollup penjualan: panjang bucket per periode, dan dimensi yang dihitung
+ROLLUP_PERIODS = {'hour': 3600, 'day': 86400}
+ROLLUP_DIMENSIONS = ('product', 'buyer')
+
+PURCHASE_DETAILS = re.compile(r'^Purchased (\d+)x .* \(([^()]+)\)$')
+BALANCE_TEXT = re.compile(r'^WL: (-?\d+), DL: (-?\d+), BGL: (-?\d+)$')
+# Entri lama menyimpan teks tampilan format_balance dari ext/trx.py
+LEGACY_BALANCE_TEXT = re.compile(r'^• (-?[\d,]+) WL\n• (-?[\d,]+) DL .*\n• (-?[\d,]+) BGL ')
+
+
+class StorageError(Exception):
+    """Base class for storage failures the cogs can report to users"""
+
+
+class InsufficientBalance(StorageError, ValueError):
+    def __init__(self, growid):
+        super().__init__(f"Insufficient balance for {growid}")
+        self.growid = growid
+
+
+class InsufficientStock(StorageError):
+    def __init__(self, code, available):
+        super().__init__(f"Not enough stock for {code}: only {available} available")
+        self.code = code
+        self.available = available
+
+
+class UnknownProduct(StorageError):
+    def __init__(self, code):
+        super().__init__(f"Product with code {code} does not exist")
+        self.code = code
+
+
+class ProductExists(StorageError):
+    def __init__(self, code):
+        super().__init__(f"Product with code {code} already exists")
+        self.code = code
+
+
+class ProductPurging(StorageError):
+    """The code belongs to a deleted product whose stock is still being purged"""
+    def __init__(self, code):
+        super().__init__(f"Stock of deleted product {code} is still being purged; try again later")
+        self.code = code
+
+
+class NotRefundable(StorageError):
+    def __init__(self, entry_id, reason):
+        super().__init__(f"Transaction #{entry_id} cannot be refunded: {reason}")
+        self.entry_id = entry_id
+        self.reason = reason
+
+
+def total_wl(wl, dl, bgl):
+    return wl + dl * 100 + bgl * 10000
+
+
+def describe_balance(balance):
+    """Balance text as stored in transaction_log.old_balance/new_balance"""
+    return f"WL: {balance[0]}, DL: {balance[1]}, BGL: {balance[2]}"
+
+
+def parse_balance(text):
+    """Inverse of describe_balance, also reading the older display format; None if neither matches"""
+    match = BALANCE_TEXT.match(text or '') or LEGACY_BALANCE_TEXT.match(text or '')
+    if not match:
+        return None
+    return Balance(*(int(value.replace(',', '')) for value in match.groups()))
+
+
+def refund_credit(entry_id, old_balance, new_balance, amount):
+    """
+    What a refund of a PURCHASE entry credits back: the exact WL/DL/BGL
+    taken, or the ledger amount as WL when the balance text is unreadable.
+    """
+    old, new = parse_balance(old_balance), parse_balance(new_balance)
+    if old and new:
+        return Balance(old.wl - new.wl, old.dl - new.dl, old.bgl - new.bgl)
+    if amount is not None and amount < 0:
+        return Balance(-amount, 0, 0)
+    raise NotRefundable(entry_id, 'the amount charged cannot be read from the ledger')
+
+
+def purchase_details(quantity, name, code):
+    """Ledger details text of a PURCHASE entry"""
+    return f"Purchased {quantity}x {name} ({code})"
+
+
+def parse_purchase_details(details):
+    """(quantity, code) from purchase_details text, or None for other formats"""
+    match = PURCHASE_DETAILS.match(details or '')
+    return (int(match.group(1)), match.group(2)) if match else None
+
+
+def epoch(value):
+    """Seconds since the epoch for a ledger timestamp (UTC text or datetime)"""
+    if isinstance(value, str):
+        value = datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S')
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def rollup_keys(code, growid, at):
+    """(dimension, period, bucket, key) of every rollup row one purchase at `at` counts toward"""
+    for period, seconds in ROLLUP_PERIODS.items():
+        bucket = int(at // seconds * seconds)
+        yield 'product', period, bucket, code
+        yield 'buyer', period, bucket, growid
+
+
+class Storage:
+    """
+    Everything the store persists, partitioned by guild.
+
+    Implementations: SqliteStorage (default), MemoryStorage (benchmarks
+    and throwaway runs) and PostgresStorage (optional, needs psycopg).
+    """
+
+    name = 'storage'
+
+    def setup(self, default_guild_id: int = 0):
+        """Create or migrate the schema; existing single-guild data goes to default_guild_id"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    # Users and GrowIDs
+
+    def get_growid(self, guild_id: int, user_id: int):
+        """GrowID registered by a Discord user, or None"""
+        raise NotImplementedError
+
+    def set_growid(self, guild_id: int, user_id: int, growid: str):
+        """Register a GrowID, taking it over if another user had it"""
+        raise NotImplementedError
+
+    def get_balance(self, guild_id: int, growid: str) -> Balance:
+        """Balance of a GrowID; unknown accounts have an empty balance"""
+        raise NotImplementedError
+
+    # Ledger
+
+    def change_balance(self, guild_id: int, growid: str, wl: int, dl: int, bgl: int,
+                       transaction_type: str, details: str) -> Balance:
+        """Apply a delta and log it; raises InsufficientBalance if any currency goes negative"""
+        raise NotImplementedError
+
+    def set_balance(self, guild_id: int, growid: str, wl: int, dl: int, bgl: int,
+                    transaction_type: str, details: str):
+        """Overwrite a balance and log it; returns (old, new)"""
+        raise NotImplementedError
+
+    # Catalog
+
+    def catalog_guilds(self):
+        """Guilds that have products or world info"""
+        raise NotImplementedError
+
+    def list_products(self, guild_id: int):
+        raise NotImplementedError
+
+    def get_product(self, guild_id: int, code: str):
+        raise NotImplementedError
+
+    def add_product(self, guild_id: int, code: str, name: str, price: int, description: str = ''):
+        """Raises ProductExists if the code is taken"""
+        raise NotImplementedError
+
+    def update_product(self, guild_id: int, code: str, **changes):
+        """Change name, price or description; returns the old Product or None"""
+        raise NotImplementedError
+
+    def delete_product(self, guild_id: int, code: str, requested_by: str = None):
+        """
+        Remove a product from the catalog right away and queue a purge
+        job for its stock rows; returns the deleted Product or None.
+        add_product raises ProductPurging for the code until the job is done.
+        """
+        raise NotImplementedError
+
+    def purge_jobs(self, include_finished: bool = False):
+        """Stock purge jobs, oldest first"""
+        raise NotImplementedError
+
+    def purge_step(self, job_id: int, batch_size: int) -> PurgeJob:
+        """Delete up to batch_size stock rows of a purge job in one short transaction"""
+        raise NotImplementedError
+
+    def get_world(self, guild_id: int):
+        raise NotImplementedError
+
+    def set_world(self, guild_id: int, world: str, owner: str, bot: str):
+        """Returns the previous WorldInfo or None"""
+        raise NotImplementedError
+
+    # Stock compression (storage/compression.py)
+
+    def set_compression(self, guild_id: int, code: str, enabled: bool) -> bool:
+        """Compress stock added from now on; returns the previous setting. Raises UnknownProduct"""
+        raise NotImplementedError
+
+    def train_dictionary(self, guild_id: int, code: str, samples=None):
+        """
+        Store a new compression dictionary for the product, built from
+        `samples` or its most recent plain-text rows; later stock uses it.
+        Returns the dictionary id, or None without samples.
+        """
+        raise NotImplementedError
+
+    # Stock
+
+    def add_stock(self, guild_id: int, code: str, contents, added_by: str, source_file: str = None) -> int:
+        """Insert stock lines; raises UnknownProduct"""
+        raise NotImplementedError
+
+    def stock_count(self, guild_id: int, code: str) -> int:
+        raise NotImplementedError
+
+    def stock_counts(self):
+        """Available stock for every guild: {guild_id: {code: count}}"""
+        raise NotImplementedError
+
+    def stock_stats(self, guild_id: int, code: str) -> StockStats:
+        raise NotImplementedError
+
+    def claim_stock(self, guild_id: int, code: str, quantity: int, used_by: str, reserved: int = 0):
+        """
+        Mark `quantity` items used, all or nothing; raises InsufficientStock
+        or UnknownProduct. `reserved` items are held for other buyers and
+        must stay available after the claim.
+        """
+        raise NotImplementedError
+
+    def claim_batch(self, guild_id: int, orders, reserved=None):
+        """
+        Claim several orders of (code, quantity, used_by) in one
+        transaction, all or nothing. `reserved` maps code -> held count.
+        Returns one list of StockItem per order, in order.
+        """
+        raise NotImplementedError
+
+    def return_stock(self, guild_id: int, item_ids) -> int:
+        """Put claimed (not voided) items back in the queue; returns how many were returned"""
+        raise NotImplementedError
+
+    def purchase(self, guild_id: int, growid: str, code: str, quantity: int, delta: Balance,
+                 used_by: str, details: str, reserved: int = 0):
+        """Claim stock and debit the buyer in one transaction; returns (items, new balance)"""
+        raise NotImplementedError
+
+    # Order history
+
+    def purchase_history(self, guild_id: int, growid: str, before_id: int = None, limit: int = 10):
+        """
+        A user's PURCHASE entries as Order, newest first, with id below
+        `before_id` (keyset pagination: pass the last id of the previous
+        page). refunded_by is the REFUND entry id, if any.
+        """
+        raise NotImplementedError
+
+    def order_items(self, guild_id: int, growid: str, entry_id: int):
+        """Items delivered by one of the user's purchases (refunded ones excluded); [] if not theirs"""
+        raise NotImplementedError
+
+    # Sales rollups
+
+    def sales_rollup(self, guild_id: int, dimension: str, period: str, since: float):
+        """
+        SalesBucket rows of one dimension ('product' or 'buyer') and
+        period ('hour' or 'day') from `since` (epoch seconds) on, oldest
+        first. Purchases update the rollups in their own transaction and
+        refunds subtract from the original purchase's buckets, so this
+        never reads transaction_log.
+        """
+        raise NotImplementedError
+
+    def rebuild_rollups(self, guild_id: int = None) -> int:
+        """Recompute the rollups from unrefunded PURCHASE entries; returns how many were counted"""
+        raise NotImplementedError
+
+    # Refunds
+
+    def purchase_entries_for_file(self, guild_id: int, source_file: str):
+        """
+        Ledger ids of purchases that received at least one item from
+        `source_file`. Items sold before purchase_id was recorded are not
+        linked to their purchase and are not found.
+        """
+        raise NotImplementedError
+
+    def refund_orders(self, guild_id: int, entry_ids, restock: bool, refunded_by: str):
+        """
+        Reverse PURCHASE ledger entries in one transaction: re-credit what
+        was taken (see refund_credit), and return the order's items to
+        stock (restock=True) or void them (used = 2, never sold again).
+        Each REFUND entry points at its original through `reverses`. Raises
+        NotRefundable and refunds nothing if any entry is unknown, not a
+        purchase, already refunded, or has no readable charge. Returns a
+        list of Refund.
+        """
+        raise NotImplementedError
+
+    # Purchase idempotency
+
+    def reserve_purchase_key(self, key: str, guild_id: int, user_id: int):
+        """
+        Record `key` as in progress. Returns None if it is new, else the
+        existing PurchaseKey (result None while the first run is still going).
+        """
+        raise NotImplementedError
+
+    def complete_purchase_key(self, key: str, result: str):
+        raise NotImplementedError
+
+    def release_purchase_key(self, key: str):
+        """Forget an in-progress key whose purchase never finished, so a retry can run"""
+        raise NotImplementedError
+
+    def expire_purchase_keys(self, older_than: float) -> int:
+        """Delete keys created before the epoch time `older_than`; returns the count"""
+        raise NotImplementedError
+
+    # Cart holds (holds.py keeps them in memory; this is the shadow copy)
+
+    def load_holds(self):
+        """Every persisted Hold, expired or not"""
+        raise NotImplementedError
+
+    def sync_holds(self, upserts, deleted_ids):
+        """Write a batch of new or changed holds and drop released ones, in one transaction"""
+        raise NotImplementedError
+
+    # Donations
+
+    def enqueue_donation(self, guild_id: int, growid: str, wl: int, dl: int, bgl: int, raw: str = None) -> int:
+        """Durably queue an accepted deposit; returns its queue id"""
+        raise NotImplementedError
+
+    def credit_queued_donations(self, limit: int = 100):
+        """
+        Credit up to `limit` pending donations in one transaction and
+        return them as CreditedDonation. A row is marked processed in
+        the same transaction that credits it, so nothing is credited twice.
+        """
+        raise NotImplementedError
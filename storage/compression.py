@@ -0,0 +1,72 @@
+"""
+Optional compression of product_stock payloads.
+
+Stock lines are short and similar (account:password|level|...), so
+compressing each row on its own gains little; a preset dictionary built
+from the product's own lines gives deflate the shared substrings up
+front. Rows keep the dictionary id they were written with, so a product
+can be retrained without touching old rows.
+
+Only stdlib zlib is used: raw deflate (no header or checksum) with the
+per-product dictionary as zdict.
+"""
+import zlib
+
+# zlib hanya memakai 32 KiB terakhir dari zdict
+DICTIONARY_SIZE = 8 * 1024
+SAMPLE_LINES = 2000
+LEVEL = 9
+WBITS = -15
+
+
+def train_dictionary(samples, size: int = DICTIONARY_SIZE) -> bytes:
+    """
+    Build a preset dictionary from sample lines.
+
+    Substrings that recur across lines (domains, field labels, fixed
+    prefixes) go last, where deflate reaches them with the shortest
+    distances; the remaining space is filled with whole sample lines.
+    """
+    lines = [line.encode('utf-8') for line in samples[:SAMPLE_LINES] if line]
+    if not lines:
+        return b''
+
+    # Hitung token yang sering muncul, dipisah oleh karakter pemisah umum
+    counts = {}
+    for line in lines:
+        token = bytearray()
+        for byte in line + b'\n':
+            token.append(byte)
+            if byte in b':|@/ ,;=\n' and len(token) > 2:
+                key = bytes(token)
+                counts[key] = counts.get(key, 0) + 1
+                token = bytearray()
+    common = [token for token, count in sorted(counts.items(), key=lambda item: item[1]) if count > 1]
+    tail = b''.join(common)[-size // 2:]
+
+    head = bytearray()
+    step = max(1, len(lines) // 256)
+    for line in lines[::step]:
+        if len(head) + len(line) + 1 > size - len(tail):
+            break
+        head += line + b'\n'
+    return bytes(head) + tail
+
+
+def compress(text: str, zdict: bytes) -> bytes:
+    compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, WBITS, zdict=zdict) if zdict else \
+        zlib.compressobj(LEVEL, zlib.DEFLATED, WBITS)
+    return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+
+def decompress(blob: bytes, zdict: bytes) -> str:
+    decompressor = zlib.decompressobj(WBITS, zdict=zdict) if zdict else zlib.decompressobj(WBITS)
+    return (decompressor.decompress(bytes(blob)) + decompressor.flush()).decode('utf-8')
+
+
+def encode(text: str, zdict: bytes):
+    """(content, content_z) for one row; rows that would not shrink stay plain text"""
+    blob = compress(text, zdict)
+    if len(blob) < len(text.encode('utf-8')):
+        return '', blob
+    return text, None
@@ -0,0 +1,520 @@
+import bisect
+import threading
+import time
+from datetime import datetime
+from .base import (
+    Storage, Balance, Product, WorldInfo, StockItem, StockStats, CreditedDonation, EMPTY_BALANCE,
+    InsufficientBalance, InsufficientStock, UnknownProduct, ProductExists, ProductPurging, NotRefundable,
+    PurgeJob, PurchaseKey, Refund, SalesBucket, Order, total_wl, describe_balance, refund_credit,
+    parse_purchase_details, epoch, rollup_keys
+)
+from .sql import PRODUCT_FIELDS
+from . import compression
+
+
+def _now():
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class MemoryStorage(Storage):
+    """
+    Dict-backed storage for benchmarks and throwaway runs.
+
+    One lock serializes every operation, which matches SQLite's single
+    writer; nothing survives the process.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.users = {}         # (guild_id, growid) -> Balance
+        self.growids = {}       # (guild_id, user_id) -> growid
+        self.products = {}      # (guild_id, code) -> [Product, stock]
+        self.worlds = {}        # guild_id -> WorldInfo
+        self.stock = {}         # id -> row dict
+        self.available = {}     # (guild_id, code) -> [id, ...] in claim order (added_at, id)
+        self.ledger = []        # entry id N ada di indeks N - 1
+        self.purchases = {}     # (guild_id, growid) -> [id entry PURCHASE, ...] urut naik
+        self.reversals = {}     # id entry yang di-refund -> id entry REFUND
+        self.donations = []
+        self.purges = {}        # id -> PurgeJob
+        self.compressed = set() # (guild_id, code) dengan kompresi aktif
+        self.holds = {}         # id -> Hold
+        self.purchase_keys = {} # key -> PurchaseKey
+        self.dictionaries = {}  # id -> (guild_id, code, zdict)
+        self.rollups = {}       # (guild_id, dimension, period, bucket, key) -> [orders, items, revenue]
+        self._ids = {'stock': 0, 'ledger': 0, 'donation': 0, 'purge': 0, 'dictionary': 0}
+
+    def _next_id(self, kind):
+        self._ids[kind] += 1
+        return self._ids[kind]
+
+    def setup(self, default_guild_id=0):
+        pass
+
+    # Users and GrowIDs
+
+    def get_growid(self, guild_id, user_id):
+        return self.growids.get((guild_id, user_id))
+
+    def set_growid(self, guild_id, user_id, growid):
+        with self._lock:
+            for key, value in list(self.growids.items()):
+                if key[0] == guild_id and value == growid and key[1] != user_id:
+                    del self.growids[key]
+            self.growids[(guild_id, user_id)] = growid
+            self.users.setdefault((guild_id, growid), EMPTY_BALANCE)
+
+    def get_balance(self, guild_id, growid):
+        return self.users.get((guild_id, growid), EMPTY_BALANCE)
+
+    # Ledger
+
+    def _write_balance(self, guild_id, growid, old, new, amount, transaction_type, details, reverses=None):
+        self.users[(guild_id, growid)] = new
+        entry_id = self._next_id('ledger')
+        self.ledger.append({
+            'id': entry_id, 'guild_id': guild_id, 'growid': growid, 'amount': amount,
+            'type': transaction_type, 'details': details, 'old_balance': describe_balance(old),
+            'new_balance': describe_balance(new), 'timestamp': _now(), 'reverses': reverses,
+        })
+        if transaction_type == 'PURCHASE':
+            self.purchases.setdefault((guild_id, growid), []).append(entry_id)
+        if reverses:
+            self.reversals[reverses] = entry_id
+        return entry_id
+
+    def _ledger_change(self, guild_id, growid, wl, dl, bgl, transaction_type, details, reverses=None):
+        old = self.get_balance(guild_id, growid)
+        new = Balance(old.wl + wl, old.dl + dl, old.bgl + bgl)
+        if min(new) < 0:
+            raise InsufficientBalance(growid)
+        entry_id = self._write_balance(
+            guild_id, growid, old, new, total_wl(wl, dl, bgl), transaction_type, details, reverses
+        )
+        return new, entry_id
+
+    def _apply_balance_change(self, guild_id, growid, wl, dl, bgl, transaction_type, details):
+        return self._ledger_change(guild_id, growid, wl, dl, bgl, transaction_type, details)[0]
+
+    def change_balance(self, guild_id, growid, wl, dl, bgl, transaction_type, details):
+        with self._lock:
+            return self._apply_balance_change(guild_id, growid, wl, dl, bgl, transaction_type, details)
+
+    def set_balance(self, guild_id, growid, wl, dl, bgl, transaction_type, details):
+        with self._lock:
+            old = self.get_balance(guild_id, growid)
+            new = Balance(wl, dl, bgl)
+            self._write_balance(guild_id, growid, old, new, 0, transaction_type, details)
+            return old, new
+
+    # Catalog
+
+    def catalog_guilds(self):
+        return {guild_id for guild_id, _ in self.products} | set(self.worlds)
+
+    def list_products(self, guild_id):
+        return [entry[0] for (g, _), entry in list(self.products.items()) if g == guild_id]
+
+    def get_product(self, guild_id, code):
+        entry = self.products.get((guild_id, code))
+        return entry[0] if entry else None
+
+    def add_product(self, guild_id, code, name, price, description=''):
+        with self._lock:
+            if (guild_id, code) in self.products:
+                raise ProductExists(code)
+            if any(job.guild_id == guild_id and job.code == code and not job.finished_at
+                   for job in self.purges.values()):
+                raise ProductPurging(code)
+            self.products[(guild_id, code)] = [Product(code, name, price, description), 0]
+
+    def update_product(self, guild_id, code, **changes):
+        unknown = set(changes) - set(PRODUCT_FIELDS)
+        if unknown:
+            raise TypeError(f"Cannot update product fields: {', '.join(sorted(unknown))}")
+        with self._lock:
+            entry = self.products.get((guild_id, code))
+            if entry is None:
+                return None
+            old = entry[0]
+            entry[0] = old._replace(**changes)
+            return old
+
+    def delete_product(self, guild_id, code, requested_by=None):
+        with self._lock:
+            entry = self.products.pop((guild_id, code), None)
+            if entry is None:
+                return None
+            self.available.pop((guild_id, code), None)
+            self.compressed.discard((guild_id, code))
+            job_id = self._next_id('purge')
+            self.purges[job_id] = PurgeJob(job_id, guild_id, code, requested_by, _now(), None, 0, None)
+            return entry[0]
+
+    def purge_jobs(self, include_finished=False):
+        return [job for job in list(self.purges.values()) if include_finished or not job.finished_at]
+
+    def purge_step(self, job_id, batch_size):
+        with self._lock:
+            job = self.purges.get(job_id)
+            if job is None or job.finished_at:
+                return job
+            rows = [item_id for item_id, row in self.stock.items()
+                    if row['guild_id'] == job.guild_id and row['product_code'] == job.code]
+            if job.rows_total is None:
+                job = job._replace(rows_total=len(rows))
+            for item_id in rows[:batch_size]:
+                del self.stock[item_id]
+            deleted = min(len(rows), batch_size)
+            if deleted < batch_size:
+                for dict_id in [d for d, (g, c, _) in self.dictionaries.items() if g == job.guild_id and c == job.code]:
+                    del self.dictionaries[dict_id]
+            job = job._replace(
+                rows_purged=job.rows_purged + deleted,
+                finished_at=_now() if deleted < batch_size else None
+            )
+            self.purges[job_id] = job
+            return job
+
+    def get_world(self, guild_id):
+        return self.worlds.get(guild_id)
+
+    def set_world(self, guild_id, world, owner, bot):
+        with self._lock:
+            previous = self.worlds.get(guild_id)
+            self.worlds[guild_id] = WorldInfo(world, owner, bot)
+            return previous
+
+    # Stock compression
+
+    def set_compression(self, guild_id, code, enabled):
+        with self._lock:
+            if (guild_id, code) not in self.products:
+                raise UnknownProduct(code)
+            previous = (guild_id, code) in self.compressed
+            if enabled:
+                self.compressed.add((guild_id, code))
+            else:
+                self.compressed.discard((guild_id, code))
+            return previous
+
+    def train_dictionary(self, guild_id, code, samples=None):
+        with self._lock:
+            if samples is None:
+                samples = [row['content'] for row in reversed(list(self.stock.values()))
+                           if row['guild_id'] == guild_id and row['product_code'] == code
+                           and row['content_z'] is None][:compression.SAMPLE_LINES]
+            zdict = compression.train_dictionary(samples)
+            if not zdict:
+                return None
+            dict_id = self._next_id('dictionary')
+            self.dictionaries[dict_id] = (guild_id, code, zdict)
+            return dict_id
+
+    def _latest_dictionary(self, guild_id, code):
+        return max((dict_id for dict_id, (g, c, _) in self.dictionaries.items() if g == guild_id and c == code),
+                   default=None)
+
+    # Stock
+
+    def add_stock(self, guild_id, code, contents, added_by, source_file=None):
+        with self._lock:
+            entry = self.products.get((guild_id, code))
+            if entry is None:
+                raise UnknownProduct(code)
+            contents = list(contents)
+            dict_id = zdict = None
+            if (guild_id, code) in self.compressed:
+                dict_id = self._latest_dictionary(guild_id, code) or self.train_dictionary(guild_id, code, contents)
+                zdict = self.dictionaries[dict_id][2] if dict_id else None
+            queue = self.available.setdefault((guild_id, code), [])
+            added_at = _now()
+            count = 0
+            for content in contents:
+                content, content_z = compression.encode(content, zdict) if zdict else (content, None)
+                item_id = self._next_id('stock')
+                self.stock[item_id] = {
+                    'guild_id': guild_id, 'product_code': code, 'content': content, 'used': 0,
+                    'used_by': None, 'used_at': None, 'added_by': added_by, 'added_at': added_at,
+                    'source_file': source_file, 'content_z': content_z, 'dict_id': dict_id if zdict else None,
+                }
+                queue.append(item_id)
+                count += 1
+            entry[1] += count
+            return count
+
+    def stock_count(self, guild_id, code):
+        return len(self.available.get((guild_id, code), ()))
+
+    def stock_counts(self):
+        counts = {}
+        for (guild_id, code), queue in list(self.available.items()):
+            if queue:
+                counts.setdefault(guild_id, {})[code] = len(queue)
+        return counts
+
+    def stock_stats(self, guild_id, code):
+        rows = [row for row in list(self.stock.values())
+                if row['guild_id'] == guild_id and row['product_code'] == code]
+        # Item yang di-void saat refund (used = 2) bukan tersedia maupun terjual
+        return StockStats(
+            sum(1 for row in rows if row['used'] == 0),
+            sum(1 for row in rows if row['used'] == 1),
+            len(rows),
+            max((row['added_at'] for row in rows), default=None),
+            max((row['used_at'] for row in rows if row['used_at']), default=None),
+        )
+
+    def _claim(self, guild_id, code, quantity, used_by, reserved=0):
+        if (guild_id, code) not in self.products:
+            raise UnknownProduct(code)
+        queue = self.available.get((guild_id, code), [])
+        if len(queue) - reserved < quantity:
+            raise InsufficientStock(code, max(len(queue) - reserved, 0))
+        claimed, queue[:quantity] = queue[:quantity], []
+        used_at = _now()
+        items = []
+        for item_id in claimed:
+            row = self.stock[item_id]
+            row.update(used=1, used_by=used_by, used_at=used_at)
+            content = row['content']
+            if row['content_z'] is not None:
+                content = compression.decompress(row['content_z'], self.dictionaries[row['dict_id']][2])
+            items.append(StockItem(item_id, content))
+        self.products[(guild_id, code)][1] -= len(items)
+        return items
+
+    def claim_stock(self, guild_id, code, quantity, used_by, reserved=0):
+        with self._lock:
+            return self._claim(guild_id, code, quantity, used_by, reserved)
+
+    def claim_batch(self, guild_id, orders, reserved=None):
+        reserved = reserved or {}
+        with self._lock:
+            # Cek total per produk dulu; tanpa rollback, klaim sebagian tidak boleh terjadi
+            needed = {}
+            for code, quantity, _ in orders:
+                needed[code] = needed.get(code, 0) + quantity
+            for code, quantity in needed.items():
+                if (guild_id, code) not in self.products:
+                    raise UnknownProduct(code)
+                available = len(self.available.get((guild_id, code), ())) - reserved.get(code, 0)
+                if available < quantity:
+                    raise InsufficientStock(code, max(available, 0))
+            return [
+                self._claim(guild_id, code, quantity, used_by, reserved.get(code, 0))
+                for code, quantity, used_by in orders
+            ]
+
+    def _restock(self, guild_id, item_ids):
+        returned = 0
+        for item_id in item_ids:
+            row = self.stock.get(item_id)
+            if row is None or row['guild_id'] != guild_id or row['used'] != 1:
+                continue
+            row.update(used=0, used_by=None, used_at=None, purchase_id=None)
+            bisect.insort(self.available.setdefault((guild_id, row['product_code']), []), item_id)
+            if (guild_id, row['product_code']) in self.products:
+                self.products[(guild_id, row['product_code'])][1] += 1
+            returned += 1
+        return returned
+
+    def return_stock(self, guild_id, item_ids):
+        with self._lock:
+            return self._restock(guild_id, item_ids)
+
+    def purchase(self, guild_id, growid, code, quantity, delta, used_by, details, reserved=0):
+        with self._lock:
+            old = self.get_balance(guild_id, growid)
+            if min(Balance(old.wl + delta[0], old.dl + delta[1], old.bgl + delta[2])) < 0:
+                raise InsufficientBalance(growid)
+            items = self._claim(guild_id, code, quantity, used_by, reserved)
+            balance, entry_id = self._ledger_change(guild_id, growid, *delta, 'PURCHASE', details)
+            for item in items:
+                self.stock[item.id]['purchase_id'] = entry_id
+            self._rollup(guild_id, code, growid, 1, len(items), -total_wl(*delta), epoch(self.ledger[-1]['timestamp']))
+            return items, balance
+
+    # Order history
+
+    def purchase_history(self, guild_id, growid, before_id=None, limit=10):
+        with self._lock:
+            ids = self.purchases.get((guild_id, growid), [])
+            end = len(ids) if before_id is None else bisect.bisect_left(ids, before_id)
+            entries = [self.ledger[entry_id - 1] for entry_id in ids[max(end - limit, 0):end][::-1]]
+            return [
+                Order(entry['id'], entry['amount'], entry['details'], entry['timestamp'],
+                      self.reversals.get(entry['id']))
+                for entry in entries
+            ]
+
+    def order_items(self, guild_id, growid, entry_id):
+        with self._lock:
+            if entry_id not in self.purchases.get((guild_id, growid), ()):
+                return []
+            items = []
+            for item_id, row in sorted(self.stock.items(), key=lambda item: (item[1]['added_at'], item[0])):
+                if row.get('purchase_id') == entry_id and row['used'] == 1:
+                    content = row['content']
+                    if row['content_z'] is not None:
+                        content = compression.decompress(row['content_z'], self.dictionaries[row['dict_id']][2])
+                    items.append(StockItem(item_id, content))
+            return items
+
+    # Sales rollups
+
+    def _rollup(self, guild_id, code, growid, orders, items, revenue, at):
+        for key in rollup_keys(code, growid, at):
+            total = self.rollups.setdefault((guild_id, *key), [0, 0, 0])
+            total[0] += orders
+            total[1] += items
+            total[2] += revenue
+
+    def sales_rollup(self, guild_id, dimension, period, since):
+        return sorted(
+            SalesBucket(bucket, key, *total)
+            for (g, d, p, bucket, key), total in list(self.rollups.items())
+            if g == guild_id and d == dimension and p == period and bucket >= since
+        )
+
+    def rebuild_rollups(self, guild_id=None):
+        with self._lock:
+            self.rollups = {key: total for key, total in self.rollups.items()
+                            if guild_id is not None and key[0] != guild_id}
+            reversed_ids = {entry['reverses'] for entry in self.ledger if entry.get('reverses')}
+            counted = 0
+            for entry in self.ledger:
+                if entry['type'] != 'PURCHASE' or entry['id'] in reversed_ids:
+                    continue
+                if guild_id is not None and entry['guild_id'] != guild_id:
+                    continue
+                parsed = parse_purchase_details(entry['details'])
+                if parsed is None:
+                    continue
+                counted += 1
+                self._rollup(entry['guild_id'], parsed[1], entry['growid'], 1, parsed[0], -entry['amount'],
+                             epoch(entry['timestamp']))
+            return counted
+
+    # Refunds
+
+    def purchase_entries_for_file(self, guild_id, source_file):
+        return sorted({row['purchase_id'] for row in list(self.stock.values())
+                       if row['guild_id'] == guild_id and row['source_file'] == source_file
+                       and row.get('purchase_id')})
+
+    def refund_orders(self, guild_id, entry_ids, restock, refunded_by):
+        with self._lock:
+            entries = {entry['id']: entry for entry in self.ledger}
+            reversed_by = {entry['reverses']: entry['id'] for entry in self.ledger if entry.get('reverses')}
+            entry_ids = list(dict.fromkeys(entry_ids))
+            # Validasi semua dulu supaya gagal berarti tidak ada yang berubah
+            credits = {}
+            for entry_id in entry_ids:
+                entry = entries.get(entry_id)
+                if entry is None or entry['guild_id'] != guild_id:
+                    raise NotRefundable(entry_id, 'no such transaction')
+                if entry['type'] != 'PURCHASE':
+                    raise NotRefundable(entry_id, f"it is a {entry['type']}, not a purchase")
+                if entry_id in reversed_by:
+                    raise NotRefundable(entry_id, f'already refunded by #{reversed_by[entry_id]}')
+                credits[entry_id] = refund_credit(
+                    entry_id, entry['old_balance'], entry['new_balance'], entry['amount']
+                )
+
+            refunds = []
+            for entry_id in entry_ids:
+                entry = entries[entry_id]
+                credit = credits[entry_id]
+                rows = [(item_id, row) for item_id, row in self.stock.items()
+                        if row.get('purchase_id') == entry_id and row['used'] == 1]
+                if restock:
+                    self._restock(guild_id, [item_id for item_id, _ in rows])
+                else:
+                    for _, row in rows:
+                        row['used'] = 2
+                details = (f"Refund of #{entry_id} by {refunded_by}: "
+                           f"{len(rows)} items {'returned to stock' if restock else 'voided'}")
+                balance, refund_id = self._ledger_change(
+                    guild_id, entry['growid'], *credit, 'REFUND', details, reverses=entry_id
+                )
+                parsed = parse_purchase_details(entry['details'])
+                if parsed:
+                    self._rollup(guild_id, parsed[1], entry['growid'], -1, -parsed[0], entry['amount'],
+                                 epoch(entry['timestamp']))
+                refunds.append(Refund(entry_id, refund_id, guild_id, entry['growid'], credit, len(rows), balance))
+            return refunds
+
+    # Purchase idempotency
+
+    def reserve_purchase_key(self, key, guild_id, user_id):
+        with self._lock:
+            existing = self.purchase_keys.get(key)
+            if existing is None:
+                self.purchase_keys[key] = PurchaseKey(key, guild_id, user_id, None, time.time())
+            return existing
+
+    def complete_purchase_key(self, key, result):
+        with self._lock:
+            if key in self.purchase_keys:
+                self.purchase_keys[key] = self.purchase_keys[key]._replace(result=result)
+
+    def release_purchase_key(self, key):
+        with self._lock:
+            entry = self.purchase_keys.get(key)
+            if entry is not None and entry.result is None:
+                del self.purchase_keys[key]
+
+    def expire_purchase_keys(self, older_than):
+        with self._lock:
+            expired = [key for key, entry in self.purchase_keys.items() if entry.created_at < older_than]
+            for key in expired:
+                del self.purchase_keys[key]
+            return len(expired)
+
+    # Cart holds
+
+    def load_holds(self):
+        return list(self.holds.values())
+
+    def sync_holds(self, upserts, deleted_ids):
+        with self._lock:
+            for hold_id in deleted_ids:
+                self.holds.pop(hold_id, None)
+            for hold in upserts:
+                self.holds[hold.id] = hold
+
+    # Donations
+
+    def enqueue_donation(self, guild_id, growid, wl, dl, bgl, raw=None):
+        with self._lock:
+            queue_id = self._next_id('donation')
+            self.donations.append({
+                'id': queue_id, 'guild_id': guild_id, 'growid': growid, 'wl': wl, 'dl': dl, 'bgl': bgl,
+                'raw': raw, 'received_at': _now(), 'processed_at': None,
+            })
+            return queue_id
+
+    def credit_queued_donations(self, limit=100):
+        with self._lock:
+            credited = []
+            for row in self.donations:
+                if len(credited) >= limit:
+                    break
+                if row['processed_at'] is not None:
+                    continue
+                amount = total_wl(row['wl'], row['dl'], row['bgl'])
+                balance = self._apply_balance_change(
+                    row['guild_id'], row['growid'], amount, 0, 0, 'DONATION',
+                    f"Donation #{row['id']}: {row['raw'] or f'{amount} WL'}"
+                )
+                row['processed_at'] = _now()
+                credited.append(CreditedDonation(
+                    row['id'], row['guild_id'], row['growid'], row['wl'], row['dl'], row['bgl'],
+                    amount, row['raw'], row['received_at'], balance
+                ))
+            # Baris yang sudah diproses tidak perlu disimpan di memori
+            self.donations = [row for row in self.donations if row['processed_at'] is None]
+            return credited
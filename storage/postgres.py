@@ -0,0 +1,202 @@
+"""
+Optional PostgreSQL backend for when one SQLite file is outgrown.
+
+Needs psycopg 3 (pip install "psycopg[binary]"). Select it in
+config.json with "storage": {"backend": "postgres", "dsn": "..."}.
+Try it against a local instance with:
+
+    python bench/storage_backends.py --pg-dsn postgresql://localhost/store
+"""
+import logging
+from .base import StorageError
+from .sql import SqlStorage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        guild_id BIGINT NOT NULL,
+        growid TEXT NOT NULL,
+        balance_wl BIGINT DEFAULT 0,
+        balance_dl BIGINT DEFAULT 0,
+        balance_bgl BIGINT DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (guild_id, growid)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_growid (
+        guild_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        growid TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (guild_id, user_id),
+        UNIQUE (guild_id, growid)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS products (
+        guild_id BIGINT NOT NULL,
+        code TEXT NOT NULL,
+        name TEXT NOT NULL,
+        price BIGINT NOT NULL,
+        stock BIGINT DEFAULT 0,
+        description TEXT,
+        compress INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, code)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_stock (
+        id BIGSERIAL PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        product_code TEXT NOT NULL,
+        content TEXT NOT NULL,
+        used INTEGER DEFAULT 0,
+        used_by TEXT DEFAULT NULL,
+        used_at TIMESTAMP DEFAULT NULL,
+        added_by TEXT NOT NULL,
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        source_file TEXT,
+        content_z BYTEA DEFAULT NULL,
+        dict_id BIGINT DEFAULT NULL,
+        purchase_id BIGINT DEFAULT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transaction_log (
+        id BIGSERIAL PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        growid TEXT NOT NULL,
+        amount BIGINT NOT NULL,
+        type TEXT NOT NULL,
+        details TEXT,
+        old_balance TEXT,
+        new_balance TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        reverses BIGINT DEFAULT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS donation_queue (
+        id BIGSERIAL PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        growid TEXT NOT NULL,
+        wl BIGINT NOT NULL DEFAULT 0,
+        dl BIGINT NOT NULL DEFAULT 0,
+        bgl BIGINT NOT NULL DEFAULT 0,
+        raw TEXT,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        processed_at TIMESTAMP DEFAULT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS world_info (
+        guild_id BIGINT PRIMARY KEY,
+        world TEXT NOT NULL,
+        owner TEXT NOT NULL,
+        bot TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_holds (
+        id TEXT PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        product_code TEXT NOT NULL,
+        quantity BIGINT NOT NULL,
+        expires_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS purchase_keys (
+        key TEXT PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        result TEXT DEFAULT NULL,
+        created_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_rollup (
+        guild_id BIGINT NOT NULL,
+        dimension TEXT NOT NULL,
+        period TEXT NOT NULL,
+        bucket BIGINT NOT NULL,
+        key TEXT NOT NULL,
+        orders BIGINT NOT NULL DEFAULT 0,
+        items BIGINT NOT NULL DEFAULT 0,
+        revenue BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, dimension, period, bucket, key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_dictionary (
+        id BIGSERIAL PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        product_code TEXT NOT NULL,
+        data BYTEA NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_purge (
+        id BIGSERIAL PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        product_code TEXT NOT NULL,
+        requested_by TEXT,
+        requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        rows_total BIGINT DEFAULT NULL,
+        rows_purged BIGINT NOT NULL DEFAULT 0,
+        finished_at TIMESTAMP DEFAULT NULL
+    )
+    """,
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS compress INTEGER DEFAULT 0",
+    "ALTER TABLE product_stock ADD COLUMN IF NOT EXISTS content_z BYTEA DEFAULT NULL",
+    "ALTER TABLE product_stock ADD COLUMN IF NOT EXISTS dict_id BIGINT DEFAULT NULL",
+    "ALTER TABLE product_stock ADD COLUMN IF NOT EXISTS purchase_id BIGINT DEFAULT NULL",
+    "ALTER TABLE transaction_log ADD COLUMN IF NOT EXISTS reverses BIGINT DEFAULT NULL",
+    "DROP INDEX IF EXISTS idx_product_stock_available",
+    "CREATE INDEX IF NOT EXISTS idx_product_stock_fifo ON product_stock (guild_id, product_code, used, added_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_transaction_log_growid ON transaction_log (guild_id, growid, id)",
+    # Riwayat pembelian per user (keyset pagination, My Orders)
+    "CREATE INDEX IF NOT EXISTS idx_transaction_log_purchases ON transaction_log (guild_id, growid, id) WHERE type = 'PURCHASE'",
+    "CREATE INDEX IF NOT EXISTS idx_donation_queue_pending ON donation_queue (id) WHERE processed_at IS NULL",
+    "CREATE INDEX IF NOT EXISTS idx_product_stock_purchase ON product_stock (purchase_id) WHERE purchase_id IS NOT NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_transaction_log_reverses ON transaction_log (reverses) WHERE reverses IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_purchase_keys_created ON purchase_keys (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_product_purge_pending ON product_purge (guild_id, product_code) WHERE finished_at IS NULL",
+]
+
+
+class PostgresStorage(SqlStorage):
+    """PostgreSQL backend; row locks take the place of SQLite's BEGIN IMMEDIATE"""
+
+    name = 'postgres'
+    claim_lock = ' FOR UPDATE SKIP LOCKED'
+    row_lock = ' FOR UPDATE'
+
+    def __init__(self, dsn: str):
+        try:
+            import psycopg
+        except ImportError as e:
+            raise StorageError('The postgres backend needs psycopg: pip install "psycopg[binary]"') from e
+        if not dsn:
+            raise StorageError("storage.dsn is required for the postgres backend")
+        super().__init__()
+        self._psycopg = psycopg
+        self.dsn = dsn
+
+    def connect(self):
+        return self._psycopg.connect(self.dsn)
+
+    def sql(self, statement):
+        return statement.replace('?', '%s')
+
+    def setup(self, default_guild_id=0):
+        with self.transaction() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+        logger.info("PostgreSQL schema initialized")
@@ -0,0 +1,687 @@
+"""
+Storage over a DB-API connection, shared by the SQLite and PostgreSQL
+backends. Statements use `?` placeholders and the SQL both engines
+accept (ON CONFLICT, RETURNING); dialect differences are the hooks at
+the top of SqlStorage.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from . import compression
+from .base import (
+    Storage, Balance, Product, WorldInfo, StockItem, StockStats, CreditedDonation, EMPTY_BALANCE,
+    InsufficientBalance, InsufficientStock, UnknownProduct, ProductExists, ProductPurging, NotRefundable,
+    PurgeJob, Hold, PurchaseKey, Refund, SalesBucket, Order, total_wl, describe_balance, refund_credit,
+    parse_purchase_details, epoch, rollup_keys
+)
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FIELDS = ('name', 'price', 'description')
+
+
+class SqlStorage(Storage):
+    # Appended to SELECTs that pick rows to modify (stock claims, queue)
+    claim_lock = ''
+    # Appended to SELECTs of a row that is updated in the same transaction
+    row_lock = ''
+
+    def __init__(self):
+        # dict_id -> zdict; dictionary tidak pernah berubah setelah ditulis
+        self._dictionaries = {}
+
+    def connect(self):
+        raise NotImplementedError
+
+    def begin(self, cursor, immediate: bool):
+        pass
+
+    def sql(self, statement: str) -> str:
+        return statement
+
+    def execute(self, cursor, statement: str, params=()):
+        cursor.execute(self.sql(statement), params)
+        return cursor
+
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """Cursor inside one transaction; commits on success, rolls back on error"""
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            self.begin(cursor, immediate)
+            yield cursor
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def fetchone(self, statement: str, params=()):
+        with self.transaction() as cursor:
+            return self.execute(cursor, statement, params).fetchone()
+
+    def fetchall(self, statement: str, params=()):
+        with self.transaction() as cursor:
+            return self.execute(cursor, statement, params).fetchall()
+
+    # Users and GrowIDs
+
+    def get_growid(self, guild_id, user_id):
+        row = self.fetchone(
+            "SELECT growid FROM user_growid WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        )
+        return row[0] if row else None
+
+    def set_growid(self, guild_id, user_id, growid):
+        with self.transaction() as cursor:
+            self.execute(cursor, """
+                DELETE FROM user_growid WHERE guild_id = ? AND growid = ? AND user_id != ?
+            """, (guild_id, growid, user_id))
+            self.execute(cursor, """
+                INSERT INTO user_growid (guild_id, user_id, growid) VALUES (?, ?, ?)
+                ON CONFLICT (guild_id, user_id) DO UPDATE SET growid = excluded.growid
+            """, (guild_id, user_id, growid))
+            self.execute(cursor, """
+                INSERT INTO users (guild_id, growid) VALUES (?, ?) ON CONFLICT DO NOTHING
+            """, (guild_id, growid))
+
+    def get_balance(self, guild_id, growid):
+        row = self.fetchone("""
+            SELECT balance_wl, balance_dl, balance_bgl
+            FROM users
+            WHERE guild_id = ? AND growid = ?
+        """, (guild_id, growid))
+        return Balance(*row) if row else EMPTY_BALANCE
+
+    # Ledger
+
+    def _locked_balance(self, cursor, guild_id, growid):
+        self.execute(cursor, """
+            INSERT INTO users (guild_id, growid) VALUES (?, ?) ON CONFLICT DO NOTHING
+        """, (guild_id, growid))
+        row = self.execute(cursor, """
+            SELECT balance_wl, balance_dl, balance_bgl
+            FROM users
+            WHERE guild_id = ? AND growid = ?
+        """ + self.row_lock, (guild_id, growid)).fetchone()
+        return Balance(*row)
+
+    def _write_balance(self, cursor, guild_id, growid, old, new, amount, transaction_type, details, reverses=None):
+        """Store the new balance and its ledger entry; returns the entry id"""
+        self.execute(cursor, """
+            UPDATE users
+            SET balance_wl = ?, balance_dl = ?, balance_bgl = ?
+            WHERE guild_id = ? AND growid = ?
+        """, (*new, guild_id, growid))
+        return self.execute(cursor, """
+            INSERT INTO transaction_log (
+                guild_id, growid, amount, type, details, old_balance, new_balance, reverses
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING id
+        """, (guild_id, growid, amount, transaction_type, details,
+              describe_balance(old), describe_balance(new), reverses)).fetchone()[0]
+
+    def _ledger_change(self, cursor, guild_id, growid, wl, dl, bgl, transaction_type, details, reverses=None):
+        """Apply a delta; returns (new balance, ledger entry id)"""
+        old = self._locked_balance(cursor, guild_id, growid)
+        new = Balance(old.wl + wl, old.dl + dl, old.bgl + bgl)
+        if min(new) < 0:
+            raise InsufficientBalance(growid)
+        entry_id = self._write_balance(
+            cursor, guild_id, growid, old, new, total_wl(wl, dl, bgl), transaction_type, details, reverses
+        )
+        return new, entry_id
+
+    def _apply_balance_change(self, cursor, guild_id, growid, wl, dl, bgl, transaction_type, details):
+        return self._ledger_change(cursor, guild_id, growid, wl, dl, bgl, transaction_type, details)[0]
+
+    def change_balance(self, guild_id, growid, wl, dl, bgl, transaction_type, details):
+        with self.transaction() as cursor:
+            return self._apply_balance_change(cursor, guild_id, growid, wl, dl, bgl, transaction_type, details)
+
+    def set_balance(self, guild_id, growid, wl, dl, bgl, transaction_type, details):
+        with self.transaction() as cursor:
+            old = self._locked_balance(cursor, guild_id, growid)
+            new = Balance(wl, dl, bgl)
+            self._write_balance(cursor, guild_id, growid, old, new, 0, transaction_type, details)
+            return old, new
+
+    # Catalog
+
+    def catalog_guilds(self):
+        rows = self.fetchall("SELECT guild_id FROM products UNION SELECT guild_id FROM world_info")
+        return {row[0] for row in rows}
+
+    def list_products(self, guild_id):
+        rows = self.fetchall(
+            "SELECT code, name, price, description FROM products WHERE guild_id = ?", (guild_id,)
+        )
+        return [Product(*row) for row in rows]
+
+    def _product(self, cursor, guild_id, code):
+        row = self.execute(cursor, """
+            SELECT code, name, price, description FROM products WHERE guild_id = ? AND code = ?
+        """, (guild_id, code)).fetchone()
+        return Product(*row) if row else None
+
+    def get_product(self, guild_id, code):
+        with self.transaction() as cursor:
+            return self._product(cursor, guild_id, code)
+
+    def add_product(self, guild_id, code, name, price, description=''):
+        with self.transaction() as cursor:
+            if self._product(cursor, guild_id, code):
+                raise ProductExists(code)
+            if self.execute(cursor, """
+                SELECT 1 FROM product_purge WHERE guild_id = ? AND product_code = ? AND finished_at IS NULL
+            """, (guild_id, code)).fetchone():
+                raise ProductPurging(code)
+            self.execute(cursor, """
+                INSERT INTO products (guild_id, code, name, price, stock, description)
+                VALUES (?, ?, ?, ?, 0, ?)
+            """, (guild_id, code, name, price, description))
+
+    def update_product(self, guild_id, code, **changes):
+        unknown = set(changes) - set(PRODUCT_FIELDS)
+        if unknown:
+            raise TypeError(f"Cannot update product fields: {', '.join(sorted(unknown))}")
+        with self.transaction() as cursor:
+            old = self._product(cursor, guild_id, code)
+            if old is None or not changes:
+                return old
+            assignments = ", ".join(f"{name} = ?" for name in changes)
+            self.execute(
+                cursor,
+                f"UPDATE products SET {assignments} WHERE guild_id = ? AND code = ?",
+                (*changes.values(), guild_id, code)
+            )
+            return old
+
+    def delete_product(self, guild_id, code, requested_by=None):
+        with self.transaction() as cursor:
+            old = self._product(cursor, guild_id, code)
+            if old is None:
+                return None
+            # Baris stok dihapus bertahap oleh purge_step, bukan di transaksi ini
+            self.execute(cursor, "DELETE FROM products WHERE guild_id = ? AND code = ?", (guild_id, code))
+            self.execute(cursor, """
+                INSERT INTO product_purge (guild_id, product_code, requested_by) VALUES (?, ?, ?)
+            """, (guild_id, code, requested_by))
+            return old
+
+    def purge_jobs(self, include_finished=False):
+        rows = self.fetchall("""
+            SELECT id, guild_id, product_code, requested_by, requested_at, rows_total, rows_purged, finished_at
+            FROM product_purge
+        """ + ("" if include_finished else "WHERE finished_at IS NULL ") + "ORDER BY id")
+        return [PurgeJob(*row) for row in rows]
+
+    def _purge_job(self, cursor, job_id):
+        row = self.execute(cursor, """
+            SELECT id, guild_id, product_code, requested_by, requested_at, rows_total, rows_purged, finished_at
+            FROM product_purge WHERE id = ?
+        """, (job_id,)).fetchone()
+        return PurgeJob(*row) if row else None
+
+    def purge_step(self, job_id, batch_size):
+        with self.transaction() as cursor:
+            job = self._purge_job(cursor, job_id)
+        if job is None or job.finished_at:
+            return job
+        if job.rows_total is None:
+            # Dihitung di luar write lock; hanya untuk progress
+            total = self.fetchone(
+                "SELECT COUNT(*) FROM product_stock WHERE guild_id = ? AND product_code = ?",
+                (job.guild_id, job.code)
+            )[0]
+            with self.transaction() as cursor:
+                self.execute(cursor, "UPDATE product_purge SET rows_total = ? WHERE id = ?", (total, job_id))
+
+        with self.transaction(immediate=True) as cursor:
+            deleted = self.execute(cursor, """
+                DELETE FROM product_stock WHERE id IN (
+                    SELECT id FROM product_stock
+                    WHERE guild_id = ? AND product_code = ?
+                    ORDER BY id
+                    LIMIT ?
+                )
+            """, (job.guild_id, job.code, batch_size)).rowcount
+            self.execute(cursor, """
+                UPDATE product_purge
+                SET rows_purged = rows_purged + ?,
+                    finished_at = CASE WHEN ? < ? THEN CURRENT_TIMESTAMP END
+                WHERE id = ?
+            """, (deleted, deleted, batch_size, job_id))
+            if deleted < batch_size:
+                self.execute(cursor, """
+                    DELETE FROM stock_dictionary WHERE guild_id = ? AND product_code = ?
+                """, (job.guild_id, job.code))
+            return self._purge_job(cursor, job_id)
+
+    def get_world(self, guild_id):
+        row = self.fetchone("SELECT world, owner, bot FROM world_info WHERE guild_id = ?", (guild_id,))
+        return WorldInfo(*row) if row else None
+
+    def set_world(self, guild_id, world, owner, bot):
+        with self.transaction() as cursor:
+            row = self.execute(
+                cursor, "SELECT world, owner, bot FROM world_info WHERE guild_id = ?", (guild_id,)
+            ).fetchone()
+            self.execute(cursor, """
+                INSERT INTO world_info (guild_id, world, owner, bot) VALUES (?, ?, ?, ?)
+                ON CONFLICT (guild_id) DO UPDATE SET
+                    world = excluded.world, owner = excluded.owner, bot = excluded.bot,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (guild_id, world, owner, bot))
+            return WorldInfo(*row) if row else None
+
+    # Stock compression
+
+    def set_compression(self, guild_id, code, enabled):
+        with self.transaction() as cursor:
+            row = self.execute(cursor, """
+                SELECT compress FROM products WHERE guild_id = ? AND code = ?
+            """ + self.row_lock, (guild_id, code)).fetchone()
+            if row is None:
+                raise UnknownProduct(code)
+            self.execute(cursor, """
+                UPDATE products SET compress = ? WHERE guild_id = ? AND code = ?
+            """, (int(bool(enabled)), guild_id, code))
+            return bool(row[0])
+
+    def train_dictionary(self, guild_id, code, samples=None):
+        if samples is None:
+            samples = [row[0] for row in self.fetchall("""
+                SELECT content FROM product_stock
+                WHERE guild_id = ? AND product_code = ? AND content_z IS NULL
+                ORDER BY id DESC
+                LIMIT ?
+            """, (guild_id, code, compression.SAMPLE_LINES))]
+        zdict = compression.train_dictionary(samples)
+        if not zdict:
+            return None
+        with self.transaction() as cursor:
+            dict_id = self.execute(cursor, """
+                INSERT INTO stock_dictionary (guild_id, product_code, data) VALUES (?, ?, ?)
+                RETURNING id
+            """, (guild_id, code, zdict)).fetchone()[0]
+        self._dictionaries[dict_id] = zdict
+        return dict_id
+
+    def _dictionary(self, cursor, dict_id):
+        zdict = self._dictionaries.get(dict_id)
+        if zdict is None:
+            zdict = bytes(self.execute(
+                cursor, "SELECT data FROM stock_dictionary WHERE id = ?", (dict_id,)
+            ).fetchone()[0])
+            self._dictionaries[dict_id] = zdict
+        return zdict
+
+    def _decode(self, cursor, content, content_z, dict_id):
+        if content_z is None:
+            return content
+        return compression.decompress(content_z, self._dictionary(cursor, dict_id) if dict_id else b'')
+
+    def _compression_dict(self, guild_id, code, samples):
+        """Dictionary id for new rows of a compressed product, or None when compression is off"""
+        row = self.fetchone("""
+            SELECT p.compress, (SELECT MAX(id) FROM stock_dictionary d WHERE d.guild_id = p.guild_id AND d.product_code = p.code)
+            FROM products p WHERE p.guild_id = ? AND p.code = ?
+        """, (guild_id, code))
+        if row is None or not row[0]:
+            return None
+        # Dictionary pertama dilatih dari batch stok ini sendiri
+        return row[1] or self.train_dictionary(guild_id, code, samples)
+
+    # Stock
+
+    def add_stock(self, guild_id, code, contents, added_by, source_file=None):
+        contents = list(contents)
+        dict_id = self._compression_dict(guild_id, code, contents)
+        if dict_id:
+            with self.transaction() as cursor:
+                zdict = self._dictionary(cursor, dict_id)
+            rows = [(guild_id, code, *compression.encode(content, zdict), dict_id, added_by, source_file)
+                    for content in contents]
+        else:
+            rows = [(guild_id, code, content, None, None, added_by, source_file) for content in contents]
+        with self.transaction() as cursor:
+            if self._product(cursor, guild_id, code) is None:
+                raise UnknownProduct(code)
+            cursor.executemany(self.sql("""
+                INSERT INTO product_stock (guild_id, product_code, content, content_z, dict_id, added_by, source_file)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """), rows)
+            self.execute(cursor, """
+                UPDATE products SET stock = stock + ? WHERE guild_id = ? AND code = ?
+            """, (len(contents), guild_id, code))
+            return len(contents)
+
+    def stock_count(self, guild_id, code):
+        return self.fetchone("""
+            SELECT COUNT(*) FROM product_stock
+            WHERE guild_id = ? AND product_code = ? AND used = 0
+        """, (guild_id, code))[0]
+
+    def stock_counts(self):
+        counts = {}
+        for guild_id, code, count in self.fetchall("""
+            SELECT guild_id, product_code, COUNT(*)
+            FROM product_stock
+            WHERE used = 0
+            GROUP BY guild_id, product_code
+        """):
+            counts.setdefault(guild_id, {})[code] = count
+        return counts
+
+    def stock_stats(self, guild_id, code):
+        row = self.fetchone("""
+            SELECT
+                COUNT(CASE WHEN used = 0 THEN 1 END),
+                COUNT(CASE WHEN used = 1 THEN 1 END),
+                COUNT(*),
+                MAX(added_at),
+                MAX(used_at)
+            FROM product_stock
+            WHERE guild_id = ? AND product_code = ?
+        """, (guild_id, code))
+        return StockStats(*row)
+
+    def _claim(self, cursor, guild_id, code, quantity, used_by, reserved=0, purchase_id=None):
+        # Stok produk yang sudah dihapus tapi belum di-purge tidak boleh diklaim
+        if self._product(cursor, guild_id, code) is None:
+            raise UnknownProduct(code)
+        if reserved:
+            # Stok yang di-hold pembeli lain tidak boleh ikut terambil
+            available = self.execute(cursor, """
+                SELECT COUNT(*) FROM product_stock WHERE guild_id = ? AND product_code = ? AND used = 0
+            """, (guild_id, code)).fetchone()[0] - reserved
+            if available < quantity:
+                raise InsufficientStock(code, max(available, 0))
+        # Satu statement: pilih N baris tertua (FIFO per added_at, lalu id) dan tandai terpakai
+        rows = self.execute(cursor, """
+            UPDATE product_stock
+            SET used = 1, used_by = ?, used_at = CURRENT_TIMESTAMP, purchase_id = ?
+            WHERE id IN (
+                SELECT id FROM product_stock
+                WHERE guild_id = ? AND product_code = ? AND used = 0
+                ORDER BY added_at, id
+                LIMIT ?""" + self.claim_lock + """
+            )
+            RETURNING id, content, content_z, dict_id, added_at
+        """, (used_by, purchase_id, guild_id, code, quantity)).fetchall()
+        if len(rows) < quantity:
+            # Exception membatalkan transaksi, jadi baris yang sudah ditandai ikut di-rollback
+            raise InsufficientStock(code, len(rows))
+        # Urutan RETURNING tidak dijamin; kembalikan dalam urutan klaim
+        items = [
+            StockItem(item_id, self._decode(cursor, content, content_z, dict_id))
+            for item_id, content, content_z, dict_id, _ in sorted(rows, key=lambda row: (row[4], row[0]))
+        ]
+        self.execute(cursor, """
+            UPDATE products SET stock = stock - ? WHERE guild_id = ? AND code = ?
+        """, (len(items), guild_id, code))
+        return items
+
+    def claim_stock(self, guild_id, code, quantity, used_by, reserved=0):
+        with self.transaction(immediate=True) as cursor:
+            return self._claim(cursor, guild_id, code, quantity, used_by, reserved)
+
+    def claim_batch(self, guild_id, orders, reserved=None):
+        reserved = reserved or {}
+        with self.transaction(immediate=True) as cursor:
+            return [
+                self._claim(cursor, guild_id, code, quantity, used_by, reserved.get(code, 0))
+                for code, quantity, used_by in orders
+            ]
+
+    def _restock(self, cursor, guild_id, condition, params):
+        """Put claimed rows matching `condition` back in the queue and fix product counts"""
+        codes = self.execute(cursor, """
+            UPDATE product_stock
+            SET used = 0, used_by = NULL, used_at = NULL, purchase_id = NULL
+            WHERE guild_id = ? AND used = 1 AND """ + condition + """
+            RETURNING product_code
+        """, (guild_id, *params)).fetchall()
+        returned = {}
+        for (code,) in codes:
+            returned[code] = returned.get(code, 0) + 1
+        for code, count in returned.items():
+            self.execute(cursor, """
+                UPDATE products SET stock = stock + ? WHERE guild_id = ? AND code = ?
+            """, (count, guild_id, code))
+        return len(codes)
+
+    def return_stock(self, guild_id, item_ids):
+        item_ids = list(item_ids)
+        returned = 0
+        with self.transaction(immediate=True) as cursor:
+            for i in range(0, len(item_ids), 500):
+                chunk = item_ids[i:i + 500]
+                returned += self._restock(
+                    cursor, guild_id, f"id IN ({', '.join('?' * len(chunk))})", chunk
+                )
+        return returned
+
+    def purchase(self, guild_id, growid, code, quantity, delta, used_by, details, reserved=0):
+        with self.transaction(immediate=True) as cursor:
+            # Debit dulu agar id ledger bisa ditulis ke baris stok (untuk refund)
+            balance, entry_id = self._ledger_change(cursor, guild_id, growid, *delta, 'PURCHASE', details)
+            items = self._claim(cursor, guild_id, code, quantity, used_by, reserved, entry_id)
+            timestamp = self.execute(cursor, "SELECT timestamp FROM transaction_log WHERE id = ?", (entry_id,)).fetchone()[0]
+            self._rollup(cursor, guild_id, code, growid, 1, len(items), -total_wl(*delta), epoch(timestamp))
+            return items, balance
+
+    # Order history
+
+    def purchase_history(self, guild_id, growid, before_id=None, limit=10):
+        # Keyset: lanjut dari id terakhir halaman sebelumnya, bukan OFFSET
+        keyset = '' if before_id is None else ' AND t.id < ?'
+        params = (guild_id, growid) + (() if before_id is None else (before_id,)) + (limit,)
+        rows = self.fetchall("""
+            SELECT t.id, t.amount, t.details, t.timestamp,
+                   (SELECT r.id FROM transaction_log r WHERE r.reverses = t.id)
+            FROM transaction_log t
+            WHERE t.guild_id = ? AND t.growid = ? AND t.type = 'PURCHASE'""" + keyset + """
+            ORDER BY t.id DESC
+            LIMIT ?
+        """, params)
+        return [Order(*row) for row in rows]
+
+    def order_items(self, guild_id, growid, entry_id):
+        with self.transaction() as cursor:
+            rows = self.execute(cursor, """
+                SELECT s.id, s.content, s.content_z, s.dict_id
+                FROM product_stock s
+                JOIN transaction_log t ON t.id = s.purchase_id
+                WHERE s.purchase_id = ? AND s.used = 1 AND t.guild_id = ? AND t.growid = ?
+                ORDER BY s.added_at, s.id
+            """, (entry_id, guild_id, growid)).fetchall()
+            return [StockItem(item_id, self._decode(cursor, content, content_z, dict_id))
+                    for item_id, content, content_z, dict_id in rows]
+
+    # Sales rollups
+
+    def _rollup(self, cursor, guild_id, code, growid, orders, items, revenue, at):
+        cursor.executemany(self.sql("""
+            INSERT INTO sales_rollup (guild_id, dimension, period, bucket, key, orders, items, revenue)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (guild_id, dimension, period, bucket, key) DO UPDATE SET
+                orders = sales_rollup.orders + excluded.orders,
+                items = sales_rollup.items + excluded.items,
+                revenue = sales_rollup.revenue + excluded.revenue
+        """), [(guild_id, *key, orders, items, revenue) for key in rollup_keys(code, growid, at)])
+
+    def sales_rollup(self, guild_id, dimension, period, since):
+        rows = self.fetchall("""
+            SELECT bucket, key, orders, items, revenue FROM sales_rollup
+            WHERE guild_id = ? AND dimension = ? AND period = ? AND bucket >= ?
+            ORDER BY bucket, key
+        """, (guild_id, dimension, period, int(since)))
+        return [SalesBucket(*row) for row in rows]
+
+    def rebuild_rollups(self, guild_id=None):
+        scope = '' if guild_id is None else ' AND t.guild_id = ?'
+        params = () if guild_id is None else (guild_id,)
+        totals = {}
+        counted = 0
+        # Satu transaksi: pembelian baru menunggu sampai rollup selesai dihitung ulang
+        with self.transaction(immediate=True) as cursor:
+            self.execute(cursor, "DELETE FROM sales_rollup" + (' WHERE guild_id = ?' if params else ''), params)
+            self.execute(cursor, """
+                SELECT t.guild_id, t.growid, t.amount, t.details, t.timestamp
+                FROM transaction_log t
+                WHERE t.type = 'PURCHASE'
+                  AND NOT EXISTS (SELECT 1 FROM transaction_log r WHERE r.reverses = t.id)""" + scope, params)
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for row_guild, growid, amount, details, timestamp in rows:
+                    parsed = parse_purchase_details(details)
+                    if parsed is None:
+                        continue
+                    quantity, code = parsed
+                    counted += 1
+                    for key in rollup_keys(code, growid, epoch(timestamp)):
+                        total = totals.setdefault((row_guild, *key), [0, 0, 0])
+                        total[0] += 1
+                        total[1] += quantity
+                        total[2] -= amount
+            cursor.executemany(self.sql("""
+                INSERT INTO sales_rollup (guild_id, dimension, period, bucket, key, orders, items, revenue)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """), [(*key, *total) for key, total in totals.items()])
+        return counted
+
+    # Refunds
+
+    def purchase_entries_for_file(self, guild_id, source_file):
+        rows = self.fetchall("""
+            SELECT DISTINCT purchase_id FROM product_stock
+            WHERE guild_id = ? AND source_file = ? AND purchase_id IS NOT NULL
+            ORDER BY purchase_id
+        """, (guild_id, source_file))
+        return [row[0] for row in rows]
+
+    def refund_orders(self, guild_id, entry_ids, restock, refunded_by):
+        refunds = []
+        with self.transaction(immediate=True) as cursor:
+            for entry_id in dict.fromkeys(entry_ids):
+                row = self.execute(cursor, """
+                    SELECT growid, type, old_balance, new_balance, amount, details, timestamp,
+                           (SELECT id FROM transaction_log r WHERE r.reverses = t.id)
+                    FROM transaction_log t
+                    WHERE id = ? AND guild_id = ?
+                """, (entry_id, guild_id)).fetchone()
+                if row is None:
+                    raise NotRefundable(entry_id, 'no such transaction')
+                growid, transaction_type, old_balance, new_balance, amount, purchase, timestamp, refunded = row
+                if transaction_type != 'PURCHASE':
+                    raise NotRefundable(entry_id, f'it is a {transaction_type}, not a purchase')
+                if refunded:
+                    raise NotRefundable(entry_id, f'already refunded by #{refunded}')
+
+                # Kembalikan persis pecahan WL/DL/BGL yang dipotong
+                credit = refund_credit(entry_id, old_balance, new_balance, amount)
+
+                if restock:
+                    items = self._restock(cursor, guild_id, 'purchase_id = ?', (entry_id,))
+                else:
+                    items = self.execute(cursor, """
+                        UPDATE product_stock SET used = 2 WHERE purchase_id = ? AND used = 1
+                    """, (entry_id,)).rowcount
+
+                details = (f"Refund of #{entry_id} by {refunded_by}: "
+                           f"{items} items {'returned to stock' if restock else 'voided'}")
+                balance, refund_id = self._ledger_change(
+                    cursor, guild_id, growid, *credit, 'REFUND', details, reverses=entry_id
+                )
+                # Rollup dikurangi di bucket pembelian aslinya
+                parsed = parse_purchase_details(purchase)
+                if parsed:
+                    self._rollup(cursor, guild_id, parsed[1], growid, -1, -parsed[0], amount, epoch(timestamp))
+                refunds.append(Refund(entry_id, refund_id, guild_id, growid, credit, items, balance))
+        return refunds
+
+    # Purchase idempotency
+
+    def reserve_purchase_key(self, key, guild_id, user_id):
+        with self.transaction(immediate=True) as cursor:
+            inserted = self.execute(cursor, """
+                INSERT INTO purchase_keys (key, guild_id, user_id, created_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO NOTHING
+            """, (key, guild_id, user_id, time.time())).rowcount
+            if inserted:
+                return None
+            row = self.execute(cursor, """
+                SELECT key, guild_id, user_id, result, created_at FROM purchase_keys WHERE key = ?
+            """, (key,)).fetchone()
+            return PurchaseKey(*row)
+
+    def complete_purchase_key(self, key, result):
+        with self.transaction() as cursor:
+            self.execute(cursor, "UPDATE purchase_keys SET result = ? WHERE key = ?", (result, key))
+
+    def release_purchase_key(self, key):
+        with self.transaction() as cursor:
+            self.execute(cursor, "DELETE FROM purchase_keys WHERE key = ? AND result IS NULL", (key,))
+
+    def expire_purchase_keys(self, older_than):
+        with self.transaction() as cursor:
+            return self.execute(cursor, "DELETE FROM purchase_keys WHERE created_at < ?", (older_than,)).rowcount
+
+    # Cart holds
+
+    def load_holds(self):
+        rows = self.fetchall("SELECT id, guild_id, user_id, product_code, quantity, expires_at FROM stock_holds")
+        return [Hold(*row) for row in rows]
+
+    def sync_holds(self, upserts, deleted_ids):
+        with self.transaction() as cursor:
+            if deleted_ids:
+                cursor.executemany(
+                    self.sql("DELETE FROM stock_holds WHERE id = ?"), [(hold_id,) for hold_id in deleted_ids]
+                )
+            if upserts:
+                cursor.executemany(self.sql("""
+                    INSERT INTO stock_holds (id, guild_id, user_id, product_code, quantity, expires_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET quantity = excluded.quantity, expires_at = excluded.expires_at
+                """), [tuple(hold) for hold in upserts])
+
+    # Donations
+
+    def enqueue_donation(self, guild_id, growid, wl, dl, bgl, raw=None):
+        with self.transaction() as cursor:
+            return self.execute(cursor, """
+                INSERT INTO donation_queue (guild_id, growid, wl, dl, bgl, raw)
+                VALUES (?, ?, ?, ?, ?, ?)
+                RETURNING id
+            """, (guild_id, growid, wl, dl, bgl, raw)).fetchone()[0]
+
+    def credit_queued_donations(self, limit=100):
+        with self.transaction(immediate=True) as cursor:
+            rows = self.execute(cursor, """
+                SELECT id, guild_id, growid, wl, dl, bgl, raw, received_at
+                FROM donation_queue
+                WHERE processed_at IS NULL
+                ORDER BY id
+                LIMIT ?
+            """ + self.claim_lock, (limit,)).fetchall()
+            credited = []
+            for queue_id, guild_id, growid, wl, dl, bgl, raw, received_at in rows:
+                amount = total_wl(wl, dl, bgl)
+                balance = self._apply_balance_change(
+                    cursor, guild_id, growid, amount, 0, 0, 'DONATION',
+                    f"Donation #{queue_id}: {raw or f'{amount} WL'}"
+                )
+                self.execute(
+                    cursor, "UPDATE donation_queue SET processed_at = CURRENT_TIMESTAMP WHERE id = ?", (queue_id,)
+                )
+                credited.append(CreditedDonation(
+                    queue_id, guild_id, growid, wl, dl, bgl, amount, raw, received_at, balance
+                ))
+            return credited
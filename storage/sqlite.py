@@ -0,0 +1,23 @@
+import database
+from .sql import SqlStorage
+
+
+class SqliteStorage(SqlStorage):
+    """Default backend: the shop.db file, one connection per operation"""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str = database.DATABASE_FILE):
+        super().__init__()
+        self.path = path
+
+    def connect(self):
+        return database.get_connection(self.path)
+
+    def begin(self, cursor, immediate):
+        # Ambil write lock di awal agar klaim stok tidak saling tabrak
+        if immediate:
+            cursor.execute("BEGIN IMMEDIATE")
+
+    def setup(self, default_guild_id=0):
+        database.setup_database(default_guild_id, self.path)